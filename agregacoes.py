@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Agregações do período em várias granularidades (dia, semana, projeto, atividade e
+profissional x semana), todas calculadas de uma única passada sobre os lançamentos filtrados.
+
+As colunas categóricas (Profissional, Projeto, Atividade) entram pelos códigos inteiros e a data
+pelo deslocamento em dias desde o início do período. Os quatro códigos formam uma chave inteira
+por lançamento; uma única ordenação (np.unique) agrupa os lançamentos nas células
+(profissional, dia, projeto, atividade), somadas com np.bincount. Cada agregação sai das células,
+que são muito menos numerosas que os lançamentos, sem voltar ao detalhe.
+
+Cada agregação traz as horas esperadas pelo calendário de dias úteis (feriados.py), com as mesmas
+regras de admissão, desligamento, ausências e jornada do resumo por profissional:
+- dia, semana e profissional x semana: horas esperadas de cada pessoa do cadastro no intervalo;
+- projeto e atividade: as horas esperadas de cada pessoa no período, repartidas entre os projetos
+  (ou atividades) na proporção das horas aprovadas dela em cada um.
+Como no resumo, só entram as horas de quem está no cadastro de pessoas ativas.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import config
+import processamento_dados
+
+# nome: (título da seção no e-mail e da aba do anexo)
+GRANULARIDADES = {
+    'dia': 'Horas por Dia',
+    'semana': 'Horas por Semana',
+    'projeto': 'Horas por Projeto',
+    'atividade': 'Horas por Atividade',
+    'profissional_semana': 'Profissional x Semana',
+}
+GRANULARIDADES_PADRAO = ['semana', 'projeto', 'atividade']
+
+COLUNAS_VALORES = ['Horas Aprovadas', 'Total Horas Esperadas', 'Total Saldo']
+DIAS_SEMANA_PT = ['seg', 'ter', 'qua', 'qui', 'sex', 'sáb', 'dom']
+
+def _granularidades_configuradas():
+    granularidades = getattr(config, 'AGREGACOES', GRANULARIDADES_PADRAO)
+    for nome in granularidades:
+        if nome not in GRANULARIDADES:
+            raise ValueError(f"Agregação desconhecida em config.AGREGACOES: '{nome}' "
+                             f"(opções: {', '.join(GRANULARIDADES)})")
+    return list(granularidades)
+
+def _codigos(df, coluna, rotulo_vazio):
+    """Códigos inteiros (0..n-1) e rótulos da coluna; valores vazios ganham o último código."""
+    if coluna not in df.columns:
+        return np.zeros(len(df), dtype=np.int64), np.array([rotulo_vazio], dtype=object)
+    serie = df[coluna]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy(dtype=np.int64)
+        rotulos = serie.cat.categories.astype(str).to_numpy(dtype=object)
+    else:
+        codigos, rotulos = pd.factorize(serie)
+        codigos = codigos.astype(np.int64)
+        rotulos = np.asarray(rotulos, dtype=object)
+    vazios = codigos < 0
+    if vazios.any():
+        codigos = np.where(vazios, len(rotulos), codigos)
+        rotulos = np.append(rotulos, rotulo_vazio)
+    return codigos, rotulos
+
+def _semanas(start_date, n_dias):
+    """Semanas (segunda a domingo) do período, recortadas nas pontas: [(início, fim)] e o índice de cada dia."""
+    deslocamento = start_date.weekday()
+    semana_do_dia = (np.arange(n_dias) + deslocamento) // 7
+    semanas = []
+    for semana in range(int(semana_do_dia[-1]) + 1):
+        dias = np.flatnonzero(semana_do_dia == semana)
+        semanas.append((start_date + timedelta(days=int(dias[0])), start_date + timedelta(days=int(dias[-1]))))
+    return semanas, semana_do_dia
+
+def _esperadas_por_intervalo(df_pessoas, intervalos):
+    """Matriz (pessoas x intervalos) das horas esperadas de cada pessoa em cada intervalo (início, fim)."""
+    if not intervalos:
+        return np.zeros((len(df_pessoas), 0))
+    return np.column_stack([processamento_dados.calcular_horas_esperadas(df_pessoas, inicio, fim)
+                            for inicio, fim in intervalos])
+
+def _tabela(rotulos, nome_coluna, aprovadas, esperadas, extras=None):
+    tabela = pd.DataFrame({nome_coluna: rotulos})
+    for nome, valores in (extras or {}).items():
+        tabela[nome] = valores
+    tabela['Horas Aprovadas'] = np.round(np.asarray(aprovadas, dtype=np.float64), 6)
+    tabela['Total Horas Esperadas'] = np.round(np.asarray(esperadas, dtype=np.float64), 6)
+    tabela['Total Saldo'] = (tabela['Horas Aprovadas'] - tabela['Total Horas Esperadas']).round(6)
+    return tabela
+
+def agregar(df_filtrado, start_date, end_date, df_pessoas_ativas=None, granularidades=None):
+    """
+    Calcula, de uma passada sobre df_filtrado, as horas aprovadas por profissional e as agregações
+    pedidas (padrão em config.AGREGACOES). Devolve um dicionário:
+    - 'profissional': Series {nome no relatório: horas aprovadas}, no formato aceito por
+      processamento_dados.gerar_resumo(horas_aprovadas=...);
+    - uma entrada por granularidade: DataFrame com a(s) coluna(s) da granularidade e
+      'Horas Aprovadas', 'Total Horas Esperadas' e 'Total Saldo'.
+    """
+    granularidades = _granularidades_configuradas() if granularidades is None else list(granularidades)
+    if df_pessoas_ativas is None:
+        df_pessoas_ativas = processamento_dados.get_pessoas_ativas()
+    print(f"Agregando {len(df_filtrado)} lançamentos por profissional"
+          f"{', ' + ', '.join(granularidades) if granularidades else ''}...")
+
+    n_dias = (end_date - start_date).days + 1
+    cod_prof, nomes = _codigos(df_filtrado, 'Profissional', '')
+    cod_proj, projetos = _codigos(df_filtrado, 'Projeto', '(sem projeto)')
+    cod_ativ, atividades = _codigos(df_filtrado, 'Atividade', '(sem atividade)')
+    datas = df_filtrado['Data'].to_numpy(dtype='datetime64[D]')
+    cod_dia = np.clip((datas - np.datetime64(start_date, 'D')).astype(np.int64), 0, n_dias - 1)
+    horas = df_filtrado['Horas'].to_numpy(dtype=np.float64)
+
+    # A única passada sobre os lançamentos: uma ordenação da chave combinada e uma soma por célula.
+    # Sem lançamentos as colunas não têm rótulos; as dimensões ficam em 1 para a chave continuar válida.
+    dimensoes = (max(len(nomes), 1), n_dias, max(len(projetos), 1), max(len(atividades), 1))
+    chave = np.ravel_multi_index((cod_prof, cod_dia, cod_proj, cod_ativ), dimensoes)
+    celulas, inversa = np.unique(chave, return_inverse=True)
+    # Com zero lançamentos o bincount devolve int64; as horas seguem sempre em float.
+    horas_celula = np.bincount(inversa.ravel(), weights=horas, minlength=len(celulas)).astype(np.float64)
+    prof_c, dia_c, proj_c, ativ_c = np.unravel_index(celulas, dimensoes)
+
+    horas_prof = np.bincount(prof_c, weights=horas_celula, minlength=len(nomes)).astype(np.float64)
+    com_lancamentos = np.bincount(prof_c, minlength=len(nomes)) > 0
+    resultado = {'profissional': pd.Series(
+        np.round(horas_prof[com_lancamentos], 6), index=pd.Index(nomes[com_lancamentos], dtype=object))}
+    if not granularidades:
+        return resultado
+
+    # Pessoa do cadastro de cada nome do relatório (pela chave normalizada e, com nomes repetidos no
+    # cadastro, a primeira linha, como no resumo).
+    chaves_cadastro = (df_pessoas_ativas['Chave'] if 'Chave' in df_pessoas_ativas.columns
+                       else processamento_dados.normalizar_nomes(df_pessoas_ativas['Profissional'])).to_numpy()
+    pessoa_do_nome = processamento_dados.posicoes_no_cadastro(
+        chaves_cadastro, processamento_dados.normalizar_nomes(pd.Series(nomes, dtype=object)).to_numpy())
+    no_cadastro = pessoa_do_nome[prof_c] >= 0
+    prof_c, dia_c, proj_c, ativ_c, horas_celula = (
+        valores[no_cadastro] for valores in (prof_c, dia_c, proj_c, ativ_c, horas_celula))
+    pessoa_c = pessoa_do_nome[prof_c]
+    n_pessoas = len(df_pessoas_ativas)
+
+    semanas, semana_do_dia = _semanas(start_date, n_dias)
+    semana_c = semana_do_dia[dia_c]
+
+    if 'dia' in granularidades:
+        dias = [start_date + timedelta(days=d) for d in range(n_dias)]
+        esperadas = _esperadas_por_intervalo(df_pessoas_ativas, [(dia, dia) for dia in dias]).sum(axis=0)
+        resultado['dia'] = _tabela(
+            [f"{dia:%d/%m/%Y} ({DIAS_SEMANA_PT[dia.weekday()]})" for dia in dias], 'Dia',
+            np.bincount(dia_c, weights=horas_celula, minlength=n_dias), esperadas)
+
+    if 'semana' in granularidades or 'profissional_semana' in granularidades:
+        esperadas_semana = _esperadas_por_intervalo(df_pessoas_ativas, semanas)
+        rotulos_semana = [f"{inicio:%d/%m} a {fim:%d/%m}" for inicio, fim in semanas]
+        if 'semana' in granularidades:
+            resultado['semana'] = _tabela(
+                rotulos_semana, 'Semana',
+                np.bincount(semana_c, weights=horas_celula, minlength=len(semanas)), esperadas_semana.sum(axis=0))
+        if 'profissional_semana' in granularidades:
+            # Grade completa cadastro x semanas: semanas sem lançamento aparecem com o saldo negativo.
+            aprovadas = np.bincount(pessoa_c * len(semanas) + semana_c, weights=horas_celula,
+                                    minlength=n_pessoas * len(semanas))
+            tabela = _tabela(np.repeat(df_pessoas_ativas['Profissional'].to_numpy(dtype=object), len(semanas)),
+                             'Profissional', aprovadas, esperadas_semana.ravel(),
+                             extras={'Semana': np.tile(rotulos_semana, n_pessoas)})
+            ordem = np.lexsort((np.tile(np.arange(len(semanas)), n_pessoas), tabela['Profissional'].to_numpy()))
+            resultado['profissional_semana'] = tabela.iloc[ordem].reset_index(drop=True)
+
+    if 'projeto' in granularidades or 'atividade' in granularidades:
+        # Parcela das horas esperadas de cada pessoa atribuída a cada célula: proporcional às horas aprovadas.
+        esperadas_pessoa = processamento_dados.calcular_horas_esperadas(df_pessoas_ativas, start_date, end_date)
+        horas_pessoa = np.bincount(pessoa_c, weights=horas_celula, minlength=n_pessoas)
+        fracao = np.divide(horas_celula, horas_pessoa[pessoa_c],
+                           out=np.zeros(len(horas_celula), dtype=np.float64), where=horas_pessoa[pessoa_c] != 0)
+        esperadas_celula = fracao * esperadas_pessoa[pessoa_c]
+        for nome, codigos, rotulos, coluna in (('projeto', proj_c, projetos, 'Projeto'),
+                                               ('atividade', ativ_c, atividades, 'Atividade')):
+            if nome not in granularidades:
+                continue
+            pares = np.unique(pessoa_c * len(rotulos) + codigos)
+            tabela = _tabela(rotulos, coluna,
+                             np.bincount(codigos, weights=horas_celula, minlength=len(rotulos)),
+                             np.bincount(codigos, weights=esperadas_celula, minlength=len(rotulos)),
+                             extras={'Profissionais': np.bincount(pares % len(rotulos), minlength=len(rotulos))})
+            tabela = tabela[tabela['Profissionais'] > 0]
+            resultado[nome] = tabela.sort_values(['Horas Aprovadas', coluna], ascending=[False, True]).reset_index(drop=True)
+
+    return {nome: resultado[nome] for nome in ['profissional'] + [g for g in GRANULARIDADES if g in resultado]}
+
+def tabelas(agregacoes):
+    """[(título, DataFrame)] das agregações extras, na ordem de GRANULARIDADES (sem a de profissional)."""
+    if not agregacoes:
+        return []
+    return [(GRANULARIDADES[nome], tabela) for nome, tabela in agregacoes.items() if nome in GRANULARIDADES]
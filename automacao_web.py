@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+import atexit
+import json
 import os
 import time
 import shutil
+import tempfile
+import threading
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -9,25 +13,144 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
 import config
+import metricas
+from monitor_download import MonitorDownload
 
 # MODIFICADO: A função agora aceita um argumento para saber qual botão clicar
 def login_e_download(period_button_text="Mês Corrente"):
-    """Orquestra a automação web: login, navegação e download usando o filtro especificado."""
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless") 
-    options.add_argument("--start-maximized")
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    driver = webdriver.Chrome(options=options)
-    
-    try:
-        wait = WebDriverWait(driver, 20)
-        print("Acessando o site...")
-        driver.get(config.SITE_URL)
+    """
+    Orquestra a automação web: login, navegação e download usando o filtro especificado.
+    Com config.MODO_DOWNLOAD = 'http', tenta primeiro a exportação direta por HTTP
+    (sem navegador) e só recorre ao Chrome se ela falhar.
+    """
+    if getattr(config, 'MODO_DOWNLOAD', 'selenium') == 'http':
+        try:
+            import exportacao_http
+            return exportacao_http.login_e_download_http(period_button_text)
+        except Exception as e:
+            print(f"AVISO: Exportação por HTTP falhou ({e}). Usando o navegador como alternativa.")
+    return _login_e_download_selenium(period_button_text)
+
+def _login_e_download_selenium(period_button_text):
+    """Caminho pelo navegador (Selenium + Chrome headless)."""
+    if getattr(config, 'MANTER_NAVEGADOR_ABERTO', False):
+        # Modo "aquecido": o navegador (já logado) fica no pool para as próximas exportações.
+        pool = get_pool_navegadores()
+        chave = pool.chave()
+        try:
+            return pool.obter().exportar(period_button_text)
+        except BaseException:
+            # O navegador pode ter ficado num estado inválido (ou morrido): não volta para o pool.
+            pool.descartar(chave)
+            raise
+    with NavegadorRelatorio() as navegador:
+        return navegador.exportar(period_button_text)
+
+def _arquivo_cookies_navegador():
+    return getattr(config, 'ARQUIVO_COOKIES_NAVEGADOR', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.cache', 'cookies_navegador.json')
+
+class NavegadorRelatorio:
+    """
+    Um Chrome headless pronto para exportar o relatório. Reaproveita a sessão do site entre
+    execuções (perfil do Chrome em config.PERFIL_CHROME ou cookies serializados), pula o login
+    quando a sessão ainda é válida e pode exportar vários períodos sem ser reaberto.
+    """
+
+    def __init__(self, site_url=None, login=None, senha=None):
+        self.site_url = site_url or config.SITE_URL
+        self.login = login or config.SITE_LOGIN
+        self.senha = senha or config.SITE_SENHA
+        self.perfil = getattr(config, 'PERFIL_CHROME', None)
+        self.driver = None
+        self.pasta_download = None
+        self._cookies_restaurados = False
+
+    def __enter__(self):
+        self.abrir()
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+    def abrir(self):
+        # Pasta exclusiva deste navegador: o arquivo baixado é o único que aparece nela,
+        # sem ambiguidade com outros downloads que caiam na pasta Downloads do usuário.
+        self.pasta_download = tempfile.mkdtemp(prefix='robo_horas_', dir=getattr(config, 'PASTA_DOWNLOADS_TEMPORARIA', None))
+
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless") 
+        options.add_argument("--start-maximized")
+        if self.perfil:
+            options.add_argument(f"--user-data-dir={os.path.abspath(self.perfil)}")
+        options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        options.add_experimental_option('prefs', {
+            'download.default_directory': self.pasta_download,
+            'download.prompt_for_download': False,
+            'download.directory_upgrade': True,
+        })
+        self.driver = webdriver.Chrome(options=options)
+        try:
+            # Garante o destino do download também no modo headless.
+            self.driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': self.pasta_download})
+        except Exception:
+            pass
+
+    def fechar(self):
+        if self.driver:
+            print("Fechando navegador...")
+            try:
+                self.driver.quit()
+            finally:
+                self.driver = None
+                self._cookies_restaurados = False
+        if self.pasta_download:
+            shutil.rmtree(self.pasta_download, ignore_errors=True)
+            self.pasta_download = None
+
+    def _carregar_cookies(self):
+        """Sem perfil persistente, restaura os cookies salvos da última execução (precisa estar no domínio)."""
+        caminho = _arquivo_cookies_navegador()
+        if self.perfil or not os.path.exists(caminho):
+            return False
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                cookies = json.load(arquivo)
+            for cookie in cookies:
+                cookie.pop('sameSite', None)
+                self.driver.add_cookie(cookie)
+            return bool(cookies)
+        except Exception as e:
+            print(f"AVISO: Não foi possível restaurar os cookies do navegador: {e}")
+            return False
+
+    def _salvar_cookies(self):
+        if self.perfil:
+            return
+        caminho = _arquivo_cookies_navegador()
+        try:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump(self.driver.get_cookies(), arquivo)
+        except Exception as e:
+            print(f"AVISO: Não foi possível salvar os cookies do navegador: {e}")
+
+    def _link_relatorio(self, espera):
+        """Devolve o link do relatório se a página atual estiver logada, ou None."""
+        try:
+            return WebDriverWait(self.driver, espera).until(
+                EC.element_to_be_clickable((By.LINK_TEXT, "Resumo de Horas por Profissional")))
+        except TimeoutException:
+            return None
+
+    def _fazer_login(self):
+        wait = WebDriverWait(self.driver, 20)
 
         # Etapa 1: Lidar com o banner de cookies
         try:
             print("Procurando pelo banner de cookies...")
-            cookie_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, "ok_cookie")))
+            cookie_button = WebDriverWait(self.driver, 5).until(EC.element_to_be_clickable((By.ID, "ok_cookie")))
             cookie_button.click()
             print("Banner de cookies aceito.")
         except TimeoutException:
@@ -37,66 +160,104 @@ def login_e_download(period_button_text="Mês Corrente"):
         print("Realizando login...")
         try:
             username_field = wait.until(EC.presence_of_element_located((By.NAME, "LoginName")))
-            password_field = driver.find_element(By.NAME, "Password")
-            username_field.send_keys(config.SITE_LOGIN)
-            password_field.send_keys(config.SITE_SENHA)
-            driver.find_element(By.ID, "button_processLogin").click()
-            resumo_horas_link = WebDriverWait(driver, 15).until(EC.element_to_be_clickable((By.LINK_TEXT, "Resumo de Horas por Profissional")))
+            password_field = self.driver.find_element(By.NAME, "Password")
+            username_field.send_keys(self.login)
+            password_field.send_keys(self.senha)
+            self.driver.find_element(By.ID, "button_processLogin").click()
+            resumo_horas_link = self._link_relatorio(espera=15)
+            if resumo_horas_link is None:
+                raise TimeoutException()
             print("Login bem-sucedido.")
-            resumo_horas_link.click()
+            self._salvar_cookies()
+            return resumo_horas_link
         except TimeoutException:
             print("\nERRO CRÍTICO: Login falhou ou a página não carregou corretamente.")
             raise Exception("Não foi possível encontrar o link 'Resumo de Horas por Profissional' após o login.")
-        
+
+    def garantir_sessao(self):
+        """Deixa o navegador na página inicial logada, fazendo login só se a sessão não for mais válida."""
+        if self.driver is None:
+            with metricas.span('abrir_navegador'):
+                self.abrir()
+
+        print("Acessando o site...")
+        self.driver.get(self.site_url)
+        if not self._cookies_restaurados:
+            self._cookies_restaurados = True
+            if self._carregar_cookies():
+                self.driver.get(self.site_url)
+
+        # Espera o que aparecer primeiro: o link do relatório (sessão válida) ou o formulário de login.
+        try:
+            WebDriverWait(self.driver, getattr(config, 'TEMPO_VERIFICACAO_SESSAO', 10)).until(EC.any_of(
+                EC.element_to_be_clickable((By.LINK_TEXT, "Resumo de Horas por Profissional")),
+                EC.presence_of_element_located((By.NAME, "LoginName"))
+            ))
+        except TimeoutException:
+            pass
+        links = self.driver.find_elements(By.LINK_TEXT, "Resumo de Horas por Profissional")
+        if links:
+            print("Sessão anterior ainda válida, login dispensado.")
+            return links[0]
+        with metricas.span('login'):
+            return self._fazer_login()
+
+    def exportar(self, period_button_text="Mês Corrente"):
+        """Exporta o relatório do período e devolve o caminho do arquivo na pasta do projeto."""
+        with metricas.span('sessao'):
+            resumo_horas_link = self.garantir_sessao()
+        driver = self.driver
+        wait = WebDriverWait(driver, 20)
+        janela_principal = driver.current_window_handle
+        janelas_antes = set(driver.window_handles)
+        resumo_horas_link.click()
+
         # Etapa 3: Mudar para a nova janela de filtros
         print("Aguardando a página de filtros carregar...")
-        wait.until(EC.number_of_windows_to_be(2))
-        driver.switch_to.window(driver.window_handles[1])
-
-        # Etapa 4: Aplicar filtro de data
-        print(f"Aplicando filtro de data '{period_button_text}'...")
-        date_input = wait.until(EC.visibility_of_element_located((By.ID, "P_DATA_show")))
-        date_input.click()
+        wait.until(EC.number_of_windows_to_be(len(janelas_antes) + 1))
+        janela_filtros = (set(driver.window_handles) - janelas_antes).pop()
+        driver.switch_to.window(janela_filtros)
 
-        time.sleep(1) 
-        
         try:
-            print(f"Procurando pela opção '{period_button_text}'...")
-            # MODIFICADO: O seletor agora usa a variável para encontrar o botão certo
-            xpath_selector = f"//li[normalize-space()='{period_button_text}']"
-            period_option = wait.until(EC.presence_of_element_located((By.XPATH, xpath_selector)))
+            # Etapa 4: Aplicar filtro de data
+            print(f"Aplicando filtro de data '{period_button_text}'...")
+            date_input = wait.until(EC.visibility_of_element_located((By.ID, "P_DATA_show")))
+            date_input.click()
+
+            time.sleep(1) 
             
-            driver.execute_script("arguments[0].click();", period_option)
-            print(f"Filtro '{period_button_text}' aplicado com sucesso.")
-        except TimeoutException as e:
-            print(f"\nERRO CRÍTICO: Não foi possível encontrar a opção '{period_button_text}' no menu de datas.")
-            raise e
-
-        # Etapa 5: Baixar o arquivo
-        arquivos_antes = set(os.listdir(config.PASTA_DOWNLOADS))
-        print("Exportando para Excel...")
-        driver.find_element(By.ID, "button_ExecuteXSL").click()
-        print("Aguardando download...")
-        time.sleep(10)
-
-        # Etapa 6: Monitorar o download
-        caminho_arquivo_baixado = None
-        start_time = time.time()
-        while time.time() - start_time < 60:
-            arquivos_depois = set(os.listdir(config.PASTA_DOWNLOADS))
-            novos_arquivos = arquivos_depois - arquivos_antes
-            if novos_arquivos and not any(f.endswith('.crdownload') for f in novos_arquivos):
-                nome_do_arquivo = novos_arquivos.pop()
-                caminho_arquivo_baixado = os.path.join(config.PASTA_DOWNLOADS, nome_do_arquivo)
-                print(f"Novo arquivo detectado: {nome_do_arquivo}")
-                break
-            time.sleep(1)
-
-        if not caminho_arquivo_baixado:
-            raise TimeoutException("O download do arquivo demorou mais de 60 segundos.")
-        
-        time.sleep(2)
-        print("Download concluído.")
+            try:
+                print(f"Procurando pela opção '{period_button_text}'...")
+                # MODIFICADO: O seletor agora usa a variável para encontrar o botão certo
+                xpath_selector = f"//li[normalize-space()='{period_button_text}']"
+                period_option = wait.until(EC.presence_of_element_located((By.XPATH, xpath_selector)))
+                
+                driver.execute_script("arguments[0].click();", period_option)
+                print(f"Filtro '{period_button_text}' aplicado com sucesso.")
+            except TimeoutException as e:
+                print(f"\nERRO CRÍTICO: Não foi possível encontrar a opção '{period_button_text}' no menu de datas.")
+                raise e
+
+            # Etapa 5 e 6: Baixar o arquivo e aguardar o fim da gravação
+            tempo_limite = getattr(config, 'TEMPO_LIMITE_DOWNLOAD', 60)
+            with MonitorDownload(self.pasta_download) as monitor:
+                print("Exportando para Excel...")
+                driver.find_element(By.ID, "button_ExecuteXSL").click()
+                print("Aguardando download...")
+                with metricas.span('aguardar_download'):
+                    caminho_arquivo_baixado = monitor.aguardar(timeout=tempo_limite)
+
+            if not caminho_arquivo_baixado:
+                raise TimeoutException(f"O download do arquivo demorou mais de {tempo_limite} segundos.")
+            
+            print(f"Download concluído: {os.path.basename(caminho_arquivo_baixado)}")
+        finally:
+            # Fecha a janela de filtros para que o navegador possa ser reaproveitado.
+            try:
+                driver.close()
+                driver.switch_to.window(janela_principal)
+            except Exception:
+                pass
         
         # Etapa 7: Mover o arquivo
         caminho_destino = os.path.join(os.getcwd(), os.path.basename(caminho_arquivo_baixado))
@@ -105,7 +266,63 @@ def login_e_download(period_button_text="Mês Corrente"):
         
         return caminho_destino
 
-    finally:
-        if 'driver' in locals() and driver:
-            print("Fechando navegador...")
-            driver.quit()
\ No newline at end of file
+class PoolNavegadores:
+    """
+    Mantém navegadores abertos e logados entre exportações, um por conta (site + login),
+    para quando vários períodos ou contas são exportados na mesma execução.
+    """
+
+    def __init__(self):
+        self._navegadores = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(site_url=None, login=None):
+        return (site_url or config.SITE_URL, login or config.SITE_LOGIN)
+
+    def obter(self, site_url=None, login=None, senha=None):
+        chave = self.chave(site_url, login)
+        with self._lock:
+            navegador = self._navegadores.get(chave)
+            if navegador is None:
+                navegador = NavegadorRelatorio(site_url, login, senha)
+                self._navegadores[chave] = navegador
+        return navegador
+
+    def descartar(self, chave):
+        """Fecha e tira do pool o navegador da conta; o próximo obter() abre um novo."""
+        with self._lock:
+            navegador = self._navegadores.pop(chave, None)
+        if navegador is not None:
+            try:
+                navegador.fechar()
+            except Exception as e:
+                print(f"AVISO: Erro ao fechar navegador do pool: {e}")
+
+    def fechar(self):
+        with self._lock:
+            navegadores, self._navegadores = list(self._navegadores.values()), {}
+        for navegador in navegadores:
+            try:
+                navegador.fechar()
+            except Exception as e:
+                print(f"AVISO: Erro ao fechar navegador do pool: {e}")
+
+_pool_navegadores = None
+
+def get_pool_navegadores():
+    global _pool_navegadores
+    if _pool_navegadores is None:
+        _pool_navegadores = PoolNavegadores()
+        atexit.register(_pool_navegadores.fechar)
+    return _pool_navegadores
+
+def fechar_pool_navegadores():
+    """Fecha todos os navegadores mantidos abertos pelo modo MANTER_NAVEGADOR_ABERTO."""
+    if _pool_navegadores is not None:
+        _pool_navegadores.fechar()
+
+def exportar_periodos(periodos):
+    """Exporta vários períodos (textos do menu de datas) com um único navegador e um único login."""
+    with NavegadorRelatorio() as navegador:
+        return [navegador.exportar(periodo) for periodo in periodos]
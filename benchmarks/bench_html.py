@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark do dataframe_to_html: vazão (linhas/s) do renderizador vetorizado
+comparado à implementação anterior, baseada em df.iterrows().
+
+Uso: python benchmarks/bench_html.py [linhas]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import processamento_dados
+
+def dataframe_to_html_anterior(df):
+    """Cópia da implementação anterior, mantida aqui apenas como referência de comparação."""
+    style_table = 'width: auto; max-width: 800px; border-collapse: collapse; font-family: Calibri, sans-serif; font-size: 11pt; margin-bottom: 25px;'
+    style_th = 'background-color: #4472C4; color: #ffffff; padding: 12px 15px; text-align: left; font-weight: bold; border: 1px solid #dddddd;'
+    style_td = 'padding: 12px 15px; text-align: left; border: 1px solid #dddddd;'
+    style_tr_even = 'background-color: #f8f8f8;'
+
+    headers = "".join([f'<th style="{style_th}">{col}</th>' for col in df.columns])
+    html_header = f'<thead><tr>{headers}</tr></thead>'
+
+    html_body_rows = []
+    for index, row in df.iterrows():
+        tr_style = style_tr_even if index % 2 == 0 else ''
+        row_html = f'<tr style="{tr_style}">'
+        for col_name, cell_value in row.items():
+            align_style = 'text-align: right;' if isinstance(cell_value, (int, float)) else 'text-align: left;'
+            color_style = ''
+            if col_name == 'Total Saldo':
+                if cell_value < 0:
+                    color_style = 'color: red; font-weight: bold;'
+                elif cell_value > 0:
+                    color_style = 'color: green; font-weight: bold;'
+            final_style = f"{style_td} {align_style} {color_style}"
+            cell_display = f'{cell_value:.2f}' if isinstance(cell_value, (int, float)) else cell_value
+            row_html += f'<td style="{final_style}">{cell_display}</td>'
+        row_html += '</tr>'
+        html_body_rows.append(row_html)
+
+    html_body = f'<tbody>{"".join(html_body_rows)}</tbody>'
+    return f'<table style="{style_table}">{html_header}{html_body}</table>'
+
+def gerar_resumo_sintetico(linhas, semente=42):
+    rnd = np.random.default_rng(semente)
+    aprovadas = rnd.integers(0, 200, linhas).astype(float)
+    esperadas = np.full(linhas, 168.0)
+    return pd.DataFrame({
+        'Profissional': [f"Profissional {i:06d}" for i in range(linhas)],
+        'Horas Aprovadas': aprovadas,
+        'Total Horas Esperadas': esperadas,
+        'Total Saldo': aprovadas - esperadas,
+    })
+
+def medir(funcao, df, repeticoes=3):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        html = funcao(df)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return html, melhor
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    df = gerar_resumo_sintetico(linhas)
+
+    html_anterior, tempo_anterior = medir(dataframe_to_html_anterior, df)
+    html_novo, tempo_novo = medir(processamento_dados.dataframe_to_html, df)
+    # Com índice em ordem (sem sort_values) as duas versões devem gerar exatamente o mesmo HTML.
+    assert html_anterior == html_novo, "O renderizador vetorizado gerou um HTML diferente do anterior."
+
+    print(f"{linhas} linhas")
+    print(f"{'Versão':<12}{'Tempo (s)':>12}{'Linhas/s':>14}")
+    print(f"{'anterior':<12}{tempo_anterior:>12.3f}{linhas / tempo_anterior:>14,.0f}")
+    print(f"{'vetorizada':<12}{tempo_novo:>12.3f}{linhas / tempo_novo:>14,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Mede o custo de inicialização do robô em processos novos (como numa execução agendada):
+
+- importar o main.py (importações sob demanda) x importar de uma vez todos os módulos
+  que ele carregava antes (selenium, pandas, win32com quando houver);
+- o modo offline de ponta a ponta (python main.py --arquivo-local), com o cache de
+  planilhas frio e quente, comparado com o tempo das próprias etapas.
+
+Uso: python benchmarks/bench_inicializacao.py [linhas] [repetições]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_PROJETO = os.path.dirname(PASTA_BENCHMARKS)
+sys.path.insert(0, PASTA_PROJETO)
+
+from gerador_sintetico import gerar_exportacao, gerar_pessoas_ativas
+
+IMPORTACAO_ANTIGA = ("import main, automacao_web, excel_handler, processamento_dados, "
+                     "relatorios_gestores, historico, delta_execucao")
+
+def _executar(codigo, repeticoes):
+    """
+    Melhor tempo de parede (s) de `python -c codigo` num processo novo, e o que a melhor
+    execução escreveu no stderr.
+    """
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [PASTA_PROJETO, os.environ.get('PYTHONPATH')])))
+    melhor, saida = float('inf'), ''
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        processo = subprocess.run([sys.executable, '-c', codigo], check=True, env=ambiente, text=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=PASTA_PROJETO)
+        duracao = time.perf_counter() - inicio
+        if duracao < melhor:
+            melhor, saida = duracao, processo.stderr
+    return melhor, saida
+
+def _codigo_modo_local(exportacao, pessoas, pasta_cache, pasta_saida):
+    """Roda o modo offline e escreve no stderr o tempo gasto nas etapas (sem importações e inicialização)."""
+    return (
+        "import config, main, sys\n"
+        f"config.CAMINHO_PESSOAS_ATIVAS = {pessoas!r}\n"
+        f"config.PASTA_CACHE = {pasta_cache!r}\n"
+        f"r = main.processar_arquivo_local({exportacao!r}, main.date_logic.get_periodo_mes(2025, 1), {pasta_saida!r})\n"
+        "sys.stderr.write(f\"{r['tempo_total']:.6f}\")\n"
+    )
+
+def _linha(rotulo, segundos, etapas=None):
+    extra = f"{etapas:>12.3f}{segundos - etapas:>14.3f}" if etapas is not None else ''
+    print(f"{rotulo:<46}{segundos:>10.3f}{extra}")
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"{'Medição':<46}{'Total (s)':>10}{'Etapas (s)':>12}{'Overhead (s)':>14}")
+    _linha('python -c pass (interpretador)', _executar('pass', repeticoes)[0])
+    _linha('import main (sob demanda)', _executar('import main', repeticoes)[0])
+    _linha('import main + módulos das etapas (antes)', _executar(IMPORTACAO_ANTIGA, repeticoes)[0])
+
+    with tempfile.TemporaryDirectory() as pasta:
+        exportacao = gerar_exportacao(os.path.join(pasta, 'exportacao.xlsx'), linhas=linhas)
+        pessoas = gerar_pessoas_ativas(os.path.join(pasta, 'pessoas.xlsx'), profissionais=100)
+        codigo = _codigo_modo_local(exportacao, pessoas, os.path.join(pasta, 'cache'), os.path.join(pasta, 'saida'))
+
+        # Uma execução só: a primeira é justamente a do cache frio.
+        total, etapas = _executar(codigo, 1)
+        _linha(f"--arquivo-local, {linhas} linhas, cache frio", total, float(etapas))
+        total, etapas = _executar(codigo, repeticoes)
+        _linha(f"--arquivo-local, {linhas} linhas, cache quente", total, float(etapas))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Compara os bytes por linha, coluna a coluna, entre o layout antigo das linhas do relatório
+(textos como object, Horas em float64 e Descrição carregada) e o layout compacto emitido
+hoje por processar_planilha (categorias, float32 e Descrição adiada até o anexo).
+
+Uso: python benchmarks/bench_layout.py [linhas]
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import config
+import processamento_dados
+from gerador_sintetico import gerar_exportacao
+
+def layout_antigo(df):
+    """Reconstrói o layout de antes: colunas de texto como object e Horas em float64."""
+    antigo = df.copy()
+    for col in antigo.columns:
+        if isinstance(antigo[col].dtype, pd.CategoricalDtype) or col == 'Descrição':
+            antigo[col] = antigo[col].astype(object)
+    antigo['Horas'] = antigo['Horas'].astype('float64')
+    return antigo.reset_index(drop=True)
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start_date, end_date = date(2025, 1, 1), date(2025, 1, 31)
+    with tempfile.TemporaryDirectory() as pasta:
+        config.PASTA_CACHE = os.path.join(pasta, 'cache')
+        caminho = gerar_exportacao(os.path.join(pasta, 'exportacao.xlsx'), linhas=linhas)
+        df_novo = processamento_dados.processar_planilha(caminho, start_date, end_date, usar_cache=True)
+        df_completo = df_novo.assign(**{'Descrição': processamento_dados.carregar_descricao(df_novo)})
+        df_antigo = layout_antigo(df_completo)
+
+    total = len(df_novo)
+    uso_antigo = df_antigo.memory_usage(deep=True)
+    uso_novo = df_novo.memory_usage(deep=True)
+    print(f"\n{linhas} linhas no arquivo, {total} aprovadas no período")
+    print(f"{'Coluna':<14}{'Antes (B/linha)':>17}{'Depois (B/linha)':>18}")
+    for col in uso_antigo.index:
+        depois = uso_novo.get(col, 0) / total
+        rotulo = f"{depois:>18.1f}" if col in uso_novo.index else f"{'(adiada)':>18}"
+        print(f"{col:<14}{uso_antigo[col] / total:>17.1f}{rotulo}")
+    print(f"{'Total':<14}{processamento_dados.bytes_por_linha(df_antigo):>17.1f}"
+          f"{processamento_dados.bytes_por_linha(df_novo):>18.1f}")
+
+if __name__ == '__main__':
+    main()
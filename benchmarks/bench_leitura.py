@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Compara o tempo e o pico de memória da leitura do relatório (processar_planilha)
+entre o motor 'streaming' e o caminho antigo 'pandas'.
+
+Uso: python benchmarks/bench_leitura.py [linhas]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import processamento_dados
+from gerador_sintetico import gerar_exportacao
+
+def medir(motor, caminho, start_date, end_date):
+    # O tempo é medido sem o tracemalloc ligado, que distorce bastante a duração.
+    inicio = time.perf_counter()
+    df = processamento_dados.processar_planilha(caminho, start_date, end_date, motor=motor)
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    processamento_dados.processar_planilha(caminho, start_date, end_date, motor=motor)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, duracao, pico
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start_date, end_date = date(2025, 1, 1), date(2025, 1, 24)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = gerar_exportacao(os.path.join(pasta, 'exportacao.xlsx'), linhas=linhas)
+        resultados = {}
+        for motor in ('pandas', 'streaming'):
+            resultados[motor] = medir(motor, caminho, start_date, end_date)
+
+    df_pandas, df_streaming = resultados['pandas'][0], resultados['streaming'][0]
+    assert len(df_pandas) == len(df_streaming), "Os motores produziram quantidades diferentes de linhas."
+    assert abs(df_pandas['Horas'].sum() - df_streaming['Horas'].sum()) < 1e-6
+
+    print(f"\n{linhas} linhas no arquivo, {len(df_streaming)} aprovadas no período")
+    print(f"{'Motor':<12}{'Tempo (s)':>12}{'Pico (MB)':>12}")
+    for motor, (_, duracao, pico) in resultados.items():
+        print(f"{motor:<12}{duracao:>12.2f}{pico / 1024 / 1024:>12.1f}")
+
+if __name__ == '__main__':
+    main()
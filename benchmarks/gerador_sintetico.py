@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Gera exportações sintéticas no mesmo layout do relatório baixado do site (18 linhas de preâmbulo + títulos)."""
+import random
+from datetime import date, timedelta
+
+import xlsxwriter
+
+TITULOS = ['Data', 'Projeto', 'Profissional', 'Horas', 'Situação', 'Atividade', 'Descrição']
+SITUACOES = ['Aprovado'] * 7 + ['Pendente', 'Reprovado', 'Em Aprovação']
+
+def nomes_profissionais(profissionais):
+    return [f"Profissional {i:05d}" for i in range(profissionais)]
+
+def gerar_exportacao(caminho, linhas=10000, profissionais=100, inicio=date(2025, 1, 1), dias=31, semente=42):
+    """Escreve um .xlsx sintético com `linhas` lançamentos de `profissionais` pessoas em `dias` dias."""
+    rnd = random.Random(semente)
+    nomes = nomes_profissionais(profissionais)
+    projetos = [f"PRJ-{i:03d} Projeto {i}" for i in range(max(1, profissionais // 5))]
+    atividades = ['Desenvolvimento', 'Reunião', 'Testes', 'Documentação', 'Suporte']
+    datas = [(inicio + timedelta(days=d)).strftime('%d/%m/%Y') for d in range(dias)]
+
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Relatorio')
+    worksheet.write(0, 0, 'Resumo de Horas por Profissional')
+    for linha in range(1, 18):
+        worksheet.write(linha, 0, f'Filtro {linha}: valor')
+    worksheet.write_row(18, 0, TITULOS)
+    for i in range(linhas):
+        worksheet.write_row(19 + i, 0, [
+            rnd.choice(datas),
+            rnd.choice(projetos),
+            rnd.choice(nomes),
+            rnd.choice((1, 2, 4, 8, 0.5, 1.5)),
+            rnd.choice(SITUACOES),
+            rnd.choice(atividades),
+            f'Lançamento {i} - descrição livre do trabalho realizado',
+        ])
+    workbook.close()
+    return caminho
+
+def gerar_pessoas_ativas(caminho, profissionais=100, semente=42):
+    """Escreve o arquivo de pessoas ativas correspondente às exportações sintéticas (mesmos nomes)."""
+    rnd = random.Random(semente)
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Pessoas')
+    worksheet.write_row(0, 0, ['Nome', 'Jornada Diária'])
+    for i, nome in enumerate(nomes_profissionais(profissionais), start=1):
+        worksheet.write_row(i, 0, [nome, rnd.choice((8, 8, 8, 6, 4))])
+    workbook.close()
+    return caminho
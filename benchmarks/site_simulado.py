@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita as páginas do site usadas pelo exportacao_http.py, para testar o
+MODO_DOWNLOAD = 'http' sem acesso ao site real:
+
+- GET  /          página de login (formulário com LoginName/Password e um campo oculto) ou,
+                  com a sessão válida, o link "Resumo de Horas por Profissional";
+- POST /login     confere o usuário e a senha e devolve o cookie de sessão;
+- GET  /filtros   formulário de exportação (P_DATA e button_ExecuteXSL) com as opções de data;
+- POST /exportar  devolve uma exportação sintética (gerador_sintetico.gerar_exportacao).
+
+--falhas-exportacao N faz os N primeiros pedidos de exportação responderem 503, para conferir
+que o POST não é repetido automaticamente.
+
+Uso:
+    python benchmarks/site_simulado.py --porta 8765 --linhas 10000
+    # no config.py: SITE_URL = 'http://127.0.0.1:8765/', SITE_LOGIN = 'usuario',
+    #               SITE_SENHA = 'senha', MODO_DOWNLOAD = 'http'
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gerador_sintetico import gerar_exportacao
+
+# Valores do campo P_DATA de cada opção do menu de datas.
+VALORES_PERIODO = {'Mês Corrente': 'MC', 'Mês passado': 'MP'}
+
+class SiteSimulado:
+    """Estado do site: credenciais, sessões abertas, a planilha servida e contadores de pedidos."""
+
+    def __init__(self, planilha, usuario='usuario', senha='senha', falhas_exportacao=0):
+        self.planilha = planilha
+        self.usuario = usuario
+        self.senha = senha
+        self.falhas_exportacao = falhas_exportacao
+        self.sessoes = set()
+        self.contadores = {'login': 0, 'exportacao': 0}
+        self._lock = threading.Lock()
+
+    def contar(self, nome):
+        with self._lock:
+            self.contadores[nome] += 1
+            return self.contadores[nome]
+
+def _criar_manipulador(site):
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, corpo=b'', tipo='text/html; charset=utf-8', cabecalhos=None):
+            self.send_response(codigo)
+            self.send_header('Content-Type', tipo)
+            for nome, valor in (cabecalhos or {}).items():
+                self.send_header(nome, valor)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _logado(self):
+            for parte in (self.headers.get('Cookie') or '').split(';'):
+                nome, _, valor = parte.strip().partition('=')
+                if nome == 'sessao' and valor in site.sessoes:
+                    return True
+            return False
+
+        def _formulario(self):
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            campos = parse_qs(self.rfile.read(tamanho).decode('utf-8'))
+            return {nome: valores[0] for nome, valores in campos.items()}
+
+        def do_GET(self):
+            if self.path == '/':
+                if self._logado():
+                    corpo = '<a href="/filtros" target="_blank">Resumo de Horas por Profissional</a>'
+                else:
+                    corpo = ('<form action="/login" method="post">'
+                             '<input type="hidden" name="token" value="t1">'
+                             '<input name="LoginName"><input type="password" name="Password">'
+                             '<button id="button_processLogin" name="acao" value="entrar">Entrar</button></form>')
+                self._responder(200, corpo.encode('utf-8'))
+            elif self.path == '/filtros' and self._logado():
+                opcoes = ''.join(f'<li data-value="{valor}">{texto}</li>' for texto, valor in VALORES_PERIODO.items())
+                corpo = ('<form action="/exportar" method="post"><input id="P_DATA_show">'
+                         f'<input type="hidden" name="P_DATA" value=""><ul>{opcoes}</ul>'
+                         '<input type="submit" id="button_ExecuteXSL" name="button_ExecuteXSL" value="Excel"></form>')
+                self._responder(200, corpo.encode('utf-8'))
+            else:
+                self._responder(403)
+
+        def do_POST(self):
+            campos = self._formulario()
+            if self.path == '/login':
+                site.contar('login')
+                if (campos.get('token') != 't1' or campos.get('LoginName') != site.usuario
+                        or campos.get('Password') != site.senha):
+                    self._responder(200, '<p>Usuário ou senha inválidos.</p>'.encode('utf-8'))
+                    return
+                sessao = secrets.token_hex(8)
+                site.sessoes.add(sessao)
+                self._responder(200, '<a href="/filtros">Resumo de Horas por Profissional</a>'.encode('utf-8'),
+                                cabecalhos={'Set-Cookie': f'sessao={sessao}; Path=/'})
+            elif self.path == '/exportar' and self._logado():
+                if site.contar('exportacao') <= site.falhas_exportacao:
+                    self._responder(503, b'Servico indisponivel')
+                    return
+                if campos.get('P_DATA') not in VALORES_PERIODO.values() or 'button_ExecuteXSL' not in campos:
+                    self._responder(400, b'Filtro invalido')
+                    return
+                with open(site.planilha, 'rb') as arquivo:
+                    corpo = arquivo.read()
+                self._responder(200, corpo, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                                {'Content-Disposition': 'attachment; filename="Resumo_de_Horas_por_Profissional.xlsx"'})
+            else:
+                self._responder(403)
+
+        def log_message(self, formato, *args):
+            print(f"[site simulado] {self.command} {self.path} -> {formato % args}")
+
+    return Manipulador
+
+def iniciar(planilha, porta=0, **opcoes):
+    """Sobe o site numa thread. Devolve (servidor, site); a porta usada está em servidor.server_address[1]."""
+    site = SiteSimulado(planilha, **opcoes)
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), _criar_manipulador(site))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='site-simulado', daemon=True).start()
+    return servidor, site
+
+def main():
+    parser = argparse.ArgumentParser(description="Site local que imita o login e a exportação do relatório.")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--linhas', type=int, default=10000, help="Lançamentos da exportação sintética.")
+    parser.add_argument('--usuario', default='usuario')
+    parser.add_argument('--senha', default='senha')
+    parser.add_argument('--falhas-exportacao', type=int, default=0,
+                        help="Quantos pedidos de exportação respondem 503 antes de funcionar.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        planilha = gerar_exportacao(os.path.join(pasta, 'exportacao.xlsx'), linhas=args.linhas)
+        servidor, _ = iniciar(planilha, args.porta, usuario=args.usuario, senha=args.senha,
+                              falhas_exportacao=args.falhas_exportacao)
+        print(f"Site simulado em http://127.0.0.1:{servidor.server_address[1]}/ (Ctrl+C para sair)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.shutdown()
+
+if __name__ == '__main__':
+    main()
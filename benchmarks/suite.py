@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Suíte de benchmarks das etapas do robô sobre exportações sintéticas no layout real
+(18 linhas de preâmbulo + títulos). Para cada cenário (linhas x profissionais) mede o tempo
+(melhor de N repetições) e o pico de memória (tracemalloc, numa execução à parte) de:
+
+    processar_planilha (sem cache e com o cache quente), gerar_resumo_e_html,
+    dataframe_to_html, criar_excel_completo e feriados.get_horas_uteis_no_periodo.
+
+Os resultados são acrescentados a benchmarks/resultados/resultados.jsonl, junto com o commit
+e a máquina, e cada medição é comparada com a anterior da mesma máquina para destacar regressões.
+
+Uso:
+    python benchmarks/suite.py                          # cenários minimo, pequeno e medio
+    python benchmarks/suite.py --cenarios grande --repeticoes 1
+    python benchmarks/suite.py --falhar-em-regressao    # sai com código 1 se houver regressão
+"""
+import argparse
+import calendar
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA_BENCHMARKS))
+
+import config
+import feriados
+import processamento_dados
+from gerador_sintetico import gerar_exportacao, gerar_pessoas_ativas
+
+# nome: (linhas na exportação, profissionais)
+CENARIOS = {
+    'minimo': (1000, 10),
+    'pequeno': (10000, 100),
+    'medio': (100000, 1000),
+    'grande': (1000000, 10000),
+}
+CENARIOS_PADRAO = ['minimo', 'pequeno', 'medio']
+
+ARQUIVO_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados', 'resultados.jsonl')
+# Exportações geradas ficam guardadas aqui para não serem refeitas a cada execução.
+PASTA_DADOS = os.path.join(PASTA_BENCHMARKS, '.dados')
+
+INICIO, FIM = date(2025, 1, 1), date(2025, 1, 31)
+# Diferenças menores que isso são ruído de medição, mesmo que relativamente grandes.
+DIFERENCA_MINIMA_S = 0.005
+
+def _arquivos_cenario(nome):
+    linhas, profissionais = CENARIOS[nome]
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    exportacao = os.path.join(PASTA_DADOS, f"exportacao_{linhas}_{profissionais}.xlsx")
+    pessoas = os.path.join(PASTA_DADOS, f"pessoas_{profissionais}.xlsx")
+    if not os.path.exists(exportacao):
+        print(f"Gerando exportação sintética com {linhas} linhas e {profissionais} profissionais...")
+        gerar_exportacao(exportacao + '.tmp.xlsx', linhas=linhas, profissionais=profissionais)
+        os.replace(exportacao + '.tmp.xlsx', exportacao)
+    if not os.path.exists(pessoas):
+        gerar_pessoas_ativas(pessoas, profissionais=profissionais)
+    return exportacao, pessoas
+
+def medir(funcao, repeticoes):
+    """Devolve (resultado, melhor tempo em s, pico de memória em MB). O log das funções é descartado."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        melhor = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            melhor = min(melhor, time.perf_counter() - inicio)
+        # O tracemalloc distorce bastante a duração, então a memória é medida numa execução separada.
+        tracemalloc.start()
+        try:
+            funcao()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return resultado, melhor, pico / 1024 / 1024
+
+def _periodos_calendario():
+    """Todos os meses de três anos, inteiros e até o dia 15: exercita o calendário de feriados."""
+    periodos = []
+    for ano in (2024, 2025, 2026):
+        for mes in range(1, 13):
+            _, ultimo_dia = calendar.monthrange(ano, mes)
+            periodos.append((date(ano, mes, 1), date(ano, mes, 15)))
+            periodos.append((date(ano, mes, 1), date(ano, mes, ultimo_dia)))
+    return periodos
+
+def executar_cenario(nome, repeticoes, pasta_trabalho):
+    exportacao, pessoas = _arquivos_cenario(nome)
+    config.CAMINHO_PESSOAS_ATIVAS = pessoas
+    config.PASTA_CACHE = os.path.join(pasta_trabalho, 'cache')
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_pessoas = processamento_dados.get_pessoas_ativas()
+        # Aquece o cache para a medição com o cache quente.
+        processamento_dados.processar_planilha(exportacao, INICIO, FIM, usar_cache=True)
+
+    medicoes = {}
+    def registrar(etapa, funcao):
+        resultado, tempo, pico = medir(funcao, repeticoes)
+        medicoes[etapa] = (tempo, pico)
+        return resultado
+
+    registrar('processar_planilha',
+              lambda: processamento_dados.processar_planilha(exportacao, INICIO, FIM, usar_cache=False))
+    df = registrar('processar_planilha_cache',
+                   lambda: processamento_dados.processar_planilha(exportacao, INICIO, FIM, usar_cache=True))
+    df_resumo, _ = registrar('gerar_resumo_e_html',
+                             lambda: processamento_dados.gerar_resumo_e_html(df, INICIO, FIM, df_pessoas))
+    registrar('dataframe_to_html', lambda: processamento_dados.dataframe_to_html(df_resumo))
+    caminho_excel = os.path.join(pasta_trabalho, 'anexo.xlsx')
+    registrar('criar_excel_completo',
+              lambda: processamento_dados.criar_excel_completo(df, df_resumo, caminho_excel))
+    return medicoes
+
+def executar_calendario(repeticoes):
+    periodos = _periodos_calendario()
+    _, tempo, pico = medir(
+        lambda: [feriados.get_horas_uteis_no_periodo(inicio, fim) for inicio, fim in periodos], repeticoes)
+    return {'get_horas_uteis_no_periodo': (tempo / len(periodos), pico)}
+
+# --- Resultados ---
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA_BENCHMARKS,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def carregar_resultados():
+    if not os.path.exists(ARQUIVO_RESULTADOS):
+        return []
+    with open(ARQUIVO_RESULTADOS, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+def _anteriores(resultados, maquina):
+    """Última medição de cada (cenário, etapa) feita nesta máquina."""
+    ultimos = {}
+    for registro in resultados:
+        if registro.get('maquina') == maquina:
+            ultimos[(registro['cenario'], registro['etapa'])] = registro
+    return ultimos
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks das etapas do robô de apontamento.")
+    parser.add_argument('--cenarios', default=','.join(CENARIOS_PADRAO),
+                        help=f"Cenários separados por vírgula ({', '.join(CENARIOS)}).")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Repetições por medição (vale a melhor).")
+    parser.add_argument('--limite-regressao', type=float, default=0.25,
+                        help="Aumento relativo de tempo considerado regressão (padrão 0.25 = 25%%).")
+    parser.add_argument('--sem-salvar', action='store_true', help="Não grava os resultados.")
+    parser.add_argument('--falhar-em-regressao', action='store_true',
+                        help="Sai com código 1 se alguma etapa regredir.")
+    args = parser.parse_args(argv)
+
+    cenarios = [nome.strip() for nome in args.cenarios.split(',') if nome.strip()]
+    for nome in cenarios:
+        if nome not in CENARIOS:
+            parser.error(f"Cenário desconhecido: {nome}")
+
+    maquina = platform.node()
+    anteriores = _anteriores(carregar_resultados(), maquina)
+    registros = []
+    agora = datetime.now().isoformat(timespec='seconds')
+    comum = {'data': agora, 'commit': _commit_atual(), 'maquina': maquina,
+             'python': platform.python_version(), 'repeticoes': args.repeticoes}
+
+    pasta_trabalho = tempfile.mkdtemp(prefix='bench_')
+    try:
+        por_cenario = [(nome, *CENARIOS[nome], lambda nome=nome: executar_cenario(nome, args.repeticoes, pasta_trabalho))
+                       for nome in cenarios]
+        por_cenario.append(('calendario', None, None, lambda: executar_calendario(args.repeticoes)))
+        for nome, linhas, profissionais, executar in por_cenario:
+            for etapa, (segundos, pico_mb) in executar().items():
+                registros.append(dict(comum, cenario=nome, linhas=linhas, profissionais=profissionais,
+                                      etapa=etapa, segundos=round(segundos, 6), pico_mb=round(pico_mb, 2)))
+    finally:
+        shutil.rmtree(pasta_trabalho, ignore_errors=True)
+
+    regressoes = 0
+    print(f"\n{'Cenário':<12}{'Etapa':<28}{'Tempo (s)':>12}{'Pico (MB)':>11}{'Anterior (s)':>14}{'Variação':>10}")
+    for registro in registros:
+        anterior = anteriores.get((registro['cenario'], registro['etapa']))
+        coluna_anterior, coluna_variacao, marca = '-', '-', ''
+        if anterior and anterior['segundos'] > 0:
+            variacao = registro['segundos'] / anterior['segundos'] - 1
+            coluna_anterior = f"{anterior['segundos']:.4f}"
+            coluna_variacao = f"{variacao:+.0%}"
+            if variacao > args.limite_regressao and registro['segundos'] - anterior['segundos'] > DIFERENCA_MINIMA_S:
+                marca = '  <- REGRESSÃO'
+                regressoes += 1
+        print(f"{registro['cenario']:<12}{registro['etapa']:<28}{registro['segundos']:>12.4f}"
+              f"{registro['pico_mb']:>11.1f}{coluna_anterior:>14}{coluna_variacao:>10}{marca}")
+
+    if not args.sem_salvar:
+        os.makedirs(os.path.dirname(ARQUIVO_RESULTADOS), exist_ok=True)
+        with open(ARQUIVO_RESULTADOS, 'a', encoding='utf-8') as arquivo:
+            for registro in registros:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        print(f"\nResultados acrescentados a {os.path.relpath(ARQUIVO_RESULTADOS)}")
+
+    if regressoes:
+        print(f"{regressoes} etapa(s) mais lenta(s) que o limite de {args.limite_regressao:.0%}.")
+        if args.falhar_em_regressao:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em disco, em formato colunar, das linhas já lidas e tipadas dos relatórios exportados.
+A chave é o hash do conteúdo do arquivo, então re-execuções, retentativas e reprocessamentos
+do mesmo relatório não precisam ler o .xlsx de novo.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Incrementar sempre que o conteúdo/formato gravado no cache mudar.
+VERSAO_CACHE = 2
+
+# Serializa a limpeza entre as threads do processo (as etapas do pipeline gravam em paralelo).
+_lock_limpeza = threading.Lock()
+# Entradas lidas ou gravadas neste processo há menos de PROTECAO_ENTRADAS_EM_USO_S: não são removidas
+# pela limpeza, porque colunas adiadas (a Descrição, ver processamento_dados.carregar_descricao) ainda
+# serão lidas delas durante a execução. {caminho: time.monotonic() do último uso}.
+PROTECAO_ENTRADAS_EM_USO_S = 3600
+_entradas_em_uso = {}
+
+def _marcar_em_uso(caminho):
+    with _lock_limpeza:
+        _entradas_em_uso[caminho] = time.monotonic()
+
+def _em_uso(caminho):
+    ultimo_uso = _entradas_em_uso.get(caminho)
+    return ultimo_uso is not None and time.monotonic() - ultimo_uso < PROTECAO_ENTRADAS_EM_USO_S
+
+def _remover(caminho):
+    """Remove um arquivo do cache; outro processo (ex.: outro perfil do lote) pode ter removido antes."""
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+def _pasta_cache():
+    pasta = getattr(config, 'PASTA_CACHE', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.cache', 'planilhas')
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+def _parquet_disponivel():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def calcular_hash_arquivo(caminho_arquivo, tamanho_bloco=1024 * 1024):
+    """Calcula o SHA-256 do conteúdo do arquivo, lendo em blocos."""
+    sha = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _caminho_entrada(chave, extensao):
+    return os.path.join(_pasta_cache(), f"v{VERSAO_CACHE}_{chave}{extensao}")
+
+def _salvar_npz(df, caminho):
+    """Fallback sem pyarrow: datas como datetime64, números como estão e texto como categorias + códigos."""
+    arrays = {'__colunas__': np.array(df.columns, dtype=str)}
+    tipos = []
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            arrays[f'c{i}'] = serie.to_numpy(dtype='datetime64[ns]')
+            tipos.append('data')
+        elif pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            arrays[f'c{i}'] = serie.to_numpy()
+            tipos.append('numero')
+        else:
+            categorias = serie.astype('category')
+            arrays[f'c{i}'] = categorias.cat.codes.to_numpy(dtype='int32')
+            arrays[f'c{i}_categorias'] = np.array(categorias.cat.categories.astype(str), dtype=str)
+            tipos.append('categoria' if isinstance(serie.dtype, pd.CategoricalDtype) else 'texto')
+    arrays['__tipos__'] = np.array(tipos, dtype=str)
+    with open(caminho, 'wb') as arquivo:
+        np.savez(arquivo, **arrays)
+
+def _carregar_npz(caminho, colunas_desejadas=None):
+    with np.load(caminho, allow_pickle=False) as dados:
+        colunas = {}
+        for i, (col, tipo) in enumerate(zip(dados['__colunas__'], dados['__tipos__'])):
+            # O .npz descompacta cada array só quando acessado, então pular a coluna evita lê-la.
+            if colunas_desejadas is not None and str(col) not in colunas_desejadas:
+                continue
+            valores = dados[f'c{i}']
+            if tipo in ('categoria', 'texto'):
+                serie = pd.Categorical.from_codes(valores, categories=dados[f'c{i}_categorias'].astype(object))
+                colunas[str(col)] = serie if tipo == 'categoria' else np.asarray(serie, dtype=object)
+            else:
+                colunas[str(col)] = valores
+    return pd.DataFrame(colunas)
+
+def _carregar_parquet(caminho, colunas_desejadas=None):
+    if colunas_desejadas is not None:
+        import pyarrow.parquet as pq
+        existentes = pq.read_schema(caminho).names
+        colunas_desejadas = [col for col in existentes if col in colunas_desejadas]
+    return pd.read_parquet(caminho, columns=colunas_desejadas)
+
+def carregar(chave, colunas=None):
+    """
+    Devolve o DataFrame guardado para a chave ou None se não houver entrada no cache.
+    colunas: lê só estas colunas (as que não existirem na entrada são ignoradas).
+    """
+    for extensao, leitor in (('.parquet', _carregar_parquet), ('.npz', _carregar_npz)):
+        caminho = _caminho_entrada(chave, extensao)
+        if not os.path.exists(caminho):
+            continue
+        if extensao == '.parquet' and not _parquet_disponivel():
+            continue
+        try:
+            df = leitor(caminho, colunas)
+        except Exception as e:
+            print(f"AVISO: Entrada de cache inválida '{os.path.basename(caminho)}' descartada: {e}")
+            _remover(caminho)
+            continue
+        # Atualiza o mtime para que a remoção por idade funcione como LRU.
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            pass
+        _marcar_em_uso(caminho)
+        return df
+    return None
+
+def salvar(chave, df):
+    """Grava o DataFrame no cache (Parquet se o pyarrow estiver instalado, senão .npz) e aplica a política de remoção."""
+    extensao = '.parquet' if _parquet_disponivel() else '.npz'
+    caminho = _caminho_entrada(chave, extensao)
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        if extensao == '.parquet':
+            df.to_parquet(caminho_temporario, index=False)
+        else:
+            _salvar_npz(df, caminho_temporario)
+        os.replace(caminho_temporario, caminho)
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar o cache da planilha: {e}")
+        if os.path.exists(caminho_temporario):
+            _remover(caminho_temporario)
+        return None
+    _marcar_em_uso(caminho)
+    try:
+        limpar_cache()
+    except OSError as e:
+        print(f"AVISO: Não foi possível limpar o cache de planilhas: {e}")
+    return caminho
+
+def limpar_cache(idade_maxima_dias=None, tamanho_maximo_mb=None):
+    """
+    Remove entradas mais antigas que a idade máxima e, se o total ainda passar do limite de tamanho,
+    remove as menos usadas recentemente até caber. Entradas em uso neste processo e arquivos
+    temporários de gravações em andamento não são removidos.
+    """
+    if idade_maxima_dias is None:
+        idade_maxima_dias = getattr(config, 'CACHE_IDADE_MAXIMA_DIAS', 35)
+    if tamanho_maximo_mb is None:
+        tamanho_maximo_mb = getattr(config, 'CACHE_TAMANHO_MAXIMO_MB', 200)
+
+    with _lock_limpeza:
+        pasta = _pasta_cache()
+        agora = time.time()
+        entradas = []
+        for nome in os.listdir(pasta):
+            caminho = os.path.join(pasta, nome)
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            if nome.endswith('.tmp') and agora - info.st_mtime <= 86400:
+                continue
+            if _em_uso(caminho):
+                entradas.append((info.st_mtime, info.st_size, None))
+            elif agora - info.st_mtime > idade_maxima_dias * 86400 or not nome.startswith(f"v{VERSAO_CACHE}_"):
+                _remover(caminho)
+            else:
+                entradas.append((info.st_mtime, info.st_size, caminho))
+
+        tamanho_total = sum(tamanho for _, tamanho, _ in entradas)
+        limite = tamanho_maximo_mb * 1024 * 1024
+        for _, tamanho, caminho in sorted(entradas, key=lambda entrada: entrada[0]):
+            if tamanho_total <= limite:
+                break
+            if caminho is None:
+                continue
+            _remover(caminho)
+            tamanho_total -= tamanho
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints das etapas do relatório. Cada execução tem um id e uma pasta própria
+(<PASTA_CHECKPOINTS>/<id>/) onde as etapas gravam o que produziram: o .xlsx baixado
+(já desbloqueado), as linhas filtradas, o resumo, o HTML, o anexo e a confirmação dos envios.
+
+Ao retomar (python main.py --retomar), a execução reaproveita a pasta da última execução
+do mesmo período que não terminou com sucesso. Uma etapa é pulada quando o seu checkpoint
+existe e as entradas não mudaram: cada etapa registra uma impressão das suas entradas
+(o período e as impressões das etapas de que depende). Assim, uma falha no envio do e-mail
+não obriga a abrir o navegador, logar e baixar o relatório de novo.
+
+As pastas são apagadas pela política de retenção (idade e quantidade máximas), não ao fim
+de cada execução.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import config
+from pipeline import Etapa
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Formatos de checkpoint: como o resultado da etapa é gravado na pasta da execução e relido.
+#   'download':  caminho de um arquivo, movido para a pasta da execução;
+#   'arquivo':   caminho de um arquivo que a etapa já gravou dentro da pasta da execução;
+#   'pickle':    DataFrames e outros objetos (preserva categorias, tipos e attrs);
+#   'texto':     str (ex.: corpo HTML);
+#   'json':      valores simples (ex.: situação dos envios);
+#   'marcador':  só registra que a etapa terminou (o resultado é None).
+FORMATOS = ('download', 'arquivo', 'pickle', 'texto', 'json', 'marcador')
+
+def _pasta_checkpoints():
+    return getattr(config, 'PASTA_CHECKPOINTS', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.cache', 'checkpoints')
+
+def _hash(*partes):
+    return hashlib.sha256(json.dumps(partes, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+def impressao_resultado(resultado):
+    """Impressão do resultado de uma etapa sem checkpoint (ex.: pessoas ativas), usada pelas dependentes."""
+    import pandas as pd
+
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        valores = pd.util.hash_pandas_object(resultado, index=True).to_numpy()
+        return hashlib.sha256(valores.tobytes() + repr(list(getattr(resultado, 'columns', []))).encode()).hexdigest()[:32]
+    return _hash(repr(resultado))
+
+def _id_periodo(periodo_analise):
+    return f"{periodo_analise['start_date']:%Y%m%d}-{periodo_analise['end_date']:%Y%m%d}"
+
+class CheckpointEtapa:
+    """
+    Como o checkpoint de uma etapa é gravado.
+    - formato: um de FORMATOS, ou None para etapas que não gravam nada mas cujas dependentes
+      precisam de uma impressão do resultado (calculada por `impressao`).
+    - impressao: função resultado -> str. Padrão: a impressão das entradas, para etapas
+      determinísticas; o download usa o hash do arquivo.
+    - completo: função resultado -> bool; um checkpoint incompleto (ex.: envios pela metade)
+      não é pulado, mas fica disponível à etapa em ExecucaoCheckpoint.anterior().
+    """
+
+    def __init__(self, formato=None, impressao=None, completo=None):
+        if formato is not None and formato not in FORMATOS:
+            raise ValueError(f"Formato de checkpoint desconhecido: {formato}")
+        self.formato = formato
+        self.impressao = impressao
+        self.completo = completo
+
+class ExecucaoCheckpoint:
+    """Pasta e manifesto dos checkpoints de uma execução."""
+
+    def __init__(self, pasta, manifesto, retomada=False):
+        self.pasta = pasta
+        self.manifesto = manifesto
+        self.retomada = retomada
+        self.id = manifesto['id']
+        self.impressoes = {}
+        self.reaproveitadas = []
+        self._lock = threading.Lock()
+
+    # --- Abertura ---
+
+    @classmethod
+    def nova(cls, periodo_analise):
+        execucao_id = f"{datetime.now():%Y%m%d_%H%M%S}_{_id_periodo(periodo_analise)}"
+        pasta = os.path.join(_pasta_checkpoints(), execucao_id)
+        os.makedirs(pasta, exist_ok=True)
+        manifesto = {'id': execucao_id, 'periodo': _id_periodo(periodo_analise),
+                     'report_title': periodo_analise['report_title'],
+                     'criado_em': datetime.now().isoformat(timespec='seconds'),
+                     'status': None, 'etapas': {}}
+        checkpoint = cls(pasta, manifesto)
+        checkpoint._gravar_manifesto()
+        return checkpoint
+
+    @classmethod
+    def abrir(cls, periodo_analise, retomar=False):
+        """
+        Abre a pasta de checkpoints da execução. retomar=True reaproveita a última execução do mesmo
+        período que não terminou com sucesso completo (falha, ou relatórios por gestor pendentes);
+        retomar='<id>' reaproveita essa execução específica.
+        Sem execução a retomar, começa uma nova.
+        """
+        if retomar:
+            anterior = _procurar_execucao(_id_periodo(periodo_analise), None if retomar is True else retomar)
+            if anterior is not None:
+                pasta, manifesto = anterior
+                print(f"Retomando a execução {manifesto['id']} "
+                      f"({len(manifesto['etapas'])} etapa(s) com checkpoint).")
+                manifesto['status'] = None
+                return cls(pasta, manifesto, retomada=True)
+            print("Nenhuma execução a retomar para o período; começando do zero.")
+        return cls.nova(periodo_analise)
+
+    # --- Manifesto ---
+
+    def _gravar_manifesto(self):
+        caminho = os.path.join(self.pasta, ARQUIVO_MANIFESTO)
+        with open(f"{caminho}.tmp", 'w', encoding='utf-8') as arquivo:
+            json.dump(self.manifesto, arquivo, ensure_ascii=False, indent=2)
+        os.replace(f"{caminho}.tmp", caminho)
+
+    def concluir(self, status):
+        with self._lock:
+            self.manifesto['status'] = status
+            self.manifesto['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+            self._gravar_manifesto()
+
+    # --- Gravação e leitura dos resultados ---
+
+    def caminho(self, nome_arquivo):
+        """Caminho de um arquivo dentro da pasta da execução."""
+        return os.path.join(self.pasta, nome_arquivo)
+
+    def _salvar(self, nome, formato, resultado):
+        """Grava o resultado e devolve (o resultado a repassar às dependentes, o nome do artefato)."""
+        if formato == 'download':
+            destino = self.caminho(os.path.basename(resultado))
+            if os.path.abspath(resultado) != os.path.abspath(destino):
+                shutil.move(resultado, destino)
+            return destino, os.path.basename(destino)
+        if formato == 'arquivo':
+            return resultado, os.path.relpath(resultado, self.pasta) if resultado else None
+        if formato == 'pickle':
+            artefato = f"{nome}.pkl"
+            with open(self.caminho(artefato), 'wb') as arquivo:
+                pickle.dump(resultado, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            return resultado, artefato
+        if formato == 'texto':
+            artefato = f"{nome}.html" if nome == 'html' else f"{nome}.txt"
+            with open(self.caminho(artefato), 'w', encoding='utf-8') as arquivo:
+                arquivo.write(resultado)
+            return resultado, artefato
+        if formato == 'json':
+            artefato = f"{nome}.json"
+            with open(self.caminho(artefato), 'w', encoding='utf-8') as arquivo:
+                json.dump(resultado, arquivo, ensure_ascii=False, indent=2, default=str)
+            return resultado, artefato
+        return resultado, None
+
+    def _carregar(self, formato, artefato):
+        if formato == 'marcador':
+            return None
+        if artefato is None:
+            return None
+        caminho = self.caminho(artefato)
+        if formato in ('download', 'arquivo'):
+            return caminho
+        if formato == 'pickle':
+            with open(caminho, 'rb') as arquivo:
+                return pickle.load(arquivo)
+        with open(caminho, encoding='utf-8') as arquivo:
+            return arquivo.read() if formato == 'texto' else json.load(arquivo)
+
+    def _artefato_existe(self, registro):
+        artefato = registro.get('artefato')
+        return artefato is None or os.path.exists(self.caminho(artefato))
+
+    def anterior(self, nome):
+        """Resultado gravado da etapa numa tentativa anterior desta execução (ou None)."""
+        registro = self.manifesto['etapas'].get(nome)
+        if not self.retomada or registro is None or not self._artefato_existe(registro):
+            return None
+        return self._carregar(registro['formato'], registro.get('artefato'))
+
+    # --- Etapas ---
+
+    def envolver(self, etapa, definicao, parametros=()):
+        """Devolve a etapa com checkpoint: pula se a entrada não mudou, senão executa e grava."""
+        funcao_original = etapa.funcao
+
+        def funcao(resultados):
+            impressoes_deps = [self.impressoes.get(dep) for dep in etapa.dependencias]
+            entradas = _hash(etapa.nome, list(parametros), impressoes_deps)
+            registro = self.manifesto['etapas'].get(etapa.nome)
+
+            if (self.retomada and definicao.formato is not None and registro is not None
+                    and registro.get('entradas') == entradas and None not in impressoes_deps
+                    and self._artefato_existe(registro)):
+                resultado = self._carregar(definicao.formato, registro.get('artefato'))
+                if definicao.completo is None or definicao.completo(resultado):
+                    print(f"Etapa '{etapa.nome}' reaproveitada do checkpoint.")
+                    with self._lock:
+                        self.impressoes[etapa.nome] = registro['impressao']
+                        self.reaproveitadas.append(etapa.nome)
+                    return resultado
+
+            resultado = funcao_original(resultados)
+            if definicao.formato is None:
+                impressao = (definicao.impressao or impressao_resultado)(resultado)
+                with self._lock:
+                    self.impressoes[etapa.nome] = impressao
+                return resultado
+
+            resultado, artefato = self._salvar(etapa.nome, definicao.formato, resultado)
+            if definicao.impressao is not None:
+                impressao = definicao.impressao(resultado)
+            else:
+                impressao = entradas
+            with self._lock:
+                self.impressoes[etapa.nome] = impressao
+                self.manifesto['etapas'][etapa.nome] = {
+                    'formato': definicao.formato, 'artefato': artefato, 'entradas': entradas,
+                    'impressao': impressao, 'gravado_em': datetime.now().isoformat(timespec='seconds')}
+                self._gravar_manifesto()
+            return resultado
+
+        return Etapa(etapa.nome, funcao, etapa.dependencias, etapa.rotulo)
+
+    def envolver_etapas(self, etapas, definicoes, parametros=()):
+        """Aplica envolver() às etapas com definição em `definicoes` ({nome: CheckpointEtapa})."""
+        return [self.envolver(etapa, definicoes[etapa.nome], parametros) if etapa.nome in definicoes else etapa
+                for etapa in etapas]
+
+def impressao_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """SHA-256 (abreviado) do conteúdo de um arquivo."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()[:32]
+
+# --- Execuções gravadas e retenção ---
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, ARQUIVO_MANIFESTO), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def listar_execucoes():
+    """Devolve [(pasta, manifesto)] das execuções gravadas, da mais recente para a mais antiga."""
+    raiz = _pasta_checkpoints()
+    if not os.path.isdir(raiz):
+        return []
+    execucoes = []
+    for nome in os.listdir(raiz):
+        pasta = os.path.join(raiz, nome)
+        manifesto = _ler_manifesto(pasta) if os.path.isdir(pasta) else None
+        if manifesto is not None:
+            execucoes.append((pasta, manifesto))
+    return sorted(execucoes, key=lambda item: item[1]['criado_em'], reverse=True)
+
+def _procurar_execucao(id_periodo, execucao_id=None):
+    for pasta, manifesto in listar_execucoes():
+        if execucao_id is not None:
+            if manifesto['id'] == execucao_id:
+                return pasta, manifesto
+        elif manifesto['periodo'] == id_periodo and manifesto.get('status') != 'SUCESSO':
+            return pasta, manifesto
+    return None
+
+def aplicar_retencao(manter=()):
+    """
+    Apaga as pastas de execuções mais antigas que CHECKPOINTS_RETENCAO_DIAS (padrão 7) e, se
+    sobrarem mais que CHECKPOINTS_MAXIMO_EXECUCOES (padrão 20), as mais antigas. Os ids em
+    `manter` (a execução atual) nunca são apagados.
+    """
+    idade_maxima = getattr(config, 'CHECKPOINTS_RETENCAO_DIAS', 7) * 86400
+    maximo = getattr(config, 'CHECKPOINTS_MAXIMO_EXECUCOES', 20)
+    agora = time.time()
+    removidas = 0
+    for posicao, (pasta, manifesto) in enumerate(listar_execucoes()):
+        if manifesto['id'] in manter:
+            continue
+        criado_em = datetime.fromisoformat(manifesto['criado_em']).timestamp()
+        if agora - criado_em > idade_maxima or posicao >= maximo:
+            shutil.rmtree(pasta, ignore_errors=True)
+            removidas += 1
+    if removidas:
+        print(f"Checkpoints: {removidas} execução(ões) antiga(s) removida(s) pela política de retenção.")
+    return removidas
@@ -48,12 +48,16 @@ def get_analysis_period():
         start_date = date(report_year, report_month, 1)
         final_end_date = end_date # A data final que já calculamos
 
+    return _montar_periodo(button_to_click, report_month, report_year, start_date, final_end_date)
+
+MESES_PT = {
+    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
+    7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
+}
+
+def _montar_periodo(button_to_click, report_month, report_year, start_date, final_end_date):
     # Formata o título do relatório
-    meses_pt = {
-        1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
-        7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
-    }
-    nome_mes_pt = meses_pt.get(report_month, "")
+    nome_mes_pt = MESES_PT.get(report_month, "")
     report_title = f"{nome_mes_pt} de {report_year} (período de {start_date.strftime('%d/%m')} a {final_end_date.strftime('%d/%m')})"
 
     return {
@@ -61,4 +65,39 @@ def get_analysis_period():
         "start_date": start_date,
         "end_date": final_end_date,
         "report_title": report_title
-    }
\ No newline at end of file
+    }
+
+def get_periodo_mes(ano, mes, hoje=None):
+    """
+    Período de análise de um mês qualquer, no mesmo formato de get_analysis_period().
+    O mês corrente vai só até ontem; meses futuros não têm período (retorna None).
+    'button_key' só é preenchido para os meses que o site exporta diretamente
+    ('Mês passado' e 'Mês Corrente'); para os demais fica None.
+    """
+    hoje = hoje or date.today()
+    start_date = date(ano, mes, 1)
+    if start_date > hoje:
+        return None
+
+    _, last_day = calendar.monthrange(ano, mes)
+    final_end_date = date(ano, mes, last_day)
+
+    mes_passado = (hoje.replace(day=1) - timedelta(days=1)).replace(day=1)
+    if (ano, mes) == (hoje.year, hoje.month):
+        button_to_click = "Mês Corrente"
+        final_end_date = max(start_date, hoje - timedelta(days=1))
+    elif start_date == mes_passado:
+        button_to_click = "Mês passado"
+    else:
+        button_to_click = None
+
+    return _montar_periodo(button_to_click, mes, ano, start_date, final_end_date)
+
+def meses_no_intervalo(inicio, fim):
+    """Lista os pares (ano, mês) de todos os meses que tocam o intervalo [inicio, fim]."""
+    meses = []
+    ano, mes = inicio.year, inicio.month
+    while (ano, mes) <= (fim.year, fim.month):
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
\ No newline at end of file
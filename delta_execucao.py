@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Modo delta: guarda, ao fim de cada relatório enviado, uma impressão digital de cada lançamento
+aprovado (Data, Profissional, Projeto, Horas, Situação) e as horas somadas por profissional.
+Na execução seguinte do mesmo período, compara as impressões digitais para achar só os
+lançamentos que entraram ou saíram, atualiza as somas a partir deles (sem reagrupar o mês
+inteiro) e descreve no e-mail o que mudou desde o último relatório.
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import config
+import processamento_dados
+
+COLUNAS_IMPRESSAO = ['Data', 'Profissional', 'Projeto', 'Horas', 'Situação']
+
+def _arquivo_estado():
+    return getattr(config, 'ARQUIVO_ESTADO_DELTA', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.cache', 'estado_delta.npz')
+
+def impressoes_digitais(df):
+    """
+    Um hash de 64 bits por lançamento. Lançamentos idênticos (mesmo dia, projeto e horas)
+    são diferenciados pela ordem de ocorrência, para que a comparação conte repetições.
+    """
+    colunas = [col for col in COLUNAS_IMPRESSAO if col in df.columns]
+    por_linha = pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+    ocorrencia = pd.Series(por_linha).groupby(por_linha).cumcount().to_numpy()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({'linha': por_linha, 'ocorrencia': ocorrencia}), index=False).to_numpy()
+
+def _somar_por_profissional(df):
+    if df.empty:
+        return pd.Series(dtype=np.float64)
+    return df.groupby(df['Profissional'].astype(object))['Horas'].sum().astype(np.float64)
+
+# --- Estado da última execução ---
+
+def carregar_estado():
+    """Devolve o estado gravado pela última execução ou None se não houver (ou estiver ilegível)."""
+    caminho = _arquivo_estado()
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with np.load(caminho, allow_pickle=False) as dados:
+            estado = {nome: dados[nome] for nome in dados.files}
+    except Exception as e:
+        print(f"AVISO: Estado da última execução ilegível ({e}). O período será comparado do zero.")
+        return None
+    estado['inicio'] = date.fromisoformat(str(estado['inicio']))
+    estado['fim'] = date.fromisoformat(str(estado['fim']))
+    return estado
+
+def salvar_estado(delta):
+    """Grava o estado desta execução. Chamado só depois que o relatório foi enviado."""
+    df = delta.df_filtrado
+    caminho = _arquivo_estado()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_temporario, 'wb') as arquivo:
+        np.savez(
+            arquivo,
+            inicio=np.array(delta.inicio.isoformat()),
+            fim=np.array(delta.fim.isoformat()),
+            impressoes=delta.impressoes,
+            data=df['Data'].to_numpy(dtype='datetime64[D]'),
+            profissional=df['Profissional'].astype(str).to_numpy(dtype=str),
+            projeto=(df['Projeto'].astype(object).fillna('').astype(str).to_numpy(dtype=str)
+                     if 'Projeto' in df.columns else np.full(len(df), '', dtype=str)),
+            horas=df['Horas'].to_numpy(dtype=np.float32),
+            nomes_soma=delta.horas_por_profissional.index.to_numpy(dtype=str),
+            horas_soma=delta.horas_por_profissional.to_numpy(dtype=np.float64),
+        )
+    os.replace(caminho_temporario, caminho)
+    print(f"Estado do modo delta gravado ({len(df)} lançamentos).")
+
+# --- Comparação ---
+
+class DeltaExecucao:
+    """
+    Resultado da comparação com a última execução.
+    - adicionadas / removidas: lançamentos que entraram / saíram desde o último relatório.
+    - horas_por_profissional: horas aprovadas somadas por profissional, já atualizadas.
+    - comparado_com: data final do último relatório, ou None se não havia base de comparação.
+    """
+
+    def __init__(self, df_filtrado, inicio, fim, impressoes, adicionadas, removidas,
+                 horas_por_profissional, comparado_com):
+        self.df_filtrado = df_filtrado
+        self.inicio = inicio
+        self.fim = fim
+        self.impressoes = impressoes
+        self.adicionadas = adicionadas
+        self.removidas = removidas
+        self.horas_por_profissional = horas_por_profissional
+        self.comparado_com = comparado_com
+
+def calcular_delta(df_filtrado, start_date, end_date):
+    """
+    Compara os lançamentos aprovados de agora com os do último relatório do mesmo período.
+    Sem estado compatível (outro mês, período menor ou primeira execução), tudo conta como novo.
+    """
+    impressoes = impressoes_digitais(df_filtrado)
+    estado = carregar_estado()
+    if estado is None or estado['inicio'] != start_date or estado['fim'] > end_date:
+        print("Modo delta: sem execução anterior comparável para o período; processando tudo.")
+        return DeltaExecucao(df_filtrado, start_date, end_date, impressoes,
+                             df_filtrado, pd.DataFrame(columns=['Data', 'Profissional', 'Projeto', 'Horas']),
+                             _somar_por_profissional(df_filtrado), None)
+
+    novas = ~np.isin(impressoes, estado['impressoes'])
+    saidas = ~np.isin(estado['impressoes'], impressoes)
+    adicionadas = df_filtrado[novas]
+    removidas = pd.DataFrame({
+        'Data': pd.to_datetime(estado['data'][saidas]),
+        'Profissional': estado['profissional'][saidas].astype(object),
+        'Projeto': estado['projeto'][saidas].astype(object),
+        'Horas': estado['horas'][saidas],
+    })
+
+    horas = pd.Series(estado['horas_soma'], index=estado['nomes_soma'].astype(object))
+    horas = horas.add(_somar_por_profissional(adicionadas), fill_value=0)
+    horas = horas.sub(_somar_por_profissional(removidas), fill_value=0).round(6)
+    # Quem não tem mais nenhum lançamento aprovado sai da soma, como no agrupamento completo.
+    horas = horas[horas.index.isin(df_filtrado['Profissional'].astype(object).unique())]
+
+    print(f"Modo delta: {len(adicionadas)} lançamento(s) novo(s) e {len(removidas)} removido(s) "
+          f"desde o relatório até {estado['fim'].strftime('%d/%m/%Y')}.")
+    return DeltaExecucao(df_filtrado, start_date, end_date, impressoes, adicionadas, removidas,
+                         horas, estado['fim'])
+
+def html_mudancas(delta):
+    """Seção do e-mail com o que mudou desde o último relatório (vazia se não havia base de comparação)."""
+    if delta.comparado_com is None:
+        return ""
+
+    titulo = (f'<h3 style="font-family: Calibri, sans-serif; margin-top: 30px;">'
+              f'O que mudou desde o último relatório (até {delta.comparado_com.strftime("%d/%m/%Y")})</h3>')
+    if delta.adicionadas.empty and delta.removidas.empty:
+        return titulo + "<p>Nenhum lançamento aprovado entrou ou saiu desde o último relatório.</p>"
+
+    mudancas = pd.DataFrame({
+        'Horas Adicionadas': _somar_por_profissional(delta.adicionadas),
+        'Horas Removidas': _somar_por_profissional(delta.removidas),
+    }).fillna(0)
+    mudancas['Variação'] = mudancas['Horas Adicionadas'] - mudancas['Horas Removidas']
+    mudancas = mudancas.rename_axis('Profissional').reset_index().sort_values('Profissional')
+
+    texto = (f"<p>{len(delta.adicionadas)} lançamento(s) aprovado(s) novo(s) "
+             f"({delta.adicionadas['Horas'].sum():.2f} h) e {len(delta.removidas)} "
+             f"lançamento(s) que saíram ou foram alterados ({delta.removidas['Horas'].sum():.2f} h).</p>")
+    return titulo + texto + processamento_dados.dataframe_to_html(mudancas)
@@ -1,65 +1,323 @@
 # -*- coding: utf-8 -*-
+import base64
+import re
 import smtplib
+import uuid
+import zipfile
+from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication # MODIFICADO: Importa a classe correta para anexos
 from datetime import datetime
 import os
+import threading
+import time
 
 import config
 
-def enviar_email_resumo_mensal(corpo_html, report_title, caminho_anexo=None):
-    """Envia o e-mail com o resumo de horas do período e um anexo opcional."""
-    print("Preparando e-mail de resumo...")
+class ConexaoSMTP:
+    """
+    Uma sessão SMTP autenticada, aberta sob demanda e reaproveitada para todas as mensagens da execução.
+    Antes de reutilizar uma conexão parada há mais de config.SMTP_INTERVALO_VERIFICACAO segundos,
+    confirma com NOOP que ela continua viva; se o servidor tiver fechado, reconecta e reenvia.
+    """
 
-    destinatario_principal = config.MENSAL_DESTINATARIO_PRINCIPAL
-    destinatarios_copia = config.MENSAL_DESTINATARIOS_COPIA
-    
-    if not destinatario_principal['email']:
-        print("AVISO: E-mail de resumo não configurado. Pulando envio.")
-        return
+    def __init__(self, servidor=None, porta=None, usuario=None, senha=None, starttls=None):
+        self.servidor = servidor or config.SMTP_SERVER
+        self.porta = porta or config.SMTP_PORT
+        self.usuario = usuario or config.EMAIL_REMETENTE
+        self.senha = senha if senha is not None else config.EMAIL_SENHA
+        self.starttls = starttls if starttls is not None else getattr(config, 'SMTP_STARTTLS', True)
+        self.intervalo_verificacao = getattr(config, 'SMTP_INTERVALO_VERIFICACAO', 30)
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+    def conectar(self):
+        """Abre (ou reabre) a conexão: conexão TCP, STARTTLS e login."""
+        with self._lock:
+            self._descartar()
+            smtp = smtplib.SMTP(self.servidor, self.porta, timeout=getattr(config, 'SMTP_TIMEOUT', 60))
+            if self.starttls:
+                smtp.starttls()
+            if self.senha:
+                smtp.login(self.usuario, self.senha)
+            self._smtp = smtp
+            self._ultimo_uso = time.monotonic()
+            return self
+
+    def _descartar(self, encerrar=True):
+        """Abandona a conexão atual; encerrar=False fecha o socket sem QUIT (por exemplo, no meio de um DATA)."""
+        if self._smtp is not None:
+            try:
+                if encerrar:
+                    self._smtp.quit()
+                else:
+                    self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _garantir_conexao(self):
+        if self._smtp is None:
+            self.conectar()
+        elif time.monotonic() - self._ultimo_uso > self.intervalo_verificacao:
+            try:
+                ativa = self._smtp.noop()[0] == 250
+            except smtplib.SMTPException:
+                ativa = False
+            except OSError:
+                ativa = False
+            if not ativa:
+                print("Conexão SMTP expirada, reconectando...")
+                self.conectar()
+
+    def enviar(self, msg, destinatarios, remetente=None):
+        """
+        Envia uma mensagem (email.message ou texto já serializado) pela conexão compartilhada.
+        Mensagens com anexos em disco (montar_email_resumo) são transmitidas em streaming.
+        """
+        remetente = remetente or config.EMAIL_REMETENTE
+        if getattr(msg, 'anexos_em_disco', None):
+            transmitir = lambda: self._enviar_em_blocos(remetente, destinatarios, msg)
+        else:
+            texto_email = msg if isinstance(msg, (str, bytes)) else msg.as_string()
+            transmitir = lambda: self._smtp.sendmail(remetente, destinatarios, texto_email)
+        with self._lock:
+            self._garantir_conexao()
+            try:
+                recusados = transmitir()
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                print("Conexão SMTP perdida durante o envio, reconectando...")
+                self.conectar()
+                recusados = transmitir()
+            self._ultimo_uso = time.monotonic()
+            return recusados
+
+    def _enviar_em_blocos(self, remetente, destinatarios, msg):
+        """
+        O mesmo que smtplib.sendmail, mas enviando o DATA em blocos gerados por serializar_em_blocos:
+        o anexo é lido e codificado aos poucos, sem montar a mensagem inteira em memória.
+        """
+        # Cabeçalhos e corpo são serializados antes do DATA: um erro aqui não deixa a sessão pela metade.
+        blocos = serializar_em_blocos(msg)
+        smtp = self._smtp
+        smtp.ehlo_or_helo_if_needed()
+        codigo, resposta = smtp.mail(remetente)
+        if codigo != 250:
+            smtp.rset()
+            raise smtplib.SMTPSenderRefused(codigo, resposta, remetente)
+        recusados = {}
+        for destinatario in destinatarios:
+            codigo, resposta = smtp.rcpt(destinatario)
+            if codigo not in (250, 251):
+                recusados[destinatario] = (codigo, resposta)
+        if len(recusados) == len(destinatarios):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused(recusados)
+        codigo, resposta = smtp.docmd('DATA')
+        if codigo != 354:
+            smtp.rset()
+            raise smtplib.SMTPDataError(codigo, resposta)
+        total, final = 0, b''
+        try:
+            for bloco in blocos:
+                # Linhas que começam com ponto são duplicadas (RFC 5321); o base64 nunca tem ponto.
+                bloco = re.sub(rb'(?m)^\.', b'..', bloco)
+                smtp.send(bloco)
+                total += len(bloco)
+                final = bloco[-2:] or final
+            smtp.send((b'' if final == b'\r\n' else b'\r\n') + b'.\r\n')
+            codigo, resposta = smtp.getreply()
+        except BaseException:
+            # Com o DATA aberto, a sessão não tem como ser reaproveitada; o próximo envio reconecta.
+            self._descartar(encerrar=False)
+            raise
+        if codigo != 250:
+            raise smtplib.SMTPDataError(codigo, resposta)
+        print(f"Mensagem transmitida em streaming: {total / 1024:.1f} KB.")
+        return recusados
+
+    def enviar_lote(self, mensagens):
+        """
+        Envia várias mensagens (pares (msg, destinatarios)) pela mesma conexão.
+        Devolve a lista de (índice, erro) das que falharam, sem interromper as demais.
+        """
+        falhas = []
+        for indice, (msg, destinatarios) in enumerate(mensagens):
+            try:
+                self.enviar(msg, destinatarios)
+            except Exception as e:
+                print(f"ERRO ao enviar a mensagem {indice + 1} do lote para {', '.join(destinatarios)}: {e}")
+                falhas.append((indice, e))
+        return falhas
+
+    def fechar(self):
+        with self._lock:
+            self._descartar()
+
+_conexao_execucao = None
+_lock_conexao = threading.Lock()
+
+def get_conexao_smtp():
+    """Conexão SMTP compartilhada da execução (criada na primeira chamada, conectada no primeiro envio)."""
+    global _conexao_execucao
+    with _lock_conexao:
+        if _conexao_execucao is None:
+            _conexao_execucao = ConexaoSMTP()
+        return _conexao_execucao
+
+def fechar_conexao_smtp():
+    """Encerra a conexão compartilhada; a próxima chamada a get_conexao_smtp() cria outra."""
+    global _conexao_execucao
+    with _lock_conexao:
+        conexao, _conexao_execucao = _conexao_execucao, None
+    if conexao is not None:
+        conexao.fechar()
 
-    destinatarios_lista = [destinatario_principal['email']] + destinatarios_copia
+# Blocos do arquivo lidos por vez ao codificar um anexo; múltiplo de 57 bytes, que rendem uma linha de 76 caracteres.
+TAMANHO_BLOCO_ANEXO = 57 * 1024
+
+def _base64_em_blocos(caminho):
+    """Conteúdo do arquivo em base64, linhas de 76 caracteres com CRLF, sem o CRLF final."""
+    anterior = None
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO_ANEXO)
+            if not bloco:
+                break
+            if anterior is not None:
+                yield anterior
+            anterior = base64.encodebytes(bloco).replace(b'\n', b'\r\n')
+    if anterior:
+        yield anterior[:-2]
+
+def serializar_em_blocos(msg):
+    """
+    Mensagem pronta para o DATA do SMTP (linhas com CRLF), em blocos de bytes. Os anexos em disco
+    (msg.anexos_em_disco, {marcador: caminho}) entram no lugar dos marcadores, lidos aos poucos.
+    Cabeçalhos e corpo são serializados já na chamada; só os anexos ficam para a iteração.
+    """
+    # A política da própria mensagem (compat32), como no as_string() do envio sem streaming: cabeçalhos
+    # com acentos (ex.: "período" no assunto) saem codificados em RFC 2047. Só o fim de linha muda.
+    texto = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+    anexos = getattr(msg, 'anexos_em_disco', None) or {}
+    trechos, posicao = [], 0
+    for marcador, caminho in anexos.items():
+        inicio = texto.index(marcador.encode('ascii'), posicao)
+        trechos.append((texto[posicao:inicio], caminho))
+        posicao = inicio + len(marcador)
+
+    def blocos():
+        for trecho, caminho in trechos:
+            yield trecho
+            yield from _base64_em_blocos(caminho)
+        yield texto[posicao:]
+    return blocos()
+
+def compactar_anexo(caminho_anexo):
+    """Grava ao lado do anexo um .zip com ele e devolve o caminho do .zip."""
+    caminho_zip = os.path.splitext(caminho_anexo)[0] + '.zip'
+    with zipfile.ZipFile(caminho_zip, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as arquivo_zip:
+        arquivo_zip.write(caminho_anexo, arcname=os.path.basename(caminho_anexo))
+    return caminho_zip
+
+def _parte_anexo(caminho_anexo, msg):
+    """
+    Parte MIME do anexo. Com config.EMAIL_ANEXO_STREAMING (padrão), a parte leva só um marcador e o
+    arquivo é lido e codificado durante o envio; senão, é carregado inteiro aqui, como antes.
+    """
+    nome = os.path.basename(caminho_anexo)
+    if not getattr(config, 'EMAIL_ANEXO_STREAMING', True):
+        with open(caminho_anexo, "rb") as fil:
+            # Cria um anexo do tipo application, que é o correto para arquivos binários como .xlsx
+            part = MIMEApplication(fil.read(), Name=nome)
+    else:
+        marcador = f"ANEXO-{uuid.uuid4().hex}"
+        part = MIMEBase('application', 'zip' if nome.lower().endswith('.zip') else 'octet-stream', name=nome)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.set_payload(marcador)
+        msg.anexos_em_disco[marcador] = caminho_anexo
+    # Adiciona o cabeçalho para que o cliente de e-mail saiba que é um anexo com um nome de arquivo
+    part['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return part
+
+def montar_email_resumo(corpo_html, report_title, caminho_anexo, destinatario, destinatarios_copia=()):
+    """
+    Monta a mensagem de resumo (HTML + anexo opcional). Devolve (mensagem, lista de destinatários).
+    Com config.EMAIL_COMPACTAR_ANEXO, o anexo segue dentro de um .zip gravado ao lado dele
+    (quando o .zip fica menor que o arquivo original).
+    """
+    destinatarios_copia = list(destinatarios_copia)
+    destinatarios_lista = [destinatario] + destinatarios_copia
     
     msg = MIMEMultipart('related')
     msg['Subject'] = f"[RESUMO][APONTAMENTO] - {report_title}"
     msg['From'] = f"{config.ASSINATURA_NOME} <{config.EMAIL_REMETENTE}>"
-    msg['To'] = destinatario_principal['email']
+    msg['To'] = destinatario
     if destinatarios_copia:
         msg['Cc'] = ", ".join(destinatarios_copia)
     
     msg.attach(MIMEText(corpo_html, 'html', 'utf-8'))
+    msg.anexos_em_disco = {}
 
     # MODIFICADO: Lógica de anexo corrigida para usar MIMEApplication
     if caminho_anexo and os.path.exists(caminho_anexo):
         print(f"Anexando o arquivo: {os.path.basename(caminho_anexo)}")
         try:
-            with open(caminho_anexo, "rb") as fil:
-                # Cria um anexo do tipo application, que é o correto para arquivos binários como .xlsx
-                part = MIMEApplication(
-                    fil.read(),
-                    Name=os.path.basename(caminho_anexo)
-                )
-            
-            # Adiciona o cabeçalho para que o cliente de e-mail saiba que é um anexo com um nome de arquivo
-            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(caminho_anexo)}"'
-            msg.attach(part)
-            print("Anexo adicionado ao e-mail corretamente.")
+            tamanho = os.path.getsize(caminho_anexo)
+            if getattr(config, 'EMAIL_COMPACTAR_ANEXO', False):
+                caminho_zip = compactar_anexo(caminho_anexo)
+                compactado = os.path.getsize(caminho_zip)
+                print(f"Anexo compactado: {tamanho / 1024:.1f} KB -> {compactado / 1024:.1f} KB "
+                      f"({os.path.basename(caminho_zip)}).")
+                # O .xlsx já é compactado internamente; o .zip só segue se de fato for menor.
+                if compactado < tamanho:
+                    caminho_anexo, tamanho = caminho_zip, compactado
+                else:
+                    print("O .zip não ficou menor que o anexo; enviando o arquivo original.")
+            msg.attach(_parte_anexo(caminho_anexo, msg))
+            print(f"Anexo adicionado ao e-mail corretamente ({tamanho / 1024:.1f} KB no arquivo, "
+                  f"cerca de {tamanho * 4 / 3 / 1024:.1f} KB em base64).")
         except Exception as e:
             print(f"ERRO ao tentar anexar o arquivo: {e}")
 
+    return msg, destinatarios_lista
+
+def enviar_email_resumo_mensal(corpo_html, report_title, caminho_anexo=None, conexao=None):
+    """
+    Envia o e-mail com o resumo de horas do período e um anexo opcional.
+    conexao: ConexaoSMTP a usar; por padrão, a conexão compartilhada da execução.
+    """
+    print("Preparando e-mail de resumo...")
+
+    destinatario_principal = config.MENSAL_DESTINATARIO_PRINCIPAL
+    destinatarios_copia = config.MENSAL_DESTINATARIOS_COPIA
+    
+    if not destinatario_principal['email']:
+        print("AVISO: E-mail de resumo não configurado. Pulando envio.")
+        return
+
+    msg, destinatarios_lista = montar_email_resumo(
+        corpo_html, report_title, caminho_anexo, destinatario_principal['email'], destinatarios_copia)
+
     try:
-        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
-        server.starttls()
-        server.login(config.EMAIL_REMETENTE, config.EMAIL_SENHA)
-        texto_email = msg.as_string()
-        server.sendmail(config.EMAIL_REMETENTE, destinatarios_lista, texto_email)
-        server.quit()
+        (conexao or get_conexao_smtp()).enviar(msg, destinatarios_lista)
         print(f"E-mail de resumo enviado com sucesso para: {', '.join(destinatarios_lista)}")
     except Exception as e:
         print(f"ERRO CRÍTICO ao enviar o e-mail de resumo: {e}")
+        # Propaga para a execução terminar como falha (e poder ser retomada sem repetir o download).
+        raise
+    return destinatarios_lista
 
-def enviar_email_status_execucao(status_final, erro_msg, timing_report, tempo_total):
+def enviar_email_status_execucao(status_final, erro_msg, timing_report, tempo_total, conexao=None):
     """Envia um e-mail de status (sucesso ou falha) da execução do robô."""
     print("Preparando e-mail de status da execução...")
     
@@ -100,16 +358,17 @@ def enviar_email_status_execucao(status_final, erro_msg, timing_report, tempo_to
         <h3 style="color: red;">Detalhes do Erro:</h3>
         <pre style="font-family: 'Courier New', monospace; background-color: #f5f5f5; padding: 10px; border: 1px solid #ccc; white-space: pre-wrap; word-wrap: break-word;">{erro_msg}</pre>
         """
+    elif erro_msg:
+        corpo_html += f"""
+        <h3 style="color: #C65911;">Avisos:</h3>
+        <pre style="font-family: 'Courier New', monospace; background-color: #f5f5f5; padding: 10px; border: 1px solid #ccc; white-space: pre-wrap; word-wrap: break-word;">{erro_msg}</pre>
+        """
 
     corpo_html += "</body></html>"
     msg.attach(MIMEText(corpo_html, 'html'))
 
     try:
-        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
-        server.starttls()
-        server.login(config.EMAIL_REMETENTE, config.EMAIL_SENHA)
-        server.sendmail(config.EMAIL_REMETENTE, config.STATUS_EMAIL_DESTINATARIO, msg.as_string())
-        server.quit()
+        (conexao or get_conexao_smtp()).enviar(msg, [config.STATUS_EMAIL_DESTINATARIO])
         print("E-mail de status enviado com sucesso.")
     except Exception as e:
         print(f"ERRO CRÍTICO ao enviar o e-mail de status: {e}")
\ No newline at end of file
@@ -1,9 +1,101 @@
 # -*- coding: utf-8 -*-
-import win32com.client as win32
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+
+import config
+
+# Elementos de proteção do OOXML: proteção de planilha, de estrutura da pasta e "somente leitura recomendado".
+PADRAO_PROTECAO = re.compile(rb'<(?:\w+:)?(?:sheetProtection|workbookProtection|fileSharing)\b[^>]*?/>')
+# Partes do pacote onde esses elementos podem aparecer.
+PADRAO_PARTES_PROTEGIDAS = re.compile(r'^xl/(?:workbook\.xml|worksheets/[^/]+\.xml)$')
+# Nenhuma tag de proteção passa deste tamanho; é a sobreposição mantida entre blocos lidos.
+SOBREPOSICAO_BLOCOS = 8 * 1024
+TAMANHO_BLOCO = 1024 * 1024
+
+def _remover_marca_da_web(file_path):
+    """Remove a 'marca da web' (fluxo alternativo Zone.Identifier do NTFS) que ativa o Modo de Exibição Protegido."""
+    if sys.platform != 'win32':
+        return False
+    try:
+        os.remove(f"{file_path}:Zone.Identifier")
+        return True
+    except OSError:
+        return False
+
+def _blocos_filtrados(origem, remover):
+    """
+    Lê a parte do zip em blocos, removendo (ou só procurando) as tags de proteção, inclusive entre blocos.
+    Na busca (remover=False) cada bloco sai inteiro, com a sobreposição do anterior: uma tag que cruze o
+    ponto de corte aparece completa em algum deles.
+    """
+    pendente = b''
+    while True:
+        bloco = origem.read(TAMANHO_BLOCO)
+        dados = pendente + bloco
+        if remover:
+            dados = PADRAO_PROTECAO.sub(b'', dados)
+        if not bloco:
+            yield dados
+            return
+        # Segura o final do bloco caso uma tag tenha sido cortada ao meio.
+        corte = max(0, len(dados) - SOBREPOSICAO_BLOCOS)
+        inicio_tag = dados.rfind(b'<', corte)
+        if inicio_tag != -1 and dados.find(b'>', inicio_tag) == -1:
+            corte = inicio_tag
+        pendente = dados[corte:]
+        yield dados[:corte] if remover else dados
+
+def _tem_protecao(arquivo_zip):
+    for info in arquivo_zip.infolist():
+        if not PADRAO_PARTES_PROTEGIDAS.match(info.filename):
+            continue
+        with arquivo_zip.open(info) as origem:
+            for dados in _blocos_filtrados(origem, remover=False):
+                if PADRAO_PROTECAO.search(dados):
+                    return True
+    return False
+
+def _reescrever_sem_protecao(file_path):
+    """Reescreve o pacote .xlsx sem as tags de proteção, copiando as demais partes sem alterações."""
+    caminho_temporario = f"{file_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(file_path) as origem_zip, \
+            zipfile.ZipFile(caminho_temporario, 'w', compression=zipfile.ZIP_DEFLATED) as destino_zip:
+        for info in origem_zip.infolist():
+            with origem_zip.open(info) as origem, destino_zip.open(info, 'w', force_zip64=True) as destino:
+                if PADRAO_PARTES_PROTEGIDAS.match(info.filename):
+                    for dados in _blocos_filtrados(origem, remover=True):
+                        destino.write(dados)
+                else:
+                    shutil.copyfileobj(origem, destino, TAMANHO_BLOCO)
+    os.replace(caminho_temporario, file_path)
+
+def desbloquear_sem_excel(file_path):
+    """
+    Desbloqueio multiplataforma, sem abrir o Excel: remove a marca da web e, só se existirem,
+    as proteções de planilha/pasta reescrevendo o zip. Arquivos sem proteção não são reescritos.
+    """
+    if not zipfile.is_zipfile(file_path):
+        raise ValueError(f"O arquivo '{os.path.basename(file_path)}' não é um pacote .xlsx válido.")
+
+    if _remover_marca_da_web(file_path):
+        print("Marca de arquivo baixado da internet removida.")
+
+    with zipfile.ZipFile(file_path) as arquivo_zip:
+        protegido = _tem_protecao(arquivo_zip)
+    if protegido:
+        _reescrever_sem_protecao(file_path)
+        print("Proteções da planilha removidas.")
+    else:
+        print("Nenhuma proteção encontrada; o arquivo pode ser lido diretamente.")
+
+def _desbloquear_com_excel(file_path):
+    """Caminho antigo (somente Windows): abre e salva o arquivo em uma instância do Excel via COM."""
+    import win32com.client as win32
 
-def unprotect_and_save(file_path):
-    """Abre um arquivo Excel, remove a proteção de 'Modo de Exibição Protegido' e salva."""
-    print("Tentando desbloquear o arquivo Excel...")
     try:
         excel = win32.Dispatch('Excel.Application')
         excel.Visible = False
@@ -13,9 +105,34 @@ def unprotect_and_save(file_path):
         workbook.Save()
         workbook.Close(SaveChanges=True)
         excel.Quit()
-        print("Arquivo salvo e desbloqueado com sucesso.")
-    except Exception as e:
-        print(f"ERRO ao tentar desbloquear o arquivo Excel: {e}")
+    except Exception:
         if 'excel' in locals():
             excel.Quit()
-        raise e
\ No newline at end of file
+        raise
+
+def unprotect_and_save(file_path, modo=None):
+    """
+    Remove a proteção de 'Modo de Exibição Protegido' do arquivo baixado e salva.
+
+    modo: 'python' (padrão) faz o desbloqueio sem o Excel, em qualquer sistema;
+          'com' usa o Excel via win32com (somente Windows). Padrão em config.MODO_DESBLOQUEIO_EXCEL.
+          No modo 'python', se o arquivo não puder ser tratado e o Excel estiver disponível, o COM é usado como alternativa.
+    """
+    modo = modo or getattr(config, 'MODO_DESBLOQUEIO_EXCEL', 'python')
+    print("Tentando desbloquear o arquivo Excel...")
+    inicio = time.perf_counter()
+    try:
+        if modo == 'com':
+            _desbloquear_com_excel(file_path)
+        else:
+            try:
+                desbloquear_sem_excel(file_path)
+            except (ValueError, zipfile.BadZipFile) as e:
+                if sys.platform != 'win32':
+                    raise
+                print(f"AVISO: Desbloqueio sem o Excel não foi possível ({e}). Usando o Excel como alternativa.")
+                _desbloquear_com_excel(file_path)
+        print(f"Arquivo salvo e desbloqueado com sucesso ({time.perf_counter() - inicio:.2f} s, modo '{modo}').")
+    except Exception as e:
+        print(f"ERRO ao tentar desbloquear o arquivo Excel: {e}")
+        raise e
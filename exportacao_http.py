@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação do relatório direto por HTTP, sem abrir o navegador.
+Reproduz o envio do formulário de login (LoginName/Password) e o pedido de exportação
+(button_ExecuteXSL) com uma requests.Session de conexões reaproveitadas, guardando os cookies
+entre execuções para pular o login quando a sessão ainda é válida.
+"""
+import json
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+import metricas
+
+TEXTO_LINK_RELATORIO = "Resumo de Horas por Profissional"
+TIPOS_CONTEUDO_PLANILHA = ('spreadsheetml', 'ms-excel', 'octet-stream')
+
+class _ColetorPagina(HTMLParser):
+    """Extrai de uma página os formulários (ação, método e campos), os links e os itens de lista."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.formularios = []
+        self.links = []
+        self.itens_lista = []
+        self._link_atual = None
+        self._item_atual = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self.formularios.append({
+                'action': attrs.get('action', ''),
+                'method': attrs.get('method', 'get').lower(),
+                'campos': {},
+                'botoes': {},
+            })
+        elif tag in ('input', 'button', 'select', 'textarea') and self.formularios:
+            nome = attrs.get('name')
+            tipo = attrs.get('type', 'submit' if tag == 'button' else 'text').lower()
+            if not nome and tag != 'button':
+                return
+            if tipo in ('submit', 'button', 'image') or tag == 'button':
+                self.formularios[-1]['botoes'][attrs.get('id') or nome] = (nome, attrs.get('value', ''))
+            elif tipo in ('checkbox', 'radio') and 'checked' not in attrs:
+                return
+            else:
+                self.formularios[-1]['campos'][nome] = attrs.get('value', '')
+        elif tag == 'a':
+            self._link_atual = [attrs.get('href', ''), '']
+        elif tag == 'li':
+            self._item_atual = [attrs.get('data-value') or attrs.get('value'), '']
+
+    def handle_data(self, data):
+        if self._link_atual is not None:
+            self._link_atual[1] += data
+        if self._item_atual is not None:
+            self._item_atual[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._link_atual is not None:
+            self.links.append((self._link_atual[0], ' '.join(self._link_atual[1].split())))
+            self._link_atual = None
+        elif tag == 'li' and self._item_atual is not None:
+            self.itens_lista.append((self._item_atual[0], ' '.join(self._item_atual[1].split())))
+            self._item_atual = None
+
+def _analisar(resposta):
+    # Sem charset no cabeçalho o requests assume ISO-8859-1, o que corromperia textos como 'Mês Corrente'.
+    if 'charset' not in resposta.headers.get('Content-Type', '').lower():
+        resposta.encoding = resposta.apparent_encoding
+    coletor = _ColetorPagina()
+    coletor.feed(resposta.text)
+    return coletor
+
+def _formulario_com_campo(pagina, nome_campo):
+    for formulario in pagina.formularios:
+        if nome_campo in formulario['campos'] or nome_campo in formulario['botoes']:
+            return formulario
+    return None
+
+def _link_relatorio(pagina):
+    for href, texto in pagina.links:
+        if texto == TEXTO_LINK_RELATORIO:
+            return href
+    return None
+
+def _arquivo_cookies():
+    return getattr(config, 'ARQUIVO_COOKIES_HTTP', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.cache', 'cookies_http.json')
+
+def _carregar_cookies(sessao):
+    caminho = _arquivo_cookies()
+    if not os.path.exists(caminho):
+        return
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            for cookie in json.load(arquivo):
+                sessao.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"AVISO: Não foi possível carregar os cookies salvos: {e}")
+
+def _salvar_cookies(sessao):
+    """Grava os cookies da sessão num arquivo legível só pelo usuário (equivalem ao login no site)."""
+    caminho = _arquivo_cookies()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    cookies = [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in sessao.cookies]
+    descritor = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, 'fchmod'):
+        # O modo do os.open só vale para arquivos novos; um arquivo antigo pode ter sido criado aberto.
+        os.fchmod(descritor, 0o600)
+    with open(descritor, 'w', encoding='utf-8') as arquivo:
+        json.dump(cookies, arquivo)
+
+_sessao = None
+
+def get_sessao():
+    """Sessão HTTP do processo, com pool de conexões, retentativas e os cookies da última execução."""
+    global _sessao
+    if _sessao is None:
+        _sessao = requests.Session()
+        # Só métodos idempotentes são repetidos (padrão do urllib3): o login e a exportação são POSTs.
+        retentativas = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retentativas)
+        _sessao.mount('http://', adaptador)
+        _sessao.mount('https://', adaptador)
+        _carregar_cookies(_sessao)
+    return _sessao
+
+def _fazer_login(sessao, url_pagina, pagina):
+    formulario = _formulario_com_campo(pagina, 'LoginName')
+    if formulario is None:
+        raise Exception("Formulário de login (campo 'LoginName') não encontrado na página.")
+    dados = dict(formulario['campos'])
+    dados['LoginName'] = config.SITE_LOGIN
+    dados['Password'] = config.SITE_SENHA
+    nome_botao, valor_botao = formulario['botoes'].get('button_processLogin', (None, None))
+    if nome_botao:
+        dados[nome_botao] = valor_botao
+    resposta = sessao.post(urljoin(url_pagina, formulario['action']), data=dados, timeout=30)
+    resposta.raise_for_status()
+    return resposta
+
+def _valor_periodo(pagina, period_button_text):
+    """Valor do campo de data correspondente à opção do menu (ex.: 'Mês Corrente')."""
+    valores_config = getattr(config, 'HTTP_VALORES_PERIODO', {})
+    if period_button_text in valores_config:
+        return valores_config[period_button_text]
+    for valor, texto in pagina.itens_lista:
+        if texto == period_button_text and valor:
+            return valor
+    raise Exception(f"Não foi possível determinar o valor HTTP da opção '{period_button_text}'. "
+                    "Configure HTTP_VALORES_PERIODO no config.")
+
+def _nome_arquivo(resposta):
+    disposicao = resposta.headers.get('Content-Disposition', '')
+    encontrado = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', disposicao)
+    return os.path.basename(encontrado.group(1)) if encontrado else 'Resumo_de_Horas_por_Profissional.xlsx'
+
+def login_e_download_http(period_button_text="Mês Corrente"):
+    """Faz login (se necessário) e exporta o relatório por HTTP. Devolve o caminho do arquivo salvo."""
+    sessao = get_sessao()
+    url_inicial = getattr(config, 'HTTP_URL_INICIAL', None) or config.SITE_URL
+
+    print("Acessando o site por HTTP...")
+    resposta = sessao.get(url_inicial, timeout=30)
+    resposta.raise_for_status()
+    pagina = _analisar(resposta)
+
+    if _link_relatorio(pagina):
+        print("Sessão anterior ainda válida, login dispensado.")
+    else:
+        print("Realizando login por HTTP...")
+        with metricas.span('login'):
+            resposta = _fazer_login(sessao, resposta.url, pagina)
+        pagina = _analisar(resposta)
+        if not _link_relatorio(pagina):
+            raise Exception(f"Não foi possível encontrar o link '{TEXTO_LINK_RELATORIO}' após o login.")
+        print("Login bem-sucedido.")
+
+    resposta = sessao.get(urljoin(resposta.url, _link_relatorio(pagina)), timeout=30)
+    resposta.raise_for_status()
+    pagina_filtros = _analisar(resposta)
+    formulario = _formulario_com_campo(pagina_filtros, 'button_ExecuteXSL') or _formulario_com_campo(pagina_filtros, 'P_DATA')
+    if formulario is None:
+        raise Exception("Formulário de exportação não encontrado na página de filtros.")
+
+    dados = dict(formulario['campos'])
+    dados['P_DATA'] = _valor_periodo(pagina_filtros, period_button_text)
+    nome_botao, valor_botao = formulario['botoes'].get('button_ExecuteXSL', (None, None))
+    if nome_botao:
+        dados[nome_botao] = valor_botao
+    dados.update(getattr(config, 'HTTP_PARAMETROS_EXPORTACAO', {}))
+
+    print(f"Exportando o relatório '{period_button_text}' por HTTP...")
+    url_exportacao = urljoin(resposta.url, formulario['action'])
+    metodo = sessao.post if formulario['method'] == 'post' else sessao.get
+    with metricas.span('download_http') as registro, \
+            metodo(url_exportacao, **({'data': dados} if formulario['method'] == 'post' else {'params': dados}),
+                   timeout=getattr(config, 'TEMPO_LIMITE_DOWNLOAD', 60), stream=True) as exportacao:
+        exportacao.raise_for_status()
+        tipo = exportacao.headers.get('Content-Type', '')
+        if not any(t in tipo for t in TIPOS_CONTEUDO_PLANILHA):
+            raise Exception(f"A exportação devolveu '{tipo}' em vez de uma planilha.")
+        caminho_destino = os.path.join(os.getcwd(), _nome_arquivo(exportacao))
+        # Grava num arquivo temporário: um download interrompido não deixa uma planilha truncada para trás.
+        caminho_temporario = f"{caminho_destino}.{os.getpid()}.part"
+        try:
+            with open(caminho_temporario, 'wb') as arquivo:
+                for bloco in exportacao.iter_content(chunk_size=256 * 1024):
+                    arquivo.write(bloco)
+            os.replace(caminho_temporario, caminho_destino)
+        except BaseException:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+        registro.atributos['bytes'] = os.path.getsize(caminho_destino)
+
+    _salvar_cookies(sessao)
+    print(f"Download concluído por HTTP: {caminho_destino}")
+    return caminho_destino
@@ -1,60 +1,151 @@
 # -*- coding: utf-8 -*-
 import holidays
-from datetime import date, timedelta
+import threading
+from datetime import date
+from functools import lru_cache
 import calendar
 
-def _get_feriados(ano):
-    """Função auxiliar para centralizar a criação do calendário de feriados."""
-    feriados_br = holidays.country_holidays('BR', state='SP')
+import numpy as np
+
+ESTADO_PADRAO = 'SP'
+MUNICIPIO_PADRAO = 'Santos'
+HORAS_POR_DIA = 8
+
+# Feriados municipais que a biblioteca 'holidays' não conhece, por município: {(mês, dia): nome}.
+FERIADOS_MUNICIPAIS = {
+    'Santos': {
+        (1, 26): "Aniversário de Santos",
+        (9, 8): "Nossa Senhora do Monte Serrat",
+    },
+}
+
+# Faixa de anos coberta pelo calendário na primeira construção; é ampliada sob demanda.
+ANOS_ANTES = 5
+ANOS_DEPOIS = 1
+
+@lru_cache(maxsize=None)
+def _get_feriados(ano, estado=ESTADO_PADRAO, municipio=MUNICIPIO_PADRAO):
+    """Função auxiliar para centralizar a criação do calendário de feriados (memorizada por ano/estado/município)."""
+    feriados_br = holidays.country_holidays('BR', state=estado, years=ano)
     feriados_br.update({
-        date(ano, 1, 26): "Aniversário de Santos",
-        date(ano, 9, 8): "Nossa Senhora do Monte Serrat"
+        date(ano, mes, dia): nome
+        for (mes, dia), nome in FERIADOS_MUNICIPAIS.get(municipio, {}).items()
     })
     return feriados_br
 
+@lru_cache(maxsize=None)
+def _mascara_dias_uteis_ano(ano, estado, municipio):
+    """Vetor booleano com um item por dia do ano: True para dias úteis (seg-sex fora de feriados)."""
+    dias = np.arange(np.datetime64(f'{ano}-01-01'), np.datetime64(f'{ano + 1}-01-01'))
+    datas_feriados = np.array(sorted(_get_feriados(ano, estado, municipio).keys()), dtype='datetime64[D]')
+    mascara = np.is_busday(dias, holidays=datas_feriados)
+    mascara.setflags(write=False)
+    return mascara
+
+def _para_dias(valores):
+    """Converte datas (date, datetime, Timestamp, datetime64 ou sequências delas) para datetime64[D]."""
+    return np.asarray(valores).astype('datetime64[D]')
+
+class CalendarioUteis:
+    """
+    Calendário de dias úteis pré-calculado para uma faixa de anos.
+    Guarda a contagem acumulada de dias úteis, de forma que "dias úteis entre A e B"
+    é respondido em O(1) e para muitos intervalos de uma vez.
+    """
+
+    def __init__(self, ano_inicio, ano_fim, estado=ESTADO_PADRAO, municipio=MUNICIPIO_PADRAO):
+        self.ano_inicio = ano_inicio
+        self.ano_fim = ano_fim
+        self.estado = estado
+        self.municipio = municipio
+        self.inicio = np.datetime64(f'{ano_inicio}-01-01', 'D')
+        self.mascara = np.concatenate([
+            _mascara_dias_uteis_ano(ano, estado, municipio) for ano in range(ano_inicio, ano_fim + 1)
+        ])
+        # acumulado[i] = dias úteis anteriores ao dia (inicio + i)
+        self.acumulado = np.concatenate(([0], np.cumsum(self.mascara, dtype=np.int32)))
+
+    def cobre(self, ano_inicio, ano_fim):
+        return self.ano_inicio <= ano_inicio and ano_fim <= self.ano_fim
+
+    def _posicoes(self, datas):
+        return (_para_dias(datas) - self.inicio).astype(np.int64)
+
+    def contar_dias_uteis(self, inicios, fins):
+        """Dias úteis em cada intervalo fechado [inicio, fim]; intervalos invertidos valem 0."""
+        limite = len(self.mascara)
+        pos_inicio = np.clip(self._posicoes(inicios), 0, limite)
+        pos_fim = np.clip(self._posicoes(fins) + 1, 0, limite)
+        return np.maximum(self.acumulado[pos_fim] - self.acumulado[pos_inicio], 0)
+
+    def eh_dia_util(self, datas):
+        """Vetor booleano indicando se cada data é dia útil."""
+        posicoes = self._posicoes(datas)
+        dentro = (posicoes >= 0) & (posicoes < len(self.mascara))
+        return np.where(dentro, self.mascara[np.clip(posicoes, 0, len(self.mascara) - 1)], False)
+
+_calendarios = {}
+_lock_calendarios = threading.Lock()
+
+def get_calendario(ano_inicio=None, ano_fim=None, estado=ESTADO_PADRAO, municipio=MUNICIPIO_PADRAO):
+    """
+    Devolve o calendário de dias úteis do processo para o estado/município, cobrindo ao menos
+    os anos pedidos. É construído uma única vez e só é refeito (reaproveitando os anos já
+    calculados) quando uma consulta sai da faixa coberta.
+    """
+    ano_atual = date.today().year
+    ano_inicio = ano_inicio if ano_inicio is not None else ano_atual
+    ano_fim = ano_fim if ano_fim is not None else ano_inicio
+    with _lock_calendarios:
+        calendario = _calendarios.get((estado, municipio))
+        if calendario is None or not calendario.cobre(ano_inicio, ano_fim):
+            if calendario is None:
+                novo_inicio = min(ano_inicio, ano_atual - ANOS_ANTES)
+                novo_fim = max(ano_fim, ano_atual + ANOS_DEPOIS)
+            else:
+                novo_inicio = min(ano_inicio, calendario.ano_inicio)
+                novo_fim = max(ano_fim, calendario.ano_fim)
+            calendario = CalendarioUteis(novo_inicio, novo_fim, estado, municipio)
+            _calendarios[(estado, municipio)] = calendario
+    return calendario
+
+def _anos_das_datas(*conjuntos):
+    anos = [_para_dias(datas).astype('datetime64[Y]').astype(int) + 1970 for datas in conjuntos]
+    anos = np.concatenate([np.ravel(a) for a in anos])
+    return int(anos.min()), int(anos.max())
+
+def contar_dias_uteis(inicios, fins, estado=ESTADO_PADRAO, municipio=MUNICIPIO_PADRAO):
+    """
+    Conta os dias úteis em cada intervalo fechado [inicio, fim]. Aceita datas isoladas
+    (devolve um int) ou sequências/arrays de datas (devolve um array NumPy).
+    """
+    ano_inicio, ano_fim = _anos_das_datas(inicios, fins)
+    resultado = get_calendario(ano_inicio, ano_fim, estado, municipio).contar_dias_uteis(inicios, fins)
+    return int(resultado) if np.ndim(resultado) == 0 else resultado
+
+def get_horas_uteis_vetorizado(inicios, fins, horas_por_dia=HORAS_POR_DIA):
+    """Horas úteis de cada intervalo; horas_por_dia pode ser um escalar ou um array (uma jornada por intervalo)."""
+    return contar_dias_uteis(inicios, fins) * np.asarray(horas_por_dia)
+
 def get_horas_uteis_no_periodo(start_date, end_date):
     """
     (NOVO) Calcula o total de horas úteis em um intervalo de datas específico.
     - Considera uma jornada de 8 horas por dia.
     - Desconta sábados, domingos e feriados.
     """
-    # Coleta feriados para todos os anos que o período possa abranger
-    anos = range(start_date.year, end_date.year + 1)
-    feriados_todos = {}
-    for ano in anos:
-        feriados_todos.update(_get_feriados(ano))
-
-    dias_uteis = 0
-    current_date = start_date
-    while current_date <= end_date:
-        if current_date.weekday() < 5 and current_date not in feriados_todos:
-            dias_uteis += 1
-        current_date += timedelta(days=1)
-    
+    dias_uteis = contar_dias_uteis(start_date, end_date)
     print(f"O período de {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')} tem {dias_uteis} dias úteis.")
-    return dias_uteis * 8
+    return dias_uteis * HORAS_POR_DIA
 
 # As funções antigas abaixo podem ser mantidas ou removidas se não forem mais usadas em outro lugar.
 def get_total_horas_uteis_mes(ano, mes):
-    feriados_br = _get_feriados(ano)
     dias_no_mes = calendar.monthrange(ano, mes)[1]
-    dias_uteis = 0
-    for dia in range(1, dias_no_mes + 1):
-        data_atual = date(ano, mes, dia)
-        if data_atual.weekday() < 5 and data_atual not in feriados_br:
-            dias_uteis += 1
-    return dias_uteis * 8
+    return contar_dias_uteis(date(ano, mes, 1), date(ano, mes, dias_no_mes)) * HORAS_POR_DIA
 
 def get_horas_uteis_ate_hoje(ano, mes):
-    feriados_br = _get_feriados(ano)
     hoje = date.today()
     if ano == hoje.year and mes == hoje.month:
         ultimo_dia_a_contar = hoje.day
     else:
         ultimo_dia_a_contar = calendar.monthrange(ano, mes)[1]
-    dias_uteis_passados = 0
-    for dia in range(1, ultimo_dia_a_contar + 1):
-        data_atual = date(ano, mes, dia)
-        if data_atual.weekday() < 5 and data_atual not in feriados_br:
-            dias_uteis_passados += 1
-    return dias_uteis_passados * 8
\ No newline at end of file
+    return contar_dias_uteis(date(ano, mes, 1), date(ano, mes, ultimo_dia_a_contar)) * HORAS_POR_DIA
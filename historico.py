@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Histórico de vários meses: guarda em um SQLite os agregados mensais por profissional
+(horas aprovadas e esperadas) e responde a perguntas de vários meses (trimestre, acumulado
+do ano) somando esses agregados, sem reler as exportações brutas.
+
+O backfill carrega cada exportação uma única vez e só (re)grava os meses que ainda não
+estão no histórico, ou que estavam incompletos (mês corrente).
+
+Uso pela linha de comando:
+    python historico.py backfill 2025-01 2025-06 --arquivo exportacao_semestre.xlsx
+    python historico.py consulta --trimestre 2025 2
+    python historico.py consulta --acumulado 2025
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, datetime
+
+import pandas as pd
+
+import config
+import date_logic
+import processamento_dados
+
+_lock = threading.Lock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS meses (
+    ano INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    inicio TEXT NOT NULL,
+    fim TEXT NOT NULL,
+    origem TEXT,
+    atualizado_em TEXT NOT NULL,
+    PRIMARY KEY (ano, mes)
+);
+CREATE TABLE IF NOT EXISTS agregados_mensais (
+    ano INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    profissional TEXT NOT NULL,
+    horas_aprovadas REAL NOT NULL,
+    horas_esperadas REAL NOT NULL,
+    PRIMARY KEY (ano, mes, profissional)
+);
+"""
+
+def _caminho_banco():
+    return getattr(config, 'ARQUIVO_HISTORICO', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'historico_horas.sqlite3')
+
+def _conectar():
+    """Abre o banco criando as tabelas. Use com closing(): o 'with' da conexão só fecha a transação."""
+    conexao = sqlite3.connect(_caminho_banco())
+    conexao.executescript(_ESQUEMA)
+    return conexao
+
+# --- Gravação ---
+
+def registrar_mes(ano, mes, df_resumo, start_date, end_date, origem=None):
+    """
+    Grava (substituindo) os agregados de um mês a partir de um DataFrame no formato de
+    processamento_dados.gerar_resumo(). start_date/end_date registram o trecho do mês coberto.
+    """
+    linhas = [(ano, mes, str(prof), float(aprovadas), float(esperadas))
+              for prof, aprovadas, esperadas in zip(df_resumo['Profissional'],
+                                                    df_resumo['Horas Aprovadas'],
+                                                    df_resumo['Total Horas Esperadas'])]
+    with _lock, closing(_conectar()) as conexao, conexao:
+        conexao.execute("DELETE FROM agregados_mensais WHERE ano = ? AND mes = ?", (ano, mes))
+        conexao.executemany("INSERT INTO agregados_mensais VALUES (?, ?, ?, ?, ?)", linhas)
+        conexao.execute("INSERT OR REPLACE INTO meses VALUES (?, ?, ?, ?, ?, ?)",
+                        (ano, mes, start_date.isoformat(), end_date.isoformat(), origem,
+                         datetime.now().isoformat(timespec='seconds')))
+    print(f"Histórico: {date_logic.MESES_PT[mes]} de {ano} gravado ({len(linhas)} profissionais, "
+          f"{start_date.strftime('%d/%m')} a {end_date.strftime('%d/%m')}).")
+
+def registrar_periodo(periodo_analise, df_resumo, origem=None):
+    """Grava no histórico o resumo de uma execução normal do main.py."""
+    inicio = periodo_analise['start_date']
+    registrar_mes(inicio.year, inicio.month, df_resumo, inicio, periodo_analise['end_date'], origem)
+
+def meses_registrados():
+    """Devolve {(ano, mês): data final coberta} de todos os meses já gravados."""
+    with _lock, closing(_conectar()) as conexao:
+        linhas = conexao.execute("SELECT ano, mes, fim FROM meses").fetchall()
+    return {(ano, mes): date.fromisoformat(fim) for ano, mes, fim in linhas}
+
+# --- Backfill ---
+
+def _indexar_arquivos(arquivos):
+    """
+    Lê cada exportação uma única vez (pelo cache colunar, quando habilitado) e indica, para cada
+    mês presente nos dados, o arquivo mais recente que o contém.
+    """
+    arquivos_por_mes = {}
+    for caminho in sorted(arquivos, key=os.path.getmtime):
+        df = processamento_dados.ler_lancamentos_aprovados(caminho)
+        datas = df['Data'].dropna()
+        for ano, mes in set(zip(datas.dt.year, datas.dt.month)):
+            arquivos_por_mes[(int(ano), int(mes))] = (caminho, df)
+    return arquivos_por_mes
+
+def _baixar_mes(periodo):
+    """Baixa pelo site a exportação de um mês que ele oferece diretamente ('Mês passado'/'Mês Corrente')."""
+    import automacao_web
+    import excel_handler
+
+    caminho = automacao_web.login_e_download(periodo['button_key'])
+    excel_handler.unprotect_and_save(caminho)
+    return caminho
+
+def backfill(inicio, fim, arquivos=(), baixar=None, forcar=False, df_pessoas_ativas=None):
+    """
+    Preenche o histórico com os meses entre as datas inicio e fim.
+
+    arquivos: exportações já baixadas (podem cobrir vários meses cada; cada uma é lida uma vez).
+    baixar: se True, baixa pelo site os meses que ele exporta diretamente e que não estão em
+            'arquivos'. Padrão em config.BACKFILL_BAIXAR_DO_SITE.
+    forcar: regrava também os meses completos que já estão no histórico.
+
+    Retorna {(ano, mês): situação}.
+    """
+    if baixar is None:
+        baixar = getattr(config, 'BACKFILL_BAIXAR_DO_SITE', True)
+    hoje = date.today()
+    ja_gravados = {} if forcar else meses_registrados()
+
+    pendentes = []
+    situacao = {}
+    for ano, mes in date_logic.meses_no_intervalo(inicio, fim):
+        periodo = date_logic.get_periodo_mes(ano, mes, hoje)
+        if periodo is None:
+            situacao[(ano, mes)] = 'mês futuro'
+        elif ja_gravados.get((ano, mes)) is not None and ja_gravados[(ano, mes)] >= periodo['end_date']:
+            situacao[(ano, mes)] = 'já no histórico'
+        else:
+            pendentes.append(periodo)
+
+    if pendentes:
+        arquivos_por_mes = _indexar_arquivos(arquivos) if arquivos else {}
+        if df_pessoas_ativas is None:
+            df_pessoas_ativas = processamento_dados.get_pessoas_ativas()
+
+        for periodo in pendentes:
+            inicio_mes, fim_mes = periodo['start_date'], periodo['end_date']
+            chave = (inicio_mes.year, inicio_mes.month)
+            baixado = None
+            try:
+                if chave in arquivos_por_mes:
+                    origem, df_aprovado = arquivos_por_mes[chave]
+                elif baixar and periodo['button_key']:
+                    baixado = origem = _baixar_mes(periodo)
+                    df_aprovado = processamento_dados.ler_lancamentos_aprovados(baixado)
+                else:
+                    situacao[chave] = 'sem exportação disponível'
+                    print(f"AVISO: Nenhuma exportação para {periodo['report_title']}. Mês ignorado.")
+                    continue
+
+                no_mes = (df_aprovado['Data'] >= pd.Timestamp(inicio_mes)) & (df_aprovado['Data'] <= pd.Timestamp(fim_mes))
+                df_resumo = processamento_dados.gerar_resumo(
+                    df_aprovado[no_mes], inicio_mes, fim_mes, df_pessoas_ativas)
+                registrar_mes(chave[0], chave[1], df_resumo, inicio_mes, fim_mes,
+                              os.path.basename(origem))
+                situacao[chave] = 'gravado'
+            except Exception as e:
+                situacao[chave] = f"erro: {e}"
+                print(f"ERRO no backfill de {periodo['report_title']}: {e}")
+            finally:
+                if baixado and os.path.exists(baixado):
+                    os.remove(baixado)
+
+    gravados = sum(1 for valor in situacao.values() if valor == 'gravado')
+    print(f"Backfill concluído: {gravados} mês(es) gravado(s) de {len(situacao)} no intervalo.")
+    return dict(sorted(situacao.items()))
+
+# --- Consultas ---
+
+def consultar(inicio, fim):
+    """
+    Soma os agregados mensais dos meses entre as datas inicio e fim (meses inteiros).
+    Devolve (df_resumo, meses_faltantes); df_resumo tem as mesmas colunas de
+    processamento_dados.gerar_resumo(), então pode ser passado a gerar_html_resumo().
+    """
+    meses = date_logic.meses_no_intervalo(inicio, fim)
+    chave_inicio = meses[0][0] * 100 + meses[0][1]
+    chave_fim = meses[-1][0] * 100 + meses[-1][1]
+    with _lock, closing(_conectar()) as conexao:
+        df = pd.read_sql_query(
+            "SELECT profissional AS 'Profissional', SUM(horas_aprovadas) AS 'Horas Aprovadas', "
+            "SUM(horas_esperadas) AS 'Total Horas Esperadas' FROM agregados_mensais "
+            "WHERE ano * 100 + mes BETWEEN ? AND ? GROUP BY profissional ORDER BY profissional",
+            conexao, params=(chave_inicio, chave_fim))
+        presentes = set(conexao.execute(
+            "SELECT ano, mes FROM meses WHERE ano * 100 + mes BETWEEN ? AND ?",
+            (chave_inicio, chave_fim)).fetchall())
+
+    df['Total Saldo'] = df['Horas Aprovadas'] - df['Total Horas Esperadas']
+    meses_faltantes = [m for m in meses if m not in presentes]
+    if meses_faltantes:
+        print("AVISO: Meses fora do histórico (rode o backfill): "
+              + ", ".join(f"{mes:02d}/{ano}" for ano, mes in meses_faltantes))
+    return df, meses_faltantes
+
+def resumo_trimestre(ano, trimestre):
+    """Resumo somado de um trimestre (1 a 4)."""
+    mes_inicial = 3 * (trimestre - 1) + 1
+    return consultar(date(ano, mes_inicial, 1), date(ano, mes_inicial + 2, 1))
+
+def resumo_acumulado_ano(ano, ate_mes=None):
+    """Saldo acumulado do ano, de janeiro até ate_mes (padrão: o mês corrente ou dezembro)."""
+    hoje = date.today()
+    if ate_mes is None:
+        ate_mes = hoje.month if ano == hoje.year else 12
+    return consultar(date(ano, 1, 1), date(ano, ate_mes, 1))
+
+# --- Linha de comando ---
+
+def _mes(texto):
+    return datetime.strptime(texto, '%Y-%m').date()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histórico mensal de horas por profissional.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_backfill = comandos.add_parser('backfill', help="Grava no histórico os meses de um intervalo.")
+    p_backfill.add_argument('inicio', type=_mes, help="Primeiro mês (AAAA-MM).")
+    p_backfill.add_argument('fim', type=_mes, help="Último mês (AAAA-MM).")
+    p_backfill.add_argument('--arquivo', action='append', default=[],
+                            help="Exportação já baixada (pode repetir).")
+    p_backfill.add_argument('--sem-download', action='store_true',
+                            help="Não baixa pelo site os meses sem arquivo.")
+    p_backfill.add_argument('--forcar', action='store_true',
+                            help="Regrava meses que já estão no histórico.")
+
+    p_consulta = comandos.add_parser('consulta', help="Soma os meses do histórico.")
+    grupo = p_consulta.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--trimestre', nargs=2, type=int, metavar=('ANO', 'TRIMESTRE'))
+    grupo.add_argument('--acumulado', type=int, metavar='ANO')
+    grupo.add_argument('--intervalo', nargs=2, type=_mes, metavar=('INICIO', 'FIM'))
+
+    args = parser.parse_args(argv)
+    if args.comando == 'backfill':
+        for (ano, mes), situacao in backfill(args.inicio, args.fim, args.arquivo,
+                                             baixar=False if args.sem_download else None,
+                                             forcar=args.forcar).items():
+            print(f"  {mes:02d}/{ano}: {situacao}")
+    else:
+        if args.trimestre:
+            df, _ = resumo_trimestre(*args.trimestre)
+        elif args.acumulado:
+            df, _ = resumo_acumulado_ano(args.acumulado)
+        else:
+            df, _ = consultar(*args.intervalo)
+        print(df.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Execução em lote: roda o robô para várias configurações (um "inquilino" por perfil) em
+processos separados. Cada perfil é um arquivo .py (no formato do config.py) ou .json cujos
+valores em MAIÚSCULAS substituem os do config.py do projeto.
+
+- O download (navegador/HTTP) é limitado por um semáforo compartilhado entre os processos
+  (--downloads-simultaneos); o processamento, que é CPU, roda livre até --processos perfis juntos.
+- Cada inquilino roda num processo novo, com pasta própria em lote/<data_hora>/<perfil>/:
+  downloads temporários, anexo, checkpoints, métricas, estado do modo delta, cookies, histórico e o log
+  da execução (execucao.log) ficam nela. O cache colunar (PASTA_CACHE) é compartilhado.
+- Ao fim, imprime um resumo dos tempos por perfil e por etapa e grava resumo_lote.json.
+
+Uso:
+    python lote.py perfis/cliente_a.py perfis/cliente_b.json
+    python lote.py perfis/*.json --processos 4 --downloads-simultaneos 1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import runpy
+import sys
+import time
+import traceback
+from datetime import datetime
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+# Configurações de caminho: valores relativos num perfil são relativos à pasta do perfil.
+PREFIXOS_CAMINHO = ('CAMINHO_', 'ARQUIVO_', 'PASTA_', 'PERFIL_')
+
+def _caminhos_absolutos(valores, pasta):
+    """Valores em MAIÚSCULAS, com as configurações de caminho relativas resolvidas a partir de `pasta`."""
+    resultado = {}
+    for nome, valor in valores.items():
+        if not nome.isupper():
+            continue
+        if nome.startswith(PREFIXOS_CAMINHO) and isinstance(valor, str) and valor and not os.path.isabs(valor):
+            valor = os.path.join(pasta, valor)
+        resultado[nome] = valor
+    return resultado
+
+def carregar_perfil(caminho):
+    """Lê os valores de um perfil (.py ou .json). Só nomes em MAIÚSCULAS são considerados."""
+    if caminho.lower().endswith('.json'):
+        with open(caminho, encoding='utf-8') as arquivo:
+            valores = json.load(arquivo)
+    else:
+        valores = runpy.run_path(caminho)
+    return _caminhos_absolutos(valores, os.path.dirname(os.path.abspath(caminho)))
+
+def _caminhos_isolados(pasta, config):
+    """Arquivos e pastas que cada inquilino mantém só para si, salvo se o perfil definir outros."""
+    caminhos = {
+        'PASTA_DOWNLOADS_TEMPORARIA': os.path.join(pasta, 'downloads'),
+        'PASTA_METRICAS': os.path.join(pasta, 'metricas'),
+        'ARQUIVO_ESTADO_DELTA': os.path.join(pasta, 'estado_delta.npz'),
+        'ARQUIVO_COOKIES_NAVEGADOR': os.path.join(pasta, 'cookies_navegador.json'),
+        'ARQUIVO_COOKIES_HTTP': os.path.join(pasta, 'cookies_http.json'),
+        'ARQUIVO_HISTORICO': os.path.join(pasta, 'historico_horas.sqlite3'),
+        'PASTA_CHECKPOINTS': os.path.join(pasta, 'checkpoints'),
+    }
+    # Um perfil do Chrome compartilhado travaria entre inquilinos paralelos (e misturaria as sessões
+    # de contas diferentes); quem usa perfil no config.py do projeto ganha um próprio.
+    if getattr(config, 'PERFIL_CHROME', None):
+        caminhos['PERFIL_CHROME'] = os.path.join(pasta, 'perfil_chrome')
+    return caminhos
+
+def _executar_inquilino(nome, caminho_perfil, pasta, semaforo_download, fila):
+    """Processo de um inquilino: aplica o perfil ao config, roda main.run() e devolve o resultado pela fila."""
+    os.makedirs(os.path.join(pasta, 'downloads'), exist_ok=True)
+    log = open(os.path.join(pasta, 'execucao.log'), 'a', encoding='utf-8')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    sys.stdout.reconfigure(encoding='utf-8', line_buffering=True)
+    sys.stderr.reconfigure(encoding='utf-8', line_buffering=True)
+
+    inicio = time.perf_counter()
+    try:
+        sys.path.insert(0, PASTA_PROJETO)
+        import config
+
+        # Os caminhos relativos do config.py do projeto valem a partir da pasta do projeto (como nos
+        # scripts run_robot), não da pasta do inquilino para onde o processo muda abaixo.
+        valores = _caminhos_absolutos(vars(config), PASTA_PROJETO)
+        valores.update(_caminhos_isolados(pasta, config))
+        valores.update(carregar_perfil(caminho_perfil))
+        for chave, valor in valores.items():
+            setattr(config, chave, valor)
+        # O anexo Excel é gravado na pasta de trabalho atual.
+        os.chdir(pasta)
+
+        import main
+        resultado = main.run(semaforo_download=semaforo_download)
+    except BaseException as e:
+        traceback.print_exc()
+        resultado = {'status': 'FALHA', 'erro': f"{type(e).__name__}: {e}", 'timing_report': {},
+                     'tempo_total': time.perf_counter() - inicio}
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    fila.put((nome, resultado))
+
+def _nomes_unicos(perfis):
+    """Nome de cada inquilino: o nome do arquivo do perfil, numerado se repetir."""
+    nomes, vistos = [], {}
+    for caminho in perfis:
+        base = os.path.splitext(os.path.basename(caminho))[0]
+        vistos[base] = vistos.get(base, 0) + 1
+        nomes.append(base if vistos[base] == 1 else f"{base}_{vistos[base]}")
+    return nomes
+
+def executar_lote(perfis, pasta_lote, processos=None, downloads_simultaneos=None):
+    """
+    Roda um processo por perfil, no máximo `processos` ao mesmo tempo e no máximo
+    `downloads_simultaneos` downloads juntos. Devolve (resultados por perfil, duração do lote em s).
+    """
+    processos = processos or os.cpu_count() or 1
+    if downloads_simultaneos is None:
+        try:
+            import config
+            downloads_simultaneos = getattr(config, 'LOTE_DOWNLOADS_SIMULTANEOS', 2)
+        except ImportError:
+            downloads_simultaneos = 2
+    # 'spawn' em todas as plataformas: cada inquilino começa com módulos e config limpos.
+    contexto = multiprocessing.get_context('spawn')
+    semaforo = contexto.Semaphore(max(1, downloads_simultaneos))
+    fila = contexto.Queue()
+
+    pendentes = list(zip(_nomes_unicos(perfis), (os.path.abspath(p) for p in perfis)))
+    rodando = {}
+    resultados = {}
+    inicio_lote = time.perf_counter()
+    print(f"Lote com {len(pendentes)} perfil(is): até {processos} processo(s) e "
+          f"{downloads_simultaneos} download(s) simultâneo(s). Pasta: {pasta_lote}")
+
+    while pendentes or rodando:
+        while pendentes and len(rodando) < processos:
+            nome, caminho = pendentes.pop(0)
+            pasta = os.path.join(pasta_lote, nome)
+            processo = contexto.Process(target=_executar_inquilino, name=f"lote-{nome}",
+                                        args=(nome, caminho, pasta, semaforo, fila))
+            processo.start()
+            rodando[nome] = (processo, pasta, time.perf_counter())
+            print(f"[{nome}] iniciado (log em {os.path.join(pasta, 'execucao.log')})")
+
+        try:
+            nome, resultado = fila.get(timeout=1)
+        except queue.Empty:
+            _registrar_processos_mortos(rodando, resultados, fila)
+            continue
+        resultados[nome] = resultado
+        _finalizar(rodando, nome, resultado)
+
+    return {nome: resultados[nome] for nome in _nomes_unicos(perfis)}, time.perf_counter() - inicio_lote
+
+def _registrar_processos_mortos(rodando, resultados, fila):
+    """Conta como falha o processo que terminou sem devolver resultado (ex.: encerrado pelo sistema)."""
+    mortos = [nome for nome, (processo, _, _) in rodando.items() if not processo.is_alive()]
+    if not mortos:
+        return
+    # O resultado de um processo recém-terminado ainda pode estar a caminho na fila.
+    while True:
+        try:
+            nome, resultado = fila.get(timeout=0.5)
+        except queue.Empty:
+            break
+        resultados[nome] = resultado
+        _finalizar(rodando, nome, resultado)
+    for nome in mortos:
+        if nome in rodando:
+            processo, _, inicio = rodando[nome]
+            resultados[nome] = {'status': 'FALHA', 'erro': f"processo terminou com código {processo.exitcode}",
+                                'timing_report': {}, 'tempo_total': time.perf_counter() - inicio}
+            _finalizar(rodando, nome, resultados[nome])
+
+def _finalizar(rodando, nome, resultado):
+    processo, pasta, _ = rodando.pop(nome)
+    processo.join()
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, 'resultado.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"[{nome}] {resultado['status']} em {resultado['tempo_total']:.2f} s")
+
+def resumir(resultados, duracao_lote):
+    """Tempos agregados do lote: por perfil e, para cada etapa, mínimo/média/máximo entre os perfis."""
+    etapas = {}
+    for resultado in resultados.values():
+        for etapa, segundos in resultado['timing_report'].items():
+            if not etapa.startswith('Caminho Crítico'):
+                etapas.setdefault(etapa, []).append(segundos)
+    soma = sum(resultado['tempo_total'] for resultado in resultados.values())
+    return {
+        'duracao_lote_s': round(duracao_lote, 3),
+        'soma_tempos_perfis_s': round(soma, 3),
+        'paralelismo_efetivo': round(soma / duracao_lote, 2) if duracao_lote > 0 else None,
+        'sucessos': sum(1 for r in resultados.values() if r['status'].startswith('SUCESSO')),
+        'falhas': sum(1 for r in resultados.values() if not r['status'].startswith('SUCESSO')),
+        'perfis': resultados,
+        'etapas': {etapa: {'perfis': len(tempos), 'min_s': round(min(tempos), 3),
+                           'media_s': round(sum(tempos) / len(tempos), 3), 'max_s': round(max(tempos), 3)}
+                   for etapa, tempos in etapas.items()},
+    }
+
+def imprimir_resumo(resumo):
+    print(f"\n{'Perfil':<24}{'Status':<24}{'Total (s)':>10}")
+    for nome, resultado in resumo['perfis'].items():
+        print(f"{nome:<24}{resultado['status']:<24}{resultado['tempo_total']:>10.2f}")
+    if resumo['etapas']:
+        print(f"\n{'Etapa':<44}{'Perfis':>7}{'Mín (s)':>9}{'Média (s)':>11}{'Máx (s)':>9}")
+        for etapa, tempos in resumo['etapas'].items():
+            print(f"{etapa:<44}{tempos['perfis']:>7}{tempos['min_s']:>9.2f}{tempos['media_s']:>11.2f}{tempos['max_s']:>9.2f}")
+    print(f"\nLote: {resumo['sucessos']} sucesso(s), {resumo['falhas']} falha(s) em {resumo['duracao_lote_s']:.2f} s "
+          f"(soma dos perfis: {resumo['soma_tempos_perfis_s']:.2f} s).")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roda o robô para vários perfis de configuração em paralelo.")
+    parser.add_argument('perfis', nargs='+', help="Arquivos de perfil (.py no formato do config.py ou .json).")
+    parser.add_argument('--processos', type=int, default=None,
+                        help="Perfis rodando ao mesmo tempo (padrão: número de CPUs).")
+    parser.add_argument('--downloads-simultaneos', type=int, default=None,
+                        help="Downloads ao mesmo tempo entre todos os perfis (padrão: config.LOTE_DOWNLOADS_SIMULTANEOS ou 2).")
+    parser.add_argument('--pasta', default=None, help="Pasta do lote (padrão: lote/<data_hora>).")
+    args = parser.parse_args(argv)
+
+    for caminho in args.perfis:
+        if not os.path.exists(caminho):
+            parser.error(f"Perfil não encontrado: {caminho}")
+
+    pasta_lote = os.path.abspath(args.pasta or os.path.join(
+        PASTA_PROJETO, 'lote', datetime.now().strftime('%Y%m%d_%H%M%S')))
+    resultados, duracao = executar_lote(args.perfis, pasta_lote, args.processos, args.downloads_simultaneos)
+    resumo = resumir(resultados, duracao)
+    imprimir_resumo(resumo)
+
+    caminho_resumo = os.path.join(pasta_lote, 'resumo_lote.json')
+    with open(caminho_resumo, 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resumo gravado em {caminho_resumo}")
+    return 0 if resumo['falhas'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,73 +1,267 @@
 # -*- coding: utf-8 -*-
+import argparse
+import contextlib
 import os
+import sys
 import time
 import traceback
+from datetime import datetime
 
 import config
-import automacao_web
-import excel_handler
-import processamento_dados
 import envio_email
 import date_logic
+import metricas
+import checkpoints
+from checkpoints import CheckpointEtapa
+from pipeline import Etapa, executar_etapas, caminho_critico
 
-def run():
-    """Função principal que orquestra o relatório de resumo mensal de horas."""
+# Os módulos pesados (selenium, pandas, win32com) são importados dentro das etapas que os usam:
+# o processamento de um arquivo local não carrega o navegador, e o pandas é carregado pela
+# etapa de pessoas ativas enquanto o download acontece.
+
+def _abrir_conexao_smtp_antecipada(resultados):
+    """Abre a conexão SMTP enquanto as outras etapas rodam; falhas aqui só adiam a conexão para o envio."""
+    try:
+        return envio_email.get_conexao_smtp().conectar()
+    except Exception as e:
+        print(f"AVISO: Não foi possível abrir a conexão SMTP antecipadamente: {e}")
+        return None
+
+def _baixar(periodo_analise, semaforo_download):
+    """Download do relatório; com um semáforo (execução em lote), limita quantos downloads rodam juntos."""
+    import automacao_web
+    with semaforo_download or contextlib.nullcontext():
+        return automacao_web.login_e_download(periodo_analise['button_key'])
+
+def _desbloquear(caminho):
+    import excel_handler
+    return excel_handler.unprotect_and_save(caminho)
+
+def _pessoas_ativas():
+    import processamento_dados
+    return processamento_dados.get_pessoas_ativas()
+
+def _processar_planilha(caminho, start_date, end_date):
+    import processamento_dados
+    return processamento_dados.processar_planilha(caminho, start_date, end_date)
+
+def _agregar(r, start_date, end_date):
+    import agregacoes
+    return agregacoes.agregar(r['planilha'], start_date, end_date, r['pessoas_ativas'])
+
+def _gerar_resumo(r, start_date, end_date, modo_delta):
+    import processamento_dados
+    return processamento_dados.gerar_resumo(
+        r['planilha'], start_date, end_date, r['pessoas_ativas'],
+        r['delta'].horas_por_profissional if modo_delta else r['agregacao']['profissional'])
+
+def _gerar_html(r, start_date, end_date, modo_delta):
+    import agregacoes
+    import processamento_dados
+    html_adicional = ""
+    if modo_delta:
+        import delta_execucao
+        html_adicional = delta_execucao.html_mudancas(r['delta'])
+    return processamento_dados.gerar_html_resumo(r['resumo'], start_date, end_date, html_adicional=html_adicional,
+                                                 agregacoes=agregacoes.tabelas(r['agregacao']))
+
+def _criar_anexo(r, caminho_arquivo):
+    import agregacoes
+    import processamento_dados
+    return processamento_dados.criar_excel_completo(r['planilha'], r['resumo'], caminho_arquivo,
+                                                    agregacoes=agregacoes.tabelas(r['agregacao']))
+
+def _calcular_delta(r, start_date, end_date):
+    import delta_execucao
+    return delta_execucao.calcular_delta(r['planilha'], start_date, end_date)
+
+def _salvar_estado_delta(r):
+    import delta_execucao
+    # Sem destinatário configurado o resumo não é enviado (a etapa 'email' devolve None): o estado
+    # fica como estava, para o próximo envio comparar com o último relatório que alguém recebeu.
+    if not r['email']:
+        print("AVISO: Resumo não enviado; estado do delta mantido.")
+        return None
+    return delta_execucao.salvar_estado(r['delta'])
+
+def _enviar_relatorios_gestores(r, periodo_analise, checkpoint=None):
+    import relatorios_gestores
+    anterior = (checkpoint.anterior('gestores') if checkpoint else None) or {}
+    return relatorios_gestores.enviar_relatorios_por_gestor(
+        r['planilha'], r['resumo'], r['pessoas_ativas'], periodo_analise,
+        ja_enviados={gestor for gestor, situacao in anterior.items() if situacao == 'enviado'})
+
+def _registrar_historico(r, periodo_analise):
+    import historico
+    return historico.registrar_periodo(periodo_analise, r['resumo'], os.path.basename(r['download']))
+
+def _nome_arquivo_excel(periodo_analise):
+    return f"Relatorio_Horas_{periodo_analise['report_title'].replace(' ', '_').replace('/', '-')}.xlsx"
+
+# Como cada etapa grava o seu checkpoint (ver checkpoints.py). As etapas sem formato não gravam
+# nada, mas informam uma impressão do resultado para decidir se as dependentes podem ser puladas.
+CHECKPOINTS_ETAPAS = {
+    'download': CheckpointEtapa('download', impressao=checkpoints.impressao_arquivo),
+    'pessoas_ativas': CheckpointEtapa(),
+    'smtp': CheckpointEtapa(impressao=lambda conexao: 'smtp'),
+    'desbloqueio': CheckpointEtapa('marcador'),
+    'planilha': CheckpointEtapa('pickle'),
+    'agregacao': CheckpointEtapa('pickle'),
+    'delta': CheckpointEtapa('pickle'),
+    'resumo': CheckpointEtapa('pickle'),
+    'html': CheckpointEtapa('texto'),
+    'anexo': CheckpointEtapa('arquivo'),
+    'email': CheckpointEtapa('json'),
+    'estado_delta': CheckpointEtapa('marcador'),
+    'gestores': CheckpointEtapa('json', completo=lambda situacao: all(
+        valor in ('enviado', 'sem e-mail') for valor in situacao.values())),
+    'historico': CheckpointEtapa('marcador'),
+}
+
+def montar_etapas(periodo_analise, semaforo_download=None, checkpoint=None):
+    """
+    Grafo de etapas do relatório. Etapas independentes rodam em paralelo:
+    a leitura das pessoas ativas e a conexão SMTP acontecem durante o download,
+    e o HTML do e-mail é gerado enquanto o anexo Excel é gravado.
+    Com um checkpoint (checkpoints.ExecucaoCheckpoint), cada etapa grava o que produziu na
+    pasta da execução e, ao retomar, as etapas cujas entradas não mudaram são puladas.
+    """
+    start_date = periodo_analise['start_date']
+    end_date = periodo_analise['end_date']
+    nome_arquivo_excel = _nome_arquivo_excel(periodo_analise)
+    if checkpoint:
+        nome_arquivo_excel = checkpoint.caminho(nome_arquivo_excel)
+
+    modo_delta = getattr(config, 'MODO_DELTA', False)
+
+    etapas = [
+        # Etapa 1: Login e download do relatório
+        Etapa('download', lambda r: _baixar(periodo_analise, semaforo_download),
+              rotulo="1. Download do Relatório"),
+        Etapa('pessoas_ativas', lambda r: _pessoas_ativas(),
+              rotulo="1a. Leitura de Pessoas Ativas (paralela)"),
+        Etapa('smtp', _abrir_conexao_smtp_antecipada,
+              rotulo="1b. Conexão SMTP (paralela)"),
+        # Etapa 2: Desbloquear o arquivo Excel baixado
+        Etapa('desbloqueio', lambda r: _desbloquear(r['download']),
+              dependencias=['download'], rotulo="2. Desbloqueio do Excel"),
+        # Etapa 3: Processar a planilha (filtrar por data e status 'Aprovado')
+        Etapa('planilha', lambda r: _processar_planilha(r['download'], start_date, end_date),
+              dependencias=['desbloqueio'], rotulo="3. Processamento da Planilha"),
+        # Etapa 3b: Agregações (profissional, semana, projeto...) numa única passada pelos lançamentos
+        Etapa('agregacao', lambda r: _agregar(r, start_date, end_date),
+              dependencias=['planilha', 'pessoas_ativas'], rotulo="3b. Agregações"),
+        # Etapa 4: Gerar resumo e corpo do e-mail
+        Etapa('resumo', lambda r: _gerar_resumo(r, start_date, end_date, modo_delta),
+              dependencias=['planilha', 'pessoas_ativas'] + (['delta'] if modo_delta else ['agregacao']),
+              rotulo="4. Geração do Resumo e HTML"),
+        Etapa('html', lambda r: _gerar_html(r, start_date, end_date, modo_delta),
+              dependencias=['resumo', 'agregacao'] + (['delta'] if modo_delta else []),
+              rotulo="4. Geração do Resumo e HTML"),
+        # Etapa 5: Criar o arquivo Excel COMPLETO (detalhe, resumo e agregações) para o anexo, em paralelo ao HTML
+        Etapa('anexo', lambda r: _criar_anexo(r, nome_arquivo_excel),
+              dependencias=['planilha', 'resumo', 'agregacao'], rotulo="5. Criação do Anexo Excel Completo"),
+        # Etapa 6: Enviar e-mail com o resumo e anexo completo
+        Etapa('email', lambda r: envio_email.enviar_email_resumo_mensal(
+                  r['html'], periodo_analise['report_title'], r['anexo']),
+              dependencias=['html', 'anexo', 'smtp'], rotulo="6. Envio do E-mail de Resumo"),
+    ]
+    if modo_delta:
+        # Etapa 3a: compara com o último relatório enviado; o estado só é gravado depois do envio
+        etapas.append(Etapa('delta', lambda r: _calcular_delta(r, start_date, end_date),
+                            dependencias=['planilha'], rotulo="3a. Comparação com o Último Relatório"))
+        etapas.append(Etapa('estado_delta', _salvar_estado_delta,
+                            dependencias=['delta', 'email'], rotulo="6a. Gravação do Estado (delta)"))
+    if getattr(config, 'ENVIAR_RELATORIOS_POR_GESTOR', False):
+        # Etapa 7 (opcional): um relatório por gestor, a partir dos mesmos dados já processados
+        etapas.append(Etapa('gestores', lambda r: _enviar_relatorios_gestores(r, periodo_analise, checkpoint),
+                            dependencias=['planilha', 'resumo', 'pessoas_ativas', 'smtp'],
+                            rotulo="7. Relatórios por Gestor"))
+    if getattr(config, 'REGISTRAR_HISTORICO', False):
+        # Etapa 8 (opcional): guarda os agregados do mês no histórico (ver historico.py)
+        etapas.append(Etapa('historico', lambda r: _registrar_historico(r, periodo_analise),
+                            dependencias=['resumo'], rotulo="8. Registro no Histórico"))
+    if checkpoint:
+        parametros = (periodo_analise['report_title'], start_date, end_date, modo_delta)
+        etapas = checkpoint.envolver_etapas(etapas, CHECKPOINTS_ETAPAS, parametros)
+    return etapas
+
+def montar_etapas_locais(caminho_arquivo, periodo_analise, pasta_saida):
+    """
+    Grafo do modo offline: processa um relatório já baixado (sem navegador, desbloqueio ou e-mail)
+    e grava o corpo HTML e o anexo Excel em pasta_saida.
+    """
+    start_date = periodo_analise['start_date']
+    end_date = periodo_analise['end_date']
+    caminho_excel = os.path.join(pasta_saida, _nome_arquivo_excel(periodo_analise))
+    caminho_html = os.path.splitext(caminho_excel)[0] + '.html'
+
+    def gravar_html(r):
+        with open(caminho_html, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(r['html'])
+        return caminho_html
+
+    return [
+        Etapa('pessoas_ativas', lambda r: _pessoas_ativas(),
+              rotulo="1a. Leitura de Pessoas Ativas (paralela)"),
+        Etapa('planilha', lambda r: _processar_planilha(caminho_arquivo, start_date, end_date),
+              rotulo="3. Processamento da Planilha"),
+        Etapa('agregacao', lambda r: _agregar(r, start_date, end_date),
+              dependencias=['planilha', 'pessoas_ativas'], rotulo="3b. Agregações"),
+        Etapa('resumo', lambda r: _gerar_resumo(r, start_date, end_date, False),
+              dependencias=['planilha', 'pessoas_ativas', 'agregacao'], rotulo="4. Geração do Resumo e HTML"),
+        Etapa('html', lambda r: _gerar_html(r, start_date, end_date, False),
+              dependencias=['resumo', 'agregacao'], rotulo="4. Geração do Resumo e HTML"),
+        Etapa('arquivo_html', gravar_html, dependencias=['html'], rotulo="4a. Gravação do HTML"),
+        Etapa('anexo', lambda r: _criar_anexo(r, caminho_excel),
+              dependencias=['planilha', 'resumo', 'agregacao'], rotulo="5. Criação do Anexo Excel Completo"),
+    ]
+
+def run(semaforo_download=None, retomar=False):
+    """
+    Função principal que orquestra o relatório de resumo mensal de horas.
+    Devolve {'status', 'erro', 'timing_report', 'tempo_total'} da execução.
+    semaforo_download: usado pela execução em lote (lote.py) para limitar os downloads simultâneos.
+    retomar: True (ou o id de uma execução) reaproveita os checkpoints da última execução do
+             período que não terminou com sucesso, pulando as etapas que já tinham terminado.
+    """
     timing_report = {}
     status = "SUCESSO"
     error_message = ""
-    caminho_arquivo_baixado = None
-    caminho_relatorio_excel = None
+    resultados = {}
+    duracoes = {}
+    etapas = []
+    checkpoint = None
 
-    start_total_time = time.time()
+    metricas.iniciar_execucao()
+    start_total_time = time.perf_counter()
 
     try:
         periodo_analise = date_logic.get_analysis_period()
         print(f"Período de análise determinado: {periodo_analise['report_title']}")
         print(f"Botão a ser clicado no site: '{periodo_analise['button_key']}'")
 
-        # Etapa 1: Login e download do relatório
-        start_step_time = time.time()
-        caminho_arquivo_baixado = automacao_web.login_e_download(periodo_analise['button_key'])
-        timing_report["1. Download do Relatório"] = time.time() - start_step_time
-        
-        # Etapa 2: Desbloquear o arquivo Excel baixado
-        start_step_time = time.time()
-        excel_handler.unprotect_and_save(caminho_arquivo_baixado)
-        timing_report["2. Desbloqueio do Excel"] = time.time() - start_step_time
-        
-        # Etapa 3: Processar a planilha (filtrar por data e status 'Aprovado')
-        start_step_time = time.time()
-        df_filtrado = processamento_dados.processar_planilha(
-            caminho_arquivo_baixado, 
-            periodo_analise['start_date'], 
-            periodo_analise['end_date']
-        )
-        timing_report["3. Processamento da Planilha"] = time.time() - start_step_time
-        
-        # Etapa 4: Gerar resumo e corpo do e-mail
-        start_step_time = time.time()
-        df_resumo, corpo_email_html = processamento_dados.gerar_resumo_e_html(
-            df_filtrado, 
-            periodo_analise['start_date'], 
-            periodo_analise['end_date']
-        )
-        timing_report["4. Geração do Resumo e HTML"] = time.time() - start_step_time
-        
-        # MODIFICADO: Etapa 5: Criar o arquivo Excel COMPLETO (com 2 abas) para o anexo
-        start_step_time = time.time()
-        nome_arquivo_excel = f"Relatorio_Horas_{periodo_analise['report_title'].replace(' ', '_').replace('/', '-')}.xlsx"
-        # AQUI ESTÁ A MUDANÇA: Passamos ambos os dataframes para a nova função
-        caminho_relatorio_excel = processamento_dados.criar_excel_completo(df_filtrado, df_resumo, nome_arquivo_excel)
-        timing_report["5. Criação do Anexo Excel Completo"] = time.time() - start_step_time
+        if getattr(config, 'USAR_CHECKPOINTS', True):
+            checkpoint = checkpoints.ExecucaoCheckpoint.abrir(periodo_analise, retomar)
+            checkpoints.aplicar_retencao(manter={checkpoint.id})
+            print(f"Checkpoints da execução em: {checkpoint.pasta}")
 
-        # Etapa 6: Enviar e-mail com o resumo e anexo completo
-        start_step_time = time.time()
-        envio_email.enviar_email_resumo_mensal(
-            corpo_email_html, 
-            periodo_analise['report_title'], 
-            caminho_relatorio_excel
-        )
-        timing_report["6. Envio do E-mail de Resumo"] = time.time() - start_step_time
+        etapas = montar_etapas(periodo_analise, semaforo_download, checkpoint)
+        executar_etapas(etapas, resultados, timing_report, duracoes,
+                        max_workers=getattr(config, 'MAX_ETAPAS_PARALELAS', 4))
+
+        import processamento_dados
+        avisos = processamento_dados.avisos_conferencia_nomes(resultados.get('resumo'))
+        pendentes = {gestor: situacao for gestor, situacao in (resultados.get('gestores') or {}).items()
+                     if situacao != 'enviado'}
+        if pendentes:
+            status = "SUCESSO (com avisos)"
+            avisos.append("Relatórios por gestor não enviados:\n" + "\n".join(
+                f"- {gestor}: {situacao}" for gestor, situacao in pendentes.items()))
+        if checkpoint and checkpoint.reaproveitadas:
+            avisos.append(f"Execução {checkpoint.id} retomada; etapas reaproveitadas dos checkpoints: "
+                          + ", ".join(checkpoint.reaproveitadas) + ".")
+        error_message = "\n\n".join(avisos)
 
     except Exception as e:
         status = "FALHA"
@@ -75,6 +269,12 @@ def run():
         print(f"\nOcorreu um erro crítico durante a execução:\n{error_message}")
 
     finally:
+        # Com checkpoints, o arquivo baixado e o anexo ficam na pasta da execução até a retenção apagá-la.
+        caminho_arquivo_baixado = None if checkpoint else resultados.get('download')
+        caminho_relatorio_excel = None if checkpoint else resultados.get('anexo')
+        if checkpoint:
+            checkpoint.concluir(status)
+
         if caminho_arquivo_baixado and os.path.exists(caminho_arquivo_baixado):
             try:
                 os.remove(caminho_arquivo_baixado)
@@ -82,16 +282,103 @@ def run():
             except OSError as e:
                 print(f"Erro ao remover arquivo temporário: {e}")
 
-        if caminho_relatorio_excel and os.path.exists(caminho_relatorio_excel):
+        # O .zip existe quando config.EMAIL_COMPACTAR_ANEXO está ligado.
+        caminhos_anexo = [caminho_relatorio_excel, os.path.splitext(caminho_relatorio_excel)[0] + '.zip'] \
+            if caminho_relatorio_excel else []
+        for caminho_anexo in caminhos_anexo:
+            if not os.path.exists(caminho_anexo):
+                continue
             try:
-                os.remove(caminho_relatorio_excel)
-                print(f"Arquivo de anexo '{os.path.basename(caminho_relatorio_excel)}' removido.")
+                os.remove(caminho_anexo)
+                print(f"Arquivo de anexo '{os.path.basename(caminho_anexo)}' removido.")
             except OSError as e:
                 print(f"Erro ao remover arquivo de anexo: {e}")
         
-        total_time = time.time() - start_total_time
+        total_time = time.perf_counter() - start_total_time
+
+        nomes_caminho, tempo_caminho = caminho_critico(etapas, duracoes)
+        if nomes_caminho:
+            print(f"Caminho crítico: {' -> '.join(nomes_caminho)} ({tempo_caminho:.2f} s de {total_time:.2f} s no total)")
+            timing_report[f"Caminho Crítico ({' → '.join(nomes_caminho)})"] = tempo_caminho
         
-        envio_email.enviar_email_status_execucao(status, error_message, timing_report, total_time)
+        with metricas.span('email_status'):
+            envio_email.enviar_email_status_execucao(status, error_message, timing_report, total_time)
+        envio_email.fechar_conexao_smtp()
+        metricas.exportar(status, total_time)
+        metricas.encerrar_execucao()
+
+    return {'status': status, 'erro': error_message, 'timing_report': timing_report, 'tempo_total': total_time}
+
+def processar_arquivo_local(caminho_arquivo, periodo_analise=None, pasta_saida='.'):
+    """
+    Modo offline: gera o resumo, o HTML e o anexo de um relatório já baixado, sem abrir o
+    navegador nem enviar e-mails. Devolve {'html', 'anexo', 'timing_report', 'tempo_total'}.
+    """
+    inicio = time.perf_counter()
+    periodo_analise = periodo_analise or date_logic.get_analysis_period()
+    print(f"Processando '{caminho_arquivo}' para {periodo_analise['report_title']}")
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    etapas = montar_etapas_locais(caminho_arquivo, periodo_analise, pasta_saida)
+    resultados, timing_report, duracoes = {}, {}, {}
+    executar_etapas(etapas, resultados, timing_report, duracoes,
+                    max_workers=getattr(config, 'MAX_ETAPAS_PARALELAS', 4))
+    total_time = time.perf_counter() - inicio
+
+    import processamento_dados
+    for aviso in processamento_dados.avisos_conferencia_nomes(resultados.get('resumo')):
+        print(f"AVISO: {aviso}")
+    for etapa, segundos in timing_report.items():
+        print(f"  {etapa}: {segundos:.3f} s")
+    print(f"HTML: {resultados['arquivo_html']}")
+    print(f"Anexo: {resultados['anexo']}")
+    print(f"Tempo total: {total_time:.3f} s")
+    return {'html': resultados['arquivo_html'], 'anexo': resultados['anexo'],
+            'timing_report': timing_report, 'tempo_total': total_time}
+
+def _periodo_da_linha_de_comando(args, parser):
+    if args.mes:
+        try:
+            ano, mes = (int(parte) for parte in args.mes.split('-'))
+            periodo = date_logic.get_periodo_mes(ano, mes)
+        except ValueError:
+            parser.error(f"Mês inválido: {args.mes} (use AAAA-MM)")
+        if periodo is None:
+            parser.error(f"O mês {args.mes} ainda não começou.")
+        return periodo
+    if args.inicio or args.fim:
+        if not (args.inicio and args.fim):
+            parser.error("Use --inicio e --fim juntos.")
+        try:
+            inicio, fim = (datetime.strptime(texto, '%d/%m/%Y').date() for texto in (args.inicio, args.fim))
+        except ValueError:
+            parser.error("Datas inválidas (use DD/MM/AAAA).")
+        return date_logic._montar_periodo(None, inicio.month, inicio.year, inicio, fim)
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Robô de resumo mensal de apontamento de horas.")
+    parser.add_argument('--arquivo-local', metavar='XLSX',
+                        help="Processa um relatório já baixado, sem navegador e sem enviar e-mails.")
+    parser.add_argument('--mes', metavar='AAAA-MM', help="Mês a processar (com --arquivo-local).")
+    parser.add_argument('--inicio', metavar='DD/MM/AAAA', help="Início do período (com --arquivo-local).")
+    parser.add_argument('--fim', metavar='DD/MM/AAAA', help="Fim do período (com --arquivo-local).")
+    parser.add_argument('--saida', default='.', help="Pasta do HTML e do anexo gerados (padrão: pasta atual).")
+    parser.add_argument('--retomar', nargs='?', const=True, default=False, metavar='ID',
+                        help="Retoma a última execução do período que falhou (ou a execução ID), "
+                             "pulando as etapas que já terminaram.")
+    args = parser.parse_args(argv)
+
+    if not args.arquivo_local:
+        if args.mes or args.inicio or args.fim:
+            parser.error("--mes, --inicio e --fim só valem com --arquivo-local.")
+        resultado = run(retomar=args.retomar)
+        return 0 if resultado['status'].startswith('SUCESSO') else 1
+
+    if not os.path.exists(args.arquivo_local):
+        parser.error(f"Arquivo não encontrado: {args.arquivo_local}")
+    processar_arquivo_local(args.arquivo_local, _periodo_da_linha_de_comando(args, parser), args.saida)
+    return 0
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação da execução: spans aninhados com relógio monotônico de alta resolução,
+pico de memória (tracemalloc), contagem de linhas e, opcionalmente, um perfil cProfile por
+etapa. Ao fim do run, os spans são exportados em JSON lines (histórico de todas as execuções)
+e num arquivo texto no formato do Prometheus (node_exporter textfile collector).
+
+    with metricas.span('login'):
+        ...
+
+Os spans abertos dentro de uma etapa do pipeline (mesma thread) ficam aninhados nela:
+por exemplo 'download/abrir_navegador', 'download/login' e 'download/aguardar_download'.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+
+_lock = threading.Lock()
+# O cProfile não admite dois perfis ativos ao mesmo tempo (Python 3.12+): etapas perfiladas rodam uma de cada vez.
+_lock_perfil = threading.Lock()
+_local = threading.local()
+
+_spans = []
+_abertos = []
+_execucao = {'id': None, 'inicio': None}
+
+class Span:
+    """Um trecho medido. duracao em segundos; pico_mb é o pico de memória rastreada durante o trecho."""
+
+    def __init__(self, nome, pai, atributos):
+        self.nome = nome
+        self.pai = pai
+        self.caminho = f"{pai.caminho}/{nome}" if pai else nome
+        self.atributos = dict(atributos)
+        self.inicio_relogio = datetime.now()
+        self.inicio = time.perf_counter()
+        self.duracao = None
+        self.memoria_inicial = None
+        self.pico = None
+        self.linhas = None
+        self.status = 'ok'
+
+    def registrar_linhas(self, linhas):
+        self.linhas = int(linhas)
+
+    def como_dict(self):
+        return {
+            'execucao': _execucao['id'],
+            'span': self.caminho,
+            'nome': self.nome,
+            'pai': self.pai.caminho if self.pai else None,
+            'inicio': self.inicio_relogio.isoformat(timespec='milliseconds'),
+            'duracao_s': round(self.duracao, 6) if self.duracao is not None else None,
+            'pico_mb': round(self.pico / 1024 / 1024, 3) if self.pico is not None else None,
+            'alocado_mb': (round((self.pico - self.memoria_inicial) / 1024 / 1024, 3)
+                           if self.pico is not None else None),
+            'linhas': self.linhas,
+            'status': self.status,
+            'atributos': self.atributos or None,
+        }
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+def _memoria_ligada():
+    return getattr(config, 'METRICAS_TRACEMALLOC', False)
+
+def _atualizar_picos():
+    """
+    O pico do tracemalloc é global: a cada abertura/fechamento de span, o pico desde o último
+    evento é repassado a todos os spans abertos e o contador é zerado. Assim cada span recebe
+    o pico ocorrido durante a sua vida (incluindo, com etapas em paralelo, o das outras).
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    atual, pico = tracemalloc.get_traced_memory()
+    for aberto in _abertos:
+        aberto.pico = max(aberto.pico or 0, pico)
+    tracemalloc.reset_peak()
+    return atual
+
+def iniciar_execucao():
+    """Zera os spans e começa uma nova execução (um id por run)."""
+    with _lock:
+        _spans.clear()
+        _abertos.clear()
+        _execucao['id'] = uuid.uuid4().hex[:12]
+        _execucao['inicio'] = datetime.now()
+    if _memoria_ligada() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _execucao['id']
+
+def encerrar_execucao():
+    if tracemalloc.is_tracing() and _memoria_ligada():
+        tracemalloc.stop()
+
+@contextmanager
+def span(nome, perfilar=False, **atributos):
+    """
+    Mede o bloco. perfilar=True roda o bloco sob o cProfile quando config.METRICAS_CPROFILE está
+    ligado e grava o perfil em <PASTA_METRICAS>/perfis/<execução>_<span>.prof.
+    """
+    pilha = _pilha()
+    registro = Span(nome, pilha[-1] if pilha else None, atributos)
+    with _lock:
+        registro.memoria_inicial = _atualizar_picos()
+        if registro.memoria_inicial is not None:
+            registro.pico = registro.memoria_inicial
+        _abertos.append(registro)
+    pilha.append(registro)
+
+    perfil = None
+    if perfilar and getattr(config, 'METRICAS_CPROFILE', False):
+        _lock_perfil.acquire()
+        perfil = cProfile.Profile()
+        perfil.enable()
+    try:
+        yield registro
+    except BaseException:
+        registro.status = 'erro'
+        raise
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            _lock_perfil.release()
+            _gravar_perfil(perfil, registro)
+        registro.duracao = time.perf_counter() - registro.inicio
+        pilha.pop()
+        with _lock:
+            _atualizar_picos()
+            _abertos.remove(registro)
+            _spans.append(registro)
+
+def contar_linhas(resultado):
+    """Quantidade de linhas de resultados tabulares (DataFrame/Series), ou None."""
+    # Sem o pandas carregado não há DataFrame: evita importá-lo só para esta verificação.
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return len(resultado)
+    return None
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+# --- Exportação ---
+
+def _pasta_metricas():
+    pasta = getattr(config, 'PASTA_METRICAS', None) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'metricas')
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+def _gravar_perfil(perfil, registro):
+    pasta = os.path.join(_pasta_metricas(), 'perfis')
+    os.makedirs(pasta, exist_ok=True)
+    nome = re.sub(r'[^\w\-]+', '_', registro.caminho)
+    caminho = os.path.join(pasta, f"{_execucao['id'] or 'avulso'}_{nome}.prof")
+    perfil.dump_stats(caminho)
+    registro.atributos['perfil'] = os.path.relpath(caminho, _pasta_metricas())
+
+def _rotulo_prometheus(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _numero(valor):
+    return str(valor) if isinstance(valor, int) else f"{valor:.6f}"
+
+def _texto_prometheus(registros, status, duracao_total):
+    prefixo = 'robo_apontamento'
+    linhas = [
+        f"# HELP {prefixo}_execucao_duracao_segundos Duração total da última execução.",
+        f"# TYPE {prefixo}_execucao_duracao_segundos gauge",
+        f"{prefixo}_execucao_duracao_segundos {duracao_total:.6f}",
+        f"# HELP {prefixo}_execucao_sucesso 1 se a última execução terminou com sucesso.",
+        f"# TYPE {prefixo}_execucao_sucesso gauge",
+        f"{prefixo}_execucao_sucesso {1 if status.startswith('SUCESSO') else 0}",
+        f"# HELP {prefixo}_execucao_timestamp_segundos Horário (epoch) do fim da última execução.",
+        f"# TYPE {prefixo}_execucao_timestamp_segundos gauge",
+        f"{prefixo}_execucao_timestamp_segundos {time.time():.0f}",
+    ]
+    series = (
+        ('span_duracao_segundos', 'Duração de cada etapa/span na última execução.',
+         lambda r: r['duracao_s']),
+        ('span_pico_memoria_bytes', 'Pico de memória rastreada (tracemalloc) durante o span.',
+         lambda r: round(r['pico_mb'] * 1024 * 1024) if r['pico_mb'] is not None else None),
+        ('span_linhas', 'Linhas produzidas pelo span.', lambda r: r['linhas']),
+    )
+    for nome, ajuda, valor in series:
+        amostras = [(r['span'], valor(r)) for r in registros if valor(r) is not None]
+        if not amostras:
+            continue
+        linhas += [f"# HELP {prefixo}_{nome} {ajuda}", f"# TYPE {prefixo}_{nome} gauge"]
+        linhas += [f'{prefixo}_{nome}{{span="{_rotulo_prometheus(span)}"}} {_numero(v)}'
+                   for span, v in amostras]
+    return "\n".join(linhas) + "\n"
+
+def exportar(status, duracao_total):
+    """
+    Acrescenta os spans da execução a <PASTA_METRICAS>/metricas.jsonl e reescreve o textfile do
+    Prometheus (<PASTA_METRICAS>/robo_apontamento.prom). Não faz nada com config.METRICAS_ATIVAS desligado.
+    """
+    if not getattr(config, 'METRICAS_ATIVAS', True):
+        return None
+    registros = sorted((registro.como_dict() for registro in spans()), key=lambda r: r['inicio'])
+    resumo = {'execucao': _execucao['id'], 'span': '_execucao', 'inicio': (_execucao['inicio'] or datetime.now()).isoformat(timespec='milliseconds'),
+              'duracao_s': round(duracao_total, 6), 'status': status}
+    pasta = _pasta_metricas()
+    try:
+        with open(os.path.join(pasta, 'metricas.jsonl'), 'a', encoding='utf-8') as arquivo:
+            for registro in registros + [resumo]:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+        caminho_prom = os.path.join(pasta, 'robo_apontamento.prom')
+        with open(f"{caminho_prom}.tmp", 'w', encoding='utf-8') as arquivo:
+            arquivo.write(_texto_prometheus(registros, status, duracao_total))
+        os.replace(f"{caminho_prom}.tmp", caminho_prom)
+    except OSError as e:
+        print(f"AVISO: Não foi possível gravar as métricas da execução: {e}")
+        return None
+    print(f"Métricas da execução {_execucao['id']} gravadas em {pasta} ({len(registros)} spans).")
+    return pasta
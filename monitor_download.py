@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Detecta o fim de um download em uma pasta exclusiva da execução.
+No Linux usa eventos do inotify (em uma thread observadora); nos demais sistemas,
+ou se o inotify não estiver disponível, verifica a estabilidade do tamanho do arquivo via stat.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+# Arquivos que o navegador usa enquanto o download ainda está em andamento.
+EXTENSOES_TEMPORARIAS = ('.crdownload', '.part', '.tmp', '.download')
+
+# Constantes do inotify (linux/inotify.h).
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000  # O_NONBLOCK do Linux; os.O_NONBLOCK não existe no Windows
+_IN_CLOEXEC = 0o2000000
+_EVENTO = struct.Struct('iIII')
+
+def _eh_temporario(nome):
+    return nome.startswith('.') or nome.lower().endswith(EXTENSOES_TEMPORARIAS)
+
+def _arquivos_completos(pasta):
+    """Arquivos finais da pasta, desde que não haja nenhum download em andamento ao lado deles."""
+    nomes = os.listdir(pasta)
+    if any(_eh_temporario(nome) and not nome.startswith('.') for nome in nomes):
+        return []
+    return [nome for nome in nomes if not _eh_temporario(nome)]
+
+def _tamanho(caminho):
+    try:
+        return os.stat(caminho).st_size
+    except OSError:
+        return -1
+
+class _ObservadorInotify:
+    """Thread que lê os eventos do inotify da pasta e publica os nomes dos arquivos finalizados em uma fila."""
+
+    def __init__(self, pasta):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        mascara = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self._fd, os.fsencode(pasta), mascara) < 0:
+            erro = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(erro, "inotify_add_watch falhou")
+        self.eventos = queue.Queue()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='observador-download', daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            prontos, _, _ = select.select([self._fd], [], [], 0.5)
+            if not prontos:
+                continue
+            try:
+                dados = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            posicao = 0
+            while posicao + _EVENTO.size <= len(dados):
+                _, mascara, _, tamanho_nome = _EVENTO.unpack_from(dados, posicao)
+                posicao += _EVENTO.size
+                nome = dados[posicao:posicao + tamanho_nome].rstrip(b'\0').decode(errors='replace')
+                posicao += tamanho_nome
+                if nome and mascara & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                    self.eventos.put(nome)
+
+    def fechar(self):
+        self._parar.set()
+        self._thread.join(timeout=2)
+        os.close(self._fd)
+
+class MonitorDownload:
+    """
+    Observa uma pasta exclusiva de download. Deve ser aberto ANTES de disparar o download,
+    para que nenhum evento se perca:
+
+        with MonitorDownload(pasta) as monitor:
+            botao.click()
+            caminho = monitor.aguardar(timeout=60)
+    """
+
+    def __init__(self, pasta, intervalo_polling=0.25):
+        self.pasta = pasta
+        self.intervalo_polling = intervalo_polling
+        self._observador = None
+
+    def __enter__(self):
+        if sys.platform.startswith('linux'):
+            try:
+                self._observador = _ObservadorInotify(self.pasta)
+            except OSError as e:
+                print(f"AVISO: inotify indisponível ({e}); usando verificação por tamanho do arquivo.")
+        return self
+
+    def __exit__(self, *exc):
+        if self._observador:
+            self._observador.fechar()
+            self._observador = None
+        return False
+
+    def _confirmar(self, nome):
+        """Confirma que o arquivo final existe, não tem download pendente ao lado e não está mais crescendo."""
+        if nome not in _arquivos_completos(self.pasta):
+            return None
+        caminho = os.path.join(self.pasta, nome)
+        tamanho = _tamanho(caminho)
+        time.sleep(0.05)
+        if tamanho > 0 and _tamanho(caminho) == tamanho:
+            return caminho
+        return None
+
+    def _aguardar_eventos(self, limite):
+        while time.monotonic() < limite:
+            try:
+                nome = self._observador.eventos.get(timeout=min(0.5, max(0.0, limite - time.monotonic())))
+            except queue.Empty:
+                # Rede de segurança: confere a pasta caso algum evento tenha chegado antes do observador.
+                for existente in _arquivos_completos(self.pasta):
+                    caminho = self._confirmar(existente)
+                    if caminho:
+                        return caminho
+                continue
+            if not _eh_temporario(nome):
+                caminho = self._confirmar(nome)
+                if caminho:
+                    return caminho
+        return None
+
+    def _aguardar_polling(self, limite):
+        tamanhos_anteriores = {}
+        while time.monotonic() < limite:
+            tamanhos = {nome: _tamanho(os.path.join(self.pasta, nome)) for nome in _arquivos_completos(self.pasta)}
+            for nome, tamanho in tamanhos.items():
+                if tamanho > 0 and tamanhos_anteriores.get(nome) == tamanho:
+                    return os.path.join(self.pasta, nome)
+            tamanhos_anteriores = tamanhos
+            time.sleep(self.intervalo_polling)
+        return None
+
+    def aguardar(self, timeout=60):
+        """Devolve o caminho do arquivo assim que ele estiver completamente gravado, ou None no timeout."""
+        limite = time.monotonic() + timeout
+        if self._observador:
+            return self._aguardar_eventos(limite)
+        return self._aguardar_polling(limite)
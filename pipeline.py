@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Agendador de etapas em grafo: executa em paralelo (pool de threads) as etapas cujas dependências
+já terminaram, registra a duração de cada uma no timing_report e calcula o caminho crítico.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metricas
+
+class Etapa:
+    """
+    Uma etapa do grafo.
+    - nome: identificador usado nas dependências e no dicionário de resultados.
+    - funcao: recebe o dicionário de resultados das etapas já concluídas e devolve o resultado desta.
+    - dependencias: nomes das etapas que precisam terminar antes.
+    - rotulo: chave no timing_report (etapas com o mesmo rótulo têm as durações somadas).
+    """
+
+    def __init__(self, nome, funcao, dependencias=(), rotulo=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.rotulo = rotulo
+
+def _validar(etapas):
+    nomes = {etapa.nome for etapa in etapas}
+    for etapa in etapas:
+        for dependencia in etapa.dependencias:
+            if dependencia not in nomes:
+                raise ValueError(f"A etapa '{etapa.nome}' depende de '{dependencia}', que não existe.")
+
+def caminho_critico(etapas, duracoes):
+    """Devolve (nomes das etapas do caminho mais longo do grafo, soma das durações desse caminho)."""
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    termino = {}
+    anterior = {}
+
+    def calcular(nome):
+        if nome not in termino:
+            deps = [d for d in por_nome[nome].dependencias if d in duracoes]
+            mais_longa = max(deps, key=calcular, default=None)
+            anterior[nome] = mais_longa
+            termino[nome] = duracoes.get(nome, 0.0) + (termino[mais_longa] if mais_longa else 0.0)
+        return termino[nome]
+
+    concluidas = [nome for nome in por_nome if nome in duracoes]
+    if not concluidas:
+        return [], 0.0
+    ultima = max(concluidas, key=calcular)
+    caminho = []
+    while ultima:
+        caminho.append(ultima)
+        ultima = anterior[ultima]
+    return list(reversed(caminho)), termino[caminho[0]]
+
+def executar_etapas(etapas, resultados=None, timing_report=None, duracoes=None, max_workers=4):
+    """
+    Executa o grafo de etapas. `resultados`, `timing_report` e `duracoes` são preenchidos
+    à medida que as etapas terminam, de forma que continuam disponíveis para o chamador
+    mesmo se alguma etapa falhar. Na primeira falha, nenhuma etapa nova é iniciada, as
+    que estão em andamento terminam e a exceção original é relançada.
+    """
+    _validar(etapas)
+    resultados = {} if resultados is None else resultados
+    timing_report = {} if timing_report is None else timing_report
+    duracoes = {} if duracoes is None else duracoes
+
+    try:
+        _executar_grafo(etapas, resultados, timing_report, duracoes, max_workers)
+    finally:
+        # Mantém o timing_report na ordem em que as etapas foram declaradas, e não na ordem de término.
+        ordem = {}
+        for etapa in etapas:
+            if etapa.rotulo:
+                ordem.setdefault(etapa.rotulo, len(ordem))
+        itens = sorted(timing_report.items(), key=lambda item: ordem.get(item[0], len(ordem)))
+        timing_report.clear()
+        timing_report.update(itens)
+    return resultados
+
+def _executar_grafo(etapas, resultados, timing_report, duracoes, max_workers):
+    pendentes = {etapa.nome: etapa for etapa in etapas}
+    concluidas = set()
+    erro = None
+
+    def executar(etapa):
+        inicio = time.perf_counter()
+        try:
+            # Spans abertos dentro da etapa (nesta thread) ficam aninhados sob o nome dela.
+            with metricas.span(etapa.nome, perfilar=True, rotulo=etapa.rotulo) as registro:
+                resultado = etapa.funcao(resultados)
+                linhas = metricas.contar_linhas(resultado)
+                if linhas is not None:
+                    registro.registrar_linhas(linhas)
+                return resultado
+        finally:
+            duracoes[etapa.nome] = time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='etapa') as executor:
+        em_andamento = {}
+        while pendentes or em_andamento:
+            if erro is None:
+                prontas = [etapa for etapa in pendentes.values()
+                           if all(dep in concluidas for dep in etapa.dependencias)]
+                for etapa in prontas:
+                    del pendentes[etapa.nome]
+                    em_andamento[executor.submit(executar, etapa)] = etapa
+            if not em_andamento:
+                break
+
+            terminadas, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in terminadas:
+                etapa = em_andamento.pop(futuro)
+                excecao = futuro.exception()
+                if excecao is not None:
+                    erro = erro or excecao
+                    continue
+                resultados[etapa.nome] = futuro.result()
+                concluidas.add(etapa.nome)
+                if etapa.rotulo:
+                    timing_report[etapa.rotulo] = timing_report.get(etapa.rotulo, 0.0) + duracoes[etapa.nome]
+
+    if erro is not None:
+        raise erro
@@ -1,143 +1,754 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+import numpy as np
 import pandas as pd
-from datetime import datetime
+import xlsxwriter
+from datetime import date, datetime, timedelta
+from html import escape
+import cache_dados
 import feriados
 import config
 
+# Colunas opcionais do arquivo de pessoas ativas e os títulos aceitos para cada uma.
+COLUNAS_OPCIONAIS_PESSOAS = {
+    'Jornada Diária': ('Jornada Diária', 'Jornada Diaria', 'Jornada'),
+    'Admissão': ('Admissão', 'Admissao', 'Data de Admissão', 'Data Admissão'),
+    'Desligamento': ('Desligamento', 'Data de Desligamento', 'Data Desligamento'),
+    'Ausências': ('Ausências', 'Ausencias', 'Férias', 'Afastamentos'),
+    'Gestor': ('Gestor', 'Equipe', 'Centro de Custo'),
+    'E-mail Gestor': ('E-mail Gestor', 'Email Gestor', 'E-mail do Gestor'),
+}
+
+def _converter_datas_cadastro(serie):
+    """Converte uma coluna de datas do cadastro (datas do Excel ou texto 'dd/mm/aaaa') para datetime64."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.normalize()
+    cache_datas = {}
+    return pd.to_datetime(serie.map(lambda valor: _converter_data(valor, cache_datas)), errors='coerce')
+
+def normalizar_nomes(nomes):
+    """
+    Chave de comparação de nomes: sem acentos, casefold e espaços colapsados, para que
+    'José  da Silva' e 'JOSE DA SILVA' sejam a mesma pessoa. Categorias são normalizadas uma vez só.
+    """
+    serie = nomes if isinstance(nomes, pd.Series) else pd.Series(nomes)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Uma posição extra no fim para o código -1 (valor ausente).
+        chaves = np.append(normalizar_nomes(pd.Series(serie.cat.categories.astype(object))).to_numpy(), '')
+        return pd.Series(chaves[serie.cat.codes.to_numpy()], index=serie.index, dtype=object)
+    texto = serie.astype(object).where(serie.notna(), '').astype(str)
+    return (texto.str.normalize('NFKD')
+            .str.replace(r'[\u0300-\u036f]', '', regex=True)
+            .str.casefold()
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .astype(object))
+
+def _ler_pessoas_ativas(caminho):
+    """Lê e prepara o arquivo de pessoas ativas (CSV ou Excel), incluindo a coluna 'Chave' de nomes normalizados."""
+    if caminho.endswith('.xlsx'):
+         df_ativas = pd.read_excel(caminho, engine='openpyxl')
+    else:
+         df_ativas = pd.read_csv(caminho, encoding='latin-1')
+
+    df_ativas.columns = df_ativas.columns.str.strip()
+    
+    if 'Nome' not in df_ativas.columns:
+        raise ValueError("A coluna 'Nome' não foi encontrada no arquivo de pessoas ativas.")
+    
+    df_pessoas = pd.DataFrame({'Profissional': df_ativas['Nome'].str.strip()})
+
+    for coluna, titulos in COLUNAS_OPCIONAIS_PESSOAS.items():
+        titulo = next((t for t in titulos if t in df_ativas.columns), None)
+        df_pessoas[coluna] = df_ativas[titulo] if titulo else None
+
+    jornada = df_pessoas['Jornada Diária']
+    if not pd.api.types.is_numeric_dtype(jornada):
+        jornada = jornada.astype(str).str.replace(',', '.', regex=False)
+    df_pessoas['Jornada Diária'] = pd.to_numeric(jornada, errors='coerce').fillna(feriados.HORAS_POR_DIA)
+    df_pessoas['Admissão'] = _converter_datas_cadastro(df_pessoas['Admissão'])
+    df_pessoas['Desligamento'] = _converter_datas_cadastro(df_pessoas['Desligamento'])
+    # Ausências em células de data viram texto 'dd/mm/aaaa', o mesmo formato aceito na digitação.
+    df_pessoas['Ausências'] = df_pessoas['Ausências'].map(
+        lambda valor: valor.strftime('%d/%m/%Y') if isinstance(valor, (datetime, date)) else valor)
+    df_pessoas['Chave'] = normalizar_nomes(df_pessoas['Profissional'])
+
+    duplicadas = df_pessoas.loc[df_pessoas['Chave'].duplicated(keep=False) & (df_pessoas['Chave'] != ''), 'Profissional']
+    if not duplicadas.empty:
+        print(f"AVISO: Nomes repetidos no arquivo de pessoas ativas (após normalização): {', '.join(map(str, duplicadas))}")
+    return df_pessoas
+
+# Cadastro já lido neste processo: {(caminho, mtime, tamanho): DataFrame}.
+_cache_pessoas = {}
+_lock_pessoas = threading.Lock()
+
 def get_pessoas_ativas():
     """
     Lê a lista de pessoas ativas a partir do arquivo CSV/Excel definido no config.
+
+    Além da coluna obrigatória 'Nome', aceita as colunas opcionais 'Jornada Diária' (horas por dia útil,
+    padrão 8), 'Admissão', 'Desligamento' e 'Ausências' (períodos no formato
+    'dd/mm/aaaa a dd/mm/aaaa' ou dias isolados 'dd/mm/aaaa', separados por ';').
+
+    O cadastro lido fica em memória enquanto o arquivo não mudar (data de modificação e tamanho) e,
+    com config.USAR_CACHE_PESSOAS, também no cache colunar em disco, pelo hash do conteúdo.
     """
+    caminho = config.CAMINHO_PESSOAS_ATIVAS
     try:
-        print(f"Lendo arquivo de pessoas ativas de: {config.CAMINHO_PESSOAS_ATIVAS}")
-        
-        if config.CAMINHO_PESSOAS_ATIVAS.endswith('.xlsx'):
-             df_ativas = pd.read_excel(config.CAMINHO_PESSOAS_ATIVAS, engine='openpyxl')
+        print(f"Lendo arquivo de pessoas ativas de: {caminho}")
+        info = os.stat(caminho)
+        chave_memoria = (os.path.abspath(caminho), info.st_mtime_ns, info.st_size)
+        with _lock_pessoas:
+            df_pessoas = _cache_pessoas.get(chave_memoria)
+
+        if df_pessoas is not None:
+            print("Cadastro de pessoas ativas reaproveitado da memória.")
         else:
-             df_ativas = pd.read_csv(config.CAMINHO_PESSOAS_ATIVAS, encoding='latin-1')
+            usar_cache = getattr(config, 'USAR_CACHE_PESSOAS', True)
+            chave_disco = f"pessoas_{cache_dados.calcular_hash_arquivo(caminho)}" if usar_cache else None
+            df_pessoas = cache_dados.carregar(chave_disco) if usar_cache else None
+            if df_pessoas is not None:
+                print("Cadastro de pessoas ativas encontrado no cache, leitura do arquivo dispensada.")
+                df_pessoas['Ausências'] = df_pessoas['Ausências'].astype(object)
+            else:
+                df_pessoas = _ler_pessoas_ativas(caminho)
+                if usar_cache:
+                    cache_dados.salvar(chave_disco, df_pessoas)
+            with _lock_pessoas:
+                _cache_pessoas.clear()
+                _cache_pessoas[chave_memoria] = df_pessoas
 
-        df_ativas.columns = df_ativas.columns.str.strip()
-        
-        if 'Nome' not in df_ativas.columns:
-            raise ValueError("A coluna 'Nome' não foi encontrada no arquivo de pessoas ativas.")
-        
-        df_ativas['Profissional'] = df_ativas['Nome'].str.strip()
-        
-        print(f"Encontradas {len(df_ativas)} pessoas ativas.")
-        return df_ativas[['Profissional']]
+        print(f"Encontradas {len(df_pessoas)} pessoas ativas.")
+        # Cópia: quem chama pode acrescentar colunas sem alterar o cadastro guardado.
+        return df_pessoas.copy()
     except FileNotFoundError:
-        print(f"ERRO CRÍTICO: O arquivo de pessoas ativas não foi encontrado em '{config.CAMINHO_PESSOAS_ATIVAS}'. Verifique o nome e o local do arquivo.")
+        print(f"ERRO CRÍTICO: O arquivo de pessoas ativas não foi encontrado em '{caminho}'. Verifique o nome e o local do arquivo.")
         raise
     except Exception as e:
         print(f"ERRO ao ler o arquivo de pessoas ativas: {e}")
         raise
 
-def processar_planilha(caminho_arquivo, start_date, end_date):
-    """Lê, limpa e filtra o relatório de horas baixado para o período de análise."""
-    print(f"Processando a planilha e filtrando dados entre {start_date.strftime('%d/%m/%Y')} e {end_date.strftime('%d/%m/%Y')}...")
+def _expandir_ausencias(ausencias):
+    """
+    Converte a coluna 'Ausências' em três vetores paralelos (posição da pessoa, início, fim),
+    já unindo períodos sobrepostos da mesma pessoa para que nenhum dia seja descontado duas vezes.
+    """
+    posicoes, inicios, fins = [], [], []
+    cache_datas = {}
+    for posicao, texto in enumerate(ausencias):
+        if texto is None or (isinstance(texto, float) and texto != texto):
+            continue
+        if isinstance(texto, (datetime, date)):
+            partes = [(texto, texto)]
+        else:
+            partes = []
+            for trecho in str(texto).split(';'):
+                limites = [p.strip() for p in trecho.split(' a ')]
+                if not limites[0]:
+                    continue
+                partes.append((limites[0], limites[-1]))
+
+        periodos = []
+        for inicio_txt, fim_txt in partes:
+            inicio = _converter_data(inicio_txt, cache_datas)
+            fim = _converter_data(fim_txt, cache_datas)
+            if inicio is None or fim is None:
+                print(f"AVISO: Ausência inválida ignorada: '{texto}'.")
+                continue
+            periodos.append((min(inicio, fim), max(inicio, fim)))
+
+        periodos.sort()
+        unidos = []
+        for inicio, fim in periodos:
+            if unidos and inicio <= unidos[-1][1] + timedelta(days=1):
+                unidos[-1][1] = max(unidos[-1][1], fim)
+            else:
+                unidos.append([inicio, fim])
+        for inicio, fim in unidos:
+            posicoes.append(posicao)
+            inicios.append(inicio)
+            fins.append(fim)
+
+    return (np.array(posicoes, dtype=np.int64),
+            np.array(inicios, dtype='datetime64[D]'),
+            np.array(fins, dtype='datetime64[D]'))
+
+def calcular_horas_esperadas(df_pessoas, start_date, end_date):
+    """
+    Calcula as horas esperadas de cada profissional no período em uma única passada vetorizada:
+    dias úteis entre a admissão e o desligamento (limitados ao período), menos os dias úteis
+    de ausência, vezes a jornada diária. Devolve um array alinhado às linhas de df_pessoas.
+    """
+    inicio_periodo = np.datetime64(start_date, 'D')
+    fim_periodo = np.datetime64(end_date, 'D')
+
+    admissao = df_pessoas['Admissão'].to_numpy(dtype='datetime64[D]')
+    desligamento = df_pessoas['Desligamento'].to_numpy(dtype='datetime64[D]')
+    inicios = np.where(np.isnat(admissao), inicio_periodo, np.maximum(admissao, inicio_periodo))
+    fins = np.where(np.isnat(desligamento), fim_periodo, np.minimum(desligamento, fim_periodo))
+
+    dias_uteis = feriados.contar_dias_uteis(inicios, fins).astype(np.float64)
+
+    posicoes, ausencia_inicio, ausencia_fim = _expandir_ausencias(df_pessoas['Ausências'].to_numpy())
+    if len(posicoes):
+        dias_ausentes = feriados.contar_dias_uteis(
+            np.maximum(ausencia_inicio, inicios[posicoes]),
+            np.minimum(ausencia_fim, fins[posicoes])
+        )
+        dias_uteis -= np.bincount(posicoes, weights=dias_ausentes, minlength=len(df_pessoas))
+
+    return dias_uteis * df_pessoas['Jornada Diária'].to_numpy(dtype=np.float64)
+
+# Colunas do relatório exportado que seguem adiante no pipeline (projeção de colunas).
+COLUNAS_RELATORIO = [
+    'Data', 'Projeto', 'Profissional', 'Horas',
+    'Situação', 'Atividade', 'Descrição'
+]
+COLUNAS_OBRIGATORIAS = ['Data', 'Profissional', 'Situação', 'Horas']
+
+# O relatório exportado tem um cabeçalho de 18 linhas antes da linha de títulos.
+LINHAS_PREAMBULO = 18
+# Quantas linhas, no máximo, são inspecionadas procurando a linha de títulos.
+LIMITE_BUSCA_CABECALHO = 60
+
+def _iterar_linhas_xlsx(caminho_arquivo):
+    """
+    Itera as linhas da primeira aba do arquivo como tuplas de valores, sem carregar a planilha inteira.
+    Usa o python-calamine quando instalado (mais rápido) e o openpyxl em modo read-only como alternativa.
+    """
     try:
-        df = pd.read_excel(caminho_arquivo, skiprows=18, engine='openpyxl')
-        df.columns = df.columns.str.strip()
-        
-        colunas_necessarias = ['Data', 'Profissional', 'Situação', 'Horas']
-        for col in colunas_necessarias:
-            if col not in df.columns:
-                raise ValueError(f"Coluna obrigatória '{col}' não encontrada no relatório.")
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        CalamineWorkbook = None
 
-        df['Data'] = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
-        df.dropna(subset=['Data', 'Profissional'], inplace=True)
-        
+    if CalamineWorkbook is not None:
+        planilha = CalamineWorkbook.from_path(caminho_arquivo).get_sheet_by_index(0)
+        for linha in planilha.iter_rows():
+            # O calamine devolve '' para células vazias; normalizamos para None como no openpyxl.
+            yield tuple(None if valor == '' else valor for valor in linha)
+        return
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(caminho_arquivo, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def _localizar_cabecalho(linhas):
+    """Consome as linhas iniciais até encontrar a linha de títulos e devolve {coluna: posição}."""
+    for numero, linha in enumerate(linhas, start=1):
+        titulos = [str(valor).strip() if valor is not None else '' for valor in linha]
+        if all(col in titulos for col in COLUNAS_OBRIGATORIAS):
+            return {titulo: pos for pos, titulo in enumerate(titulos) if titulo}
+        if numero >= LIMITE_BUSCA_CABECALHO:
+            break
+    raise ValueError(f"Linha de títulos ({', '.join(COLUNAS_OBRIGATORIAS)}) não encontrada nas primeiras "
+                     f"{LIMITE_BUSCA_CABECALHO} linhas do relatório.")
+
+def _converter_data(valor, cache_datas):
+    """Converte o valor da coluna Data (texto 'dd/mm/aaaa' ou data do Excel) para datetime."""
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    if not isinstance(valor, str):
+        return None
+    # Um mês tem poucas datas distintas, então memorizamos as conversões de texto.
+    if valor not in cache_datas:
+        try:
+            cache_datas[valor] = datetime.strptime(valor.strip(), '%d/%m/%Y')
+        except ValueError:
+            cache_datas[valor] = None
+    return cache_datas[valor]
+
+def _converter_horas(valor):
+    """Equivalente linha a linha de pd.to_numeric(errors='coerce').fillna(0)."""
+    if isinstance(valor, bool):
+        return float(valor)
+    if isinstance(valor, (int, float)):
+        return 0.0 if valor != valor else float(valor)
+    if isinstance(valor, str):
+        try:
+            return float(valor)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+def _ler_planilha_streaming(caminho_arquivo, start_date, end_date, incluir_descricao=True):
+    """
+    Lê o relatório linha a linha, aplicando a detecção do cabeçalho, os filtros de Situação e Data
+    e a projeção de colunas durante a leitura. Só as linhas aprovadas do período viram DataFrame,
+    já no layout compacto (ver _compactar_colunas).
+    Com start_date/end_date None, mantém as linhas aprovadas de todas as datas.
+    """
+    inicio = datetime(start_date.year, start_date.month, start_date.day) if start_date else datetime.min
+    fim = datetime(end_date.year, end_date.month, end_date.day) if end_date else datetime.max
+
+    linhas = _iterar_linhas_xlsx(caminho_arquivo)
+    posicoes = _localizar_cabecalho(linhas)
+    colunas = [col for col in COLUNAS_RELATORIO if col in posicoes
+               and (incluir_descricao or col != 'Descrição')]
+    pos_data = posicoes['Data']
+    pos_profissional = posicoes['Profissional']
+    pos_situacao = posicoes['Situação']
+    pos_horas = posicoes['Horas']
+    pos_demais = [(col, posicoes[col]) for col in colunas
+                  if col not in ('Data', 'Profissional', 'Situação', 'Horas')]
+
+    dados = {col: [] for col in colunas}
+    cache_datas = {}
+    for linha in linhas:
+        if len(linha) <= max(pos_data, pos_profissional, pos_situacao, pos_horas):
+            continue
+        situacao = linha[pos_situacao]
+        if not isinstance(situacao, str) or situacao.strip() != 'Aprovado':
+            continue
+        profissional = linha[pos_profissional]
+        if profissional is None:
+            continue
+        data_lancamento = _converter_data(linha[pos_data], cache_datas)
+        if data_lancamento is None or data_lancamento < inicio or data_lancamento > fim:
+            continue
+
+        dados['Data'].append(data_lancamento)
+        dados['Profissional'].append(str(profissional).strip())
+        dados['Horas'].append(_converter_horas(linha[pos_horas]))
+        for col, pos in pos_demais:
+            dados[col].append(linha[pos] if pos < len(linha) else None)
+
+    # Monta cada coluna já no tipo final, sem passar por colunas object intermediárias.
+    total = len(dados['Data'])
+    dados['Data'] = pd.to_datetime(dados['Data']) if total else pd.to_datetime(pd.Series([], dtype=object))
+    dados['Horas'] = np.array(dados['Horas'], dtype=np.float32)
+    dados['Situação'] = pd.Categorical.from_codes(np.zeros(total, dtype=np.int8), categories=['Aprovado'])
+    for col in COLUNAS_CATEGORICAS:
+        if col in dados and col != 'Situação':
+            dados[col] = pd.Categorical(dados[col])
+    return pd.DataFrame({col: dados[col] for col in colunas})
+
+def _ler_planilha_pandas(caminho_arquivo, start_date, end_date):
+    """Caminho original: carrega a planilha inteira com o pandas e só depois filtra."""
+    df = pd.read_excel(caminho_arquivo, skiprows=LINHAS_PREAMBULO, engine='openpyxl')
+    df.columns = df.columns.str.strip()
+
+    for col in COLUNAS_OBRIGATORIAS:
+        if col not in df.columns:
+            raise ValueError(f"Coluna obrigatória '{col}' não encontrada no relatório.")
+
+    df['Data'] = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
+    df.dropna(subset=['Data', 'Profissional'], inplace=True)
+
+    # Situação e período num único filtro: uma só cópia das linhas selecionadas.
+    selecionadas = ((df['Situação'].str.strip() == 'Aprovado')
+                    & (df['Data'] >= pd.to_datetime(start_date)) & (df['Data'] <= pd.to_datetime(end_date)))
+    df_filtrado = df.loc[selecionadas, [col for col in COLUNAS_RELATORIO if col in df.columns]]
+    del df
+
+    df_filtrado['Profissional'] = df_filtrado['Profissional'].str.strip()
+    df_filtrado['Situação'] = 'Aprovado'
+    df_filtrado['Horas'] = pd.to_numeric(df_filtrado['Horas'], errors='coerce').fillna(0)
+    return _compactar_colunas(df_filtrado.reset_index(drop=True))
+
+# Colunas de baixa cardinalidade guardadas como categorias (um código por linha em vez de um texto).
+COLUNAS_CATEGORICAS = ['Profissional', 'Situação', 'Projeto', 'Atividade']
+
+def _compactar_colunas(df):
+    """
+    Layout enxuto das linhas do relatório: categorias para as colunas de baixa cardinalidade
+    e Horas em float32 (suficiente para horas com frações de minuto).
+    """
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    if 'Horas' in df.columns:
+        df['Horas'] = df['Horas'].astype(np.float32)
+    return df
+
+def bytes_por_linha(df):
+    """Memória ocupada por linha do DataFrame (inclui o conteúdo dos textos)."""
+    return df.memory_usage(deep=True).sum() / len(df) if len(df) else 0.0
+
+def ler_lancamentos_aprovados(caminho_arquivo, incluir_descricao=False):
+    """
+    Devolve todas as linhas aprovadas do arquivo, sem filtro de período, consultando antes
+    o cache colunar pelo hash do conteúdo. Na falta, lê o arquivo e grava no cache.
+
+    A Descrição (texto livre, a coluna mais pesada) fica só no cache: sem incluir_descricao,
+    o DataFrame devolvido não a traz e guarda em attrs a chave para carregá-la depois
+    (ver carregar_descricao). O índice é a posição da linha no cache.
+    """
+    chave = cache_dados.calcular_hash_arquivo(caminho_arquivo)
+    colunas = None if incluir_descricao else [col for col in COLUNAS_RELATORIO if col != 'Descrição']
+    df_aprovado = cache_dados.carregar(chave, colunas)
+    if df_aprovado is not None:
+        print("Planilha encontrada no cache, leitura do arquivo dispensada.")
+        df_aprovado = _compactar_colunas(df_aprovado)
+    else:
+        df_aprovado = _ler_planilha_streaming(caminho_arquivo, None, None)
+        if cache_dados.salvar(chave, df_aprovado) is None:
+            # Sem cache não há de onde recarregar a Descrição depois: ela segue no DataFrame.
+            return df_aprovado
+        if not incluir_descricao and 'Descrição' in df_aprovado.columns:
+            del df_aprovado['Descrição']
+
+    if 'Descrição' not in df_aprovado.columns:
+        df_aprovado.attrs['chave_descricao'] = chave
+    return df_aprovado
+
+def carregar_descricao(df):
+    """
+    Devolve a coluna Descrição das linhas de df (alinhada pelo índice), carregando-a do cache
+    só agora. Se df já tem a coluna, devolve a própria; se não há de onde carregar, None.
+    """
+    if 'Descrição' in df.columns:
+        return df['Descrição']
+    chave = df.attrs.get('chave_descricao')
+    if chave is None:
+        return None
+    descricoes = cache_dados.carregar(chave, ['Descrição'])
+    if descricoes is None or 'Descrição' not in descricoes.columns:
+        print("AVISO: Descrições não encontradas no cache; o anexo segue sem a coluna Descrição.")
+        return None
+    return pd.Series(descricoes['Descrição'].to_numpy()[df.index.to_numpy()], index=df.index, name='Descrição')
+
+def _ler_planilha_com_cache(caminho_arquivo, start_date, end_date):
+    """Lê pelo cache todas as linhas aprovadas (servem a qualquer período do mesmo arquivo) e filtra o período."""
+    df_aprovado = ler_lancamentos_aprovados(caminho_arquivo)
+    no_periodo = (df_aprovado['Data'] >= pd.to_datetime(start_date)) & (df_aprovado['Data'] <= pd.to_datetime(end_date))
+    if no_periodo.all():
+        return df_aprovado
+    # O índice (posição no cache) é mantido para carregar_descricao.
+    return df_aprovado[no_periodo]
+
+def processar_planilha(caminho_arquivo, start_date, end_date, motor=None, usar_cache=None):
+    """
+    Lê, limpa e filtra o relatório de horas baixado para o período de análise.
+
+    motor: 'streaming' (padrão) lê linha a linha e filtra durante a leitura;
+           'pandas' usa o caminho antigo com pd.read_excel. Padrão em config.MOTOR_LEITURA_PLANILHA.
+    usar_cache: reaproveita as linhas já lidas do mesmo arquivo (pelo hash do conteúdo).
+                Vale para o motor 'streaming'. Padrão em config.USAR_CACHE_PLANILHA.
+    """
+    motor = motor or getattr(config, 'MOTOR_LEITURA_PLANILHA', 'streaming')
+    if usar_cache is None:
+        usar_cache = getattr(config, 'USAR_CACHE_PLANILHA', True)
+    print(f"Processando a planilha e filtrando dados entre {start_date.strftime('%d/%m/%Y')} e {end_date.strftime('%d/%m/%Y')}...")
+    try:
         print("Filtrando o relatório para manter apenas as horas com situação 'Aprovado'.")
-        df_aprovado = df[df['Situação'].str.strip() == 'Aprovado'].copy()
-        
-        df_filtrado = df_aprovado[(df_aprovado['Data'] >= pd.to_datetime(start_date)) & (df_aprovado['Data'] <= pd.to_datetime(end_date))].copy()
-        
-        df_filtrado['Profissional'] = df_filtrado['Profissional'].str.strip()
-        df_filtrado['Horas'] = pd.to_numeric(df_filtrado['Horas'], errors='coerce').fillna(0)
-        
-        print("Processamento da planilha concluído.")
+        if motor == 'pandas':
+            df_filtrado = _ler_planilha_pandas(caminho_arquivo, start_date, end_date)
+        elif usar_cache:
+            df_filtrado = _ler_planilha_com_cache(caminho_arquivo, start_date, end_date)
+        else:
+            df_filtrado = _ler_planilha_streaming(caminho_arquivo, start_date, end_date)
+
+        print(f"Processamento da planilha concluído ({len(df_filtrado)} lançamentos aprovados no período, "
+              f"{bytes_por_linha(df_filtrado):.0f} bytes por linha em memória).")
         return df_filtrado
 
     except Exception as e:
         print(f"ERRO ao processar a planilha: {e}")
         raise
 
-def gerar_resumo_e_html(df_filtrado, start_date, end_date):
+def gerar_resumo(df_filtrado, start_date, end_date, df_pessoas_ativas=None, horas_aprovadas=None):
     """
-    Cria o DataFrame de RESUMO e o corpo HTML do e-mail, incluindo a tabela de totais.
+    Cria o DataFrame de RESUMO por profissional (horas aprovadas, esperadas e saldo).
+    df_pessoas_ativas pode ser passado já lido (por exemplo, lido em paralelo ao download).
+    horas_aprovadas: Series {profissional: horas} já somada (por exemplo, pelo modo delta);
+                     quando informada, dispensa o agrupamento de df_filtrado.
     """
     print("Gerando resumo de horas por profissional...")
     
-    horas_esperadas_periodo = feriados.get_horas_uteis_no_periodo(start_date, end_date)
+    # Só para o log: as horas esperadas de cada pessoa saem de calcular_horas_esperadas, no mesmo calendário.
+    print(f"O período de {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')} tem "
+          f"{feriados.contar_dias_uteis(start_date, end_date)} dias úteis.")
     
-    if not df_filtrado.empty:
-        resumo_profissionais = df_filtrado.groupby('Profissional')['Horas'].sum().reset_index()
+    if horas_aprovadas is not None:
+        resumo_profissionais = pd.DataFrame({'Profissional': horas_aprovadas.index.astype(object),
+                                             'Horas Aprovadas': horas_aprovadas.to_numpy(dtype=np.float64)})
+    elif not df_filtrado.empty:
+        resumo_profissionais = df_filtrado.groupby('Profissional', observed=True)['Horas'].sum().astype(np.float64).round(6).reset_index()
         resumo_profissionais.rename(columns={'Horas': 'Horas Aprovadas'}, inplace=True)
     else:
         resumo_profissionais = pd.DataFrame(columns=['Profissional', 'Horas Aprovadas'])
 
-    df_pessoas_ativas = get_pessoas_ativas()
-    df_resumo_completo = pd.merge(df_pessoas_ativas, resumo_profissionais, on='Profissional', how='left')
-    df_resumo_completo['Horas Aprovadas'] = df_resumo_completo['Horas Aprovadas'].fillna(0)
-    df_resumo_completo['Total Horas Esperadas'] = horas_esperadas_periodo
+    if df_pessoas_ativas is None:
+        df_pessoas_ativas = get_pessoas_ativas()
+    df_resumo_completo, conferencia = _juntar_ao_cadastro(df_pessoas_ativas, resumo_profissionais)
+    df_resumo_completo['Total Horas Esperadas'] = calcular_horas_esperadas(df_resumo_completo, start_date, end_date)
     df_resumo_completo['Total Saldo'] = df_resumo_completo['Horas Aprovadas'] - df_resumo_completo['Total Horas Esperadas']
-    df_resumo_completo.sort_values(by='Profissional', inplace=True)
+    df_resumo_completo = df_resumo_completo[['Profissional', 'Horas Aprovadas', 'Total Horas Esperadas', 'Total Saldo']]
+    df_resumo_completo = df_resumo_completo.sort_values(by='Profissional')
+    df_resumo_completo.attrs['conferencia_nomes'] = conferencia
     
-    print("Resumo final gerado. Convertendo para HTML...")
+    print("Resumo final gerado.")
+    return df_resumo_completo
+
+def posicoes_no_cadastro(chaves_cadastro, chaves):
+    """
+    Posição, no cadastro, da pessoa de cada chave normalizada (-1 se não houver). Se a mesma chave
+    aparecer em mais de uma linha do cadastro (nomes repetidos, já avisados na leitura), vale a primeira.
+    """
+    indice = pd.Index(chaves_cadastro)
+    primeiras = ~indice.duplicated()
+    posicoes = indice[primeiras].get_indexer(chaves)
+    return np.where(posicoes >= 0, np.flatnonzero(primeiras)[posicoes], -1)
+
+def _juntar_ao_cadastro(df_pessoas_ativas, resumo_profissionais):
+    """
+    Leva as horas aprovadas de cada nome do relatório para a pessoa correspondente no cadastro,
+    comparando os nomes normalizados (normalizar_nomes) por busca em hash. Variações do mesmo
+    nome no relatório são somadas. Devolve (cadastro com 'Horas Aprovadas', conferência), onde a
+    conferência traz os nomes do relatório sem cadastro (com as horas que ficaram de fora) e as
+    pessoas do cadastro sem nenhum lançamento.
+    Nomes repetidos no cadastro: as horas vão para a primeira linha com o nome (as demais ficam
+    com zero), para não contar as mesmas horas duas vezes.
+    """
+    chaves_cadastro = (df_pessoas_ativas['Chave'] if 'Chave' in df_pessoas_ativas.columns
+                       else normalizar_nomes(df_pessoas_ativas['Profissional'])).to_numpy()
+    chaves_relatorio = normalizar_nomes(resumo_profissionais['Profissional']).to_numpy()
+    horas_por_chave = resumo_profissionais['Horas Aprovadas'].groupby(chaves_relatorio).sum()
+
+    posicoes = horas_por_chave.index.get_indexer(chaves_cadastro)
+    primeira_do_nome = ~pd.Index(chaves_cadastro).duplicated()
+    df_resumo = df_pessoas_ativas.copy()
+    # O zero no fim atende as posições -1 (sem lançamentos), inclusive quando o período não tem nenhum.
+    horas = np.append(horas_por_chave.to_numpy(dtype=np.float64), 0.0)
+    df_resumo['Horas Aprovadas'] = np.where((posicoes >= 0) & primeira_do_nome, horas[posicoes], 0.0)
+
+    no_cadastro = posicoes_no_cadastro(chaves_cadastro, chaves_relatorio) >= 0
+    nomes_relatorio = resumo_profissionais['Profissional'].astype(object).to_numpy()
+    nomes_cadastro = pd.Series(df_pessoas_ativas['Profissional'].to_numpy(), index=chaves_cadastro)
+    nomes_cadastro = nomes_cadastro[~nomes_cadastro.index.duplicated()]
+    grafia_diferente = no_cadastro & (nomes_cadastro.reindex(chaves_relatorio).to_numpy() != nomes_relatorio)
+
+    conferencia = {
+        'sem_cadastro': dict(zip(nomes_relatorio[~no_cadastro],
+                                 resumo_profissionais['Horas Aprovadas'].to_numpy(dtype=np.float64)[~no_cadastro].round(2))),
+        'sem_lancamentos': df_pessoas_ativas['Profissional'].to_numpy()[posicoes < 0].tolist(),
+        'grafia_diferente': nomes_relatorio[grafia_diferente].tolist(),
+    }
+    if conferencia['grafia_diferente']:
+        print(f"{len(conferencia['grafia_diferente'])} nome(s) do relatório casado(s) com o cadastro só após a "
+              "normalização (acentos, maiúsculas ou espaços).")
+    if conferencia['sem_cadastro']:
+        print(f"AVISO: {len(conferencia['sem_cadastro'])} nome(s) do relatório sem correspondência no cadastro "
+              f"(horas não contabilizadas): {_listar(conferencia['sem_cadastro'])}")
+    if conferencia['sem_lancamentos']:
+        print(f"AVISO: {len(conferencia['sem_lancamentos'])} pessoa(s) ativa(s) sem nenhum lançamento aprovado: "
+              f"{_listar(conferencia['sem_lancamentos'])}")
+    return df_resumo, conferencia
+
+def _listar(nomes, limite=20):
+    nomes = [str(nome).strip() for nome in nomes]
+    return ", ".join(nomes[:limite]) + (f" e mais {len(nomes) - limite}" if len(nomes) > limite else "")
+
+def avisos_conferencia_nomes(df_resumo):
+    """Linhas de aviso (para o e-mail de status) a partir da conferência de nomes feita em gerar_resumo."""
+    conferencia = df_resumo.attrs.get('conferencia_nomes') if df_resumo is not None else None
+    if not conferencia:
+        return []
+    avisos = []
+    if conferencia['sem_cadastro']:
+        horas = sum(conferencia['sem_cadastro'].values())
+        avisos.append(f"Nomes do relatório sem cadastro ({horas:.2f} h não contabilizadas): "
+                      f"{_listar(conferencia['sem_cadastro'])}")
+    if conferencia['sem_lancamentos']:
+        avisos.append(f"Pessoas ativas sem lançamentos aprovados: {_listar(conferencia['sem_lancamentos'])}")
+    return avisos
+
+def html_agregacoes(agregacoes, limite_linhas=None):
+    """
+    Seções do e-mail com as agregações extras (lista de (título, DataFrame), como a de agregacoes.tabelas()).
+    Cada tabela mostra até config.AGREGACOES_LINHAS_HTML linhas; a íntegra fica na aba do anexo.
+    """
+    if limite_linhas is None:
+        limite_linhas = getattr(config, 'AGREGACOES_LINHAS_HTML', 20)
+    secoes = []
+    for titulo, tabela in agregacoes or []:
+        nota = ""
+        if len(tabela) > limite_linhas:
+            nota = (f'<p style="font-size: 9pt; color: #666666;">Exibindo {limite_linhas} de {len(tabela)} linhas; '
+                    f'a lista completa está na aba "{escape(titulo)}" do anexo.</p>')
+        secoes.append(f"<h3>{escape(titulo)}</h3>{dataframe_to_html(tabela.head(limite_linhas))}{nota}")
+    return "".join(secoes)
+
+def _kb(texto):
+    return len(texto.encode('utf-8')) / 1024
+
+def _tabela_excecoes(df_resumo_completo, orcamento_bytes):
+    """
+    Tabela individual reduzida às exceções (saldo negativo), das maiores pendências para as menores,
+    com tantas linhas quantas couberem em orcamento_bytes. Devolve (html, linhas exibidas, exceções).
+    """
+    excecoes = df_resumo_completo[df_resumo_completo['Total Saldo'] < 0].sort_values('Total Saldo', kind='stable')
+    linhas = len(excecoes)
+    html = dataframe_to_html(excecoes)
+    tamanho = len(html.encode('utf-8'))
+    while linhas and tamanho > orcamento_bytes:
+        # Estimativa pelo tamanho médio das linhas; a repetição corrige o que o cabeçalho distorcer.
+        linhas = max(0, min(linhas - 1, int(linhas * orcamento_bytes / tamanho)))
+        html = dataframe_to_html(excecoes.head(linhas))
+        tamanho = len(html.encode('utf-8'))
+    return html, linhas, len(excecoes)
+
+def gerar_html_resumo(df_resumo_completo, start_date, end_date, equipe=None, html_adicional="", agregacoes=None):
+    """
+    Monta o corpo HTML do e-mail a partir do resumo, incluindo a tabela de totais.
+    equipe: nome do gestor/equipe, exibido no texto quando o relatório é de uma equipe só.
+    html_adicional: seção extra inserida depois dos totais (por exemplo, as mudanças do modo delta).
+    agregacoes: lista de (título, DataFrame) exibida depois dos totais (ver html_agregacoes).
+
+    Se o corpo passar de config.EMAIL_LIMITE_CORPO_KB, a tabela por profissional mostra só as
+    exceções (saldo negativo) que couberem no limite; a lista completa continua no anexo.
+    """
+    print("Convertendo o resumo para HTML...")
     html_table_individual = dataframe_to_html(df_resumo_completo)
 
     total_aprovadas = df_resumo_completo['Horas Aprovadas'].sum()
     total_esperadas = df_resumo_completo['Total Horas Esperadas'].sum()
     saldo_geral = df_resumo_completo['Total Saldo'].sum()
     html_table_geral = criar_html_resumo_geral(total_aprovadas, total_esperadas, saldo_geral)
+    html_secoes_agregacoes = html_agregacoes(agregacoes)
 
-    corpo_html = f"""
+    def montar(tabela_individual):
+        return f"""
     <html>
+        <head><meta charset="utf-8">{estilos_html()}</head>
         <body style="font-family: Calibri, sans-serif;">
             <h2>Resumo de Apontamento de Horas</h2>
             <p>Olá,</p>
-            <p>Segue abaixo o resumo de horas aprovadas para o período de <b>{start_date.strftime('%d/%m/%Y')}</b> a <b>{end_date.strftime('%d/%m/%Y')}</b>.</p>
+            <p>Segue abaixo o resumo de horas aprovadas{f" da equipe <b>{escape(str(equipe))}</b>" if equipe else ""} para o período de <b>{start_date.strftime('%d/%m/%Y')}</b> a <b>{end_date.strftime('%d/%m/%Y')}</b>.</p>
             <p>Para análise e filtros, utilize o relatório completo em anexo.</p>
-            {html_table_individual}
+            {tabela_individual}
             {html_table_geral}
+            {html_adicional}
+            {html_secoes_agregacoes}
             <br>
             <p>Este é um e-mail automático enviado pelo Robô de Apontamento de Horas.</p>
         </body>
     </html>
     """
+
+    corpo_html = montar(html_table_individual)
+    tamanhos = [f"{_kb(corpo_html):.1f} KB"]
+    if _modo_estilo() == 'classes':
+        inline = _kb(corpo_html) - _kb(html_table_individual) + _kb(dataframe_to_html(df_resumo_completo, 'inline'))
+        tamanhos.insert(0, f"{inline:.1f} KB com estilos inline")
+
+    limite_kb = getattr(config, 'EMAIL_LIMITE_CORPO_KB', 100)
+    if limite_kb and _kb(corpo_html) > limite_kb:
+        # Espaço reservado para o aviso que acompanha a tabela reduzida.
+        orcamento = int(limite_kb * 1024 - (_kb(corpo_html) - _kb(html_table_individual)) * 1024) - 600
+        tabela, linhas, excecoes = _tabela_excecoes(df_resumo_completo, orcamento)
+        aviso = (f'<p style="font-size: 9pt; color: #666666;">Para manter o e-mail abaixo de {limite_kb} KB, a tabela '
+                 f'mostra {linhas} de {excecoes} profissional(is) com saldo negativo (de {len(df_resumo_completo)} no '
+                 f'total), das maiores pendências para as menores. A lista completa está na aba "Resumo de Horas" do anexo.</p>')
+        corpo_html = montar(aviso + tabela)
+        tamanhos.append(f"{_kb(corpo_html):.1f} KB com o limite de {limite_kb} KB ({linhas} linha(s) na tabela)")
+    print(f"Corpo do e-mail: {' -> '.join(tamanhos)}.")
     
-    return df_resumo_completo, corpo_html
-
-def dataframe_to_html(df):
-    """Converte um DataFrame pandas para uma string de tabela HTML com estilos."""
-    style_table = 'width: auto; max-width: 800px; border-collapse: collapse; font-family: Calibri, sans-serif; font-size: 11pt; margin-bottom: 25px;'
-    style_th = 'background-color: #4472C4; color: #ffffff; padding: 12px 15px; text-align: left; font-weight: bold; border: 1px solid #dddddd;'
-    style_td = 'padding: 12px 15px; text-align: left; border: 1px solid #dddddd;'
-    style_tr_even = 'background-color: #f8f8f8;'
+    return corpo_html
+
+def gerar_resumo_e_html(df_filtrado, start_date, end_date, df_pessoas_ativas=None):
+    """
+    Cria o DataFrame de RESUMO e o corpo HTML do e-mail, incluindo a tabela de totais.
+    """
+    df_resumo_completo = gerar_resumo(df_filtrado, start_date, end_date, df_pessoas_ativas)
+    return df_resumo_completo, gerar_html_resumo(df_resumo_completo, start_date, end_date)
+
+# Folha de estilos do modo 'classes' (config.HTML_MODO_ESTILO): as regras que o modo 'inline'
+# repete em cada célula aparecem uma vez só, e cada célula leva apenas o nome da classe.
+CSS_TABELAS = (
+    "table.rh{width:auto;max-width:800px;border-collapse:collapse;font-family:Calibri,sans-serif;"
+    "font-size:11pt;margin-bottom:25px}"
+    "table.rh th{background-color:#4472C4;color:#ffffff;padding:12px 15px;text-align:left;"
+    "font-weight:bold;border:1px solid #dddddd}"
+    "table.rh td{padding:12px 15px;text-align:left;border:1px solid #dddddd}"
+    "table.rh tr.z{background-color:#f8f8f8}"
+    "table.rh td.n{text-align:right}"
+    "table.rh td.neg{color:red;font-weight:bold}"
+    "table.rh td.pos{color:green;font-weight:bold}"
+)
+
+def _modo_estilo(modo=None):
+    modo = modo or getattr(config, 'HTML_MODO_ESTILO', 'classes')
+    if modo not in ('classes', 'inline'):
+        raise ValueError(f"HTML_MODO_ESTILO deve ser 'classes' ou 'inline', não '{modo}'.")
+    return modo
+
+def estilos_html(modo=None):
+    """Bloco <style> que acompanha as tabelas no modo 'classes' (vazio no modo 'inline')."""
+    return f"<style>{CSS_TABELAS}</style>" if _modo_estilo(modo) == 'classes' else ""
+
+def _formatar_coluna_html(serie, style_td):
+    """
+    Gera, de uma vez para a coluna inteira, as células <td> já formatadas.
+    Números ficam à direita com 2 casas; o 'Total Saldo' ganha cor conforme o sinal.
+    style_td None usa as classes de CSS_TABELAS no lugar dos estilos inline.
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        valores = serie.to_numpy(dtype=np.float64)
+        textos = pd.Series(['%.2f' % valor for valor in valores.tolist()], index=serie.index, dtype=object)
+        if style_td is None:
+            if serie.name == 'Total Saldo':
+                classes = pd.Series(np.where(valores < 0, '<td class="n neg">',
+                                             np.where(valores > 0, '<td class="n pos">', '<td class="n">')),
+                                    index=serie.index)
+                return classes + textos + '</td>'
+            return '<td class="n">' + textos + '</td>'
+        estilo = f"{style_td} text-align: right;"
+        if serie.name == 'Total Saldo':
+            estilos = pd.Series(np.where(
+                valores < 0, f"{estilo} color: red; font-weight: bold;",
+                np.where(valores > 0, f"{estilo} color: green; font-weight: bold;", f"{estilo} ")
+            ), index=serie.index)
+            return '<td style="' + estilos + '">' + textos + '</td>'
+        return f'<td style="{estilo} ">' + textos + '</td>'
+
+    textos = serie.astype(str).map(escape)
+    if style_td is None:
+        return '<td>' + textos + '</td>'
+    return f'<td style="{style_td} text-align: left; ">' + textos + '</td>'
+
+def dataframe_to_html(df, modo_estilo=None):
+    """
+    Converte um DataFrame pandas para uma string de tabela HTML com estilos.
+    modo_estilo: 'classes' (padrão em config.HTML_MODO_ESTILO) marca as células com as classes de
+                 CSS_TABELAS, cuja folha de estilos vai uma vez no documento (estilos_html());
+                 'inline' repete o estilo completo em cada célula, como antes.
+    """
+    if _modo_estilo(modo_estilo) == 'classes':
+        abertura_tabela = '<table class="rh">'
+        abertura_th = '<th>'
+        style_td = None
+        tr_par, tr_impar = '<tr class="z">', '<tr>'
+    else:
+        style_table = 'width: auto; max-width: 800px; border-collapse: collapse; font-family: Calibri, sans-serif; font-size: 11pt; margin-bottom: 25px;'
+        style_th = 'background-color: #4472C4; color: #ffffff; padding: 12px 15px; text-align: left; font-weight: bold; border: 1px solid #dddddd;'
+        style_td = 'padding: 12px 15px; text-align: left; border: 1px solid #dddddd;'
+        style_tr_even = 'background-color: #f8f8f8;'
+        abertura_tabela = f'<table style="{style_table}">'
+        abertura_th = f'<th style="{style_th}">'
+        tr_par, tr_impar = f'<tr style="{style_tr_even}">', '<tr style="">'
     
-    headers = "".join([f'<th style="{style_th}">{col}</th>' for col in df.columns])
+    headers = "".join([f'{abertura_th}{col}</th>' for col in df.columns])
     html_header = f'<thead><tr>{headers}</tr></thead>'
     
-    html_body_rows = []
-    for index, row in df.iterrows():
-        tr_style = style_tr_even if index % 2 == 0 else ''
-        row_html = f'<tr style="{tr_style}">'
-        for col_name, cell_value in row.items():
-            align_style = 'text-align: right;' if isinstance(cell_value, (int, float)) else 'text-align: left;'
-            color_style = ''
-            if col_name == 'Total Saldo':
-                if cell_value < 0:
-                    color_style = 'color: red; font-weight: bold;'
-                elif cell_value > 0:
-                    color_style = 'color: green; font-weight: bold;'
-            final_style = f"{style_td} {align_style} {color_style}"
-            cell_display = f'{cell_value:.2f}' if isinstance(cell_value, (int, float)) else cell_value
-            row_html += f'<td style="{final_style}">{cell_display}</td>'
-        row_html += '</tr>'
-        html_body_rows.append(row_html)
+    if df.empty:
+        return f'{abertura_tabela}{html_header}<tbody></tbody></table>'
+
+    # O zebrado segue a posição da linha (e não o rótulo do índice, que fica fora de ordem após sort_values).
+    linhas = pd.Series(np.where(np.arange(len(df)) % 2 == 0, tr_par, tr_impar), index=df.index)
+    for col_name in df.columns:
+        linhas = linhas + _formatar_coluna_html(df[col_name], style_td)
+    linhas = linhas + '</tr>'
         
-    html_body = f'<tbody>{"".join(html_body_rows)}</tbody>'
-    return f'<table style="{style_table}">{html_header}{html_body}</table>'
+    html_body = f'<tbody>{"".join(linhas.tolist())}</tbody>'
+    return f'{abertura_tabela}{html_header}{html_body}</table>'
 
 def criar_html_resumo_geral(total_aprovadas, total_esperadas, saldo_geral):
     """Cria uma tabela HTML formatada para o resumo geral da equipe."""
@@ -171,63 +782,195 @@ def criar_html_resumo_geral(total_aprovadas, total_esperadas, saldo_geral):
     </table>
     """
 
-def criar_excel_completo(df_detalhado, df_resumo, caminho_arquivo):
+# Limite de linhas de uma aba do Excel (incluindo a linha de títulos).
+LIMITE_LINHAS_EXCEL = 1048576
+# Acima desta quantidade de lançamentos o anexo é gravado no modo de memória constante.
+LIMITE_PADRAO_MEMORIA_CONSTANTE = 50000
+
+def _pico_memoria_processo_mb():
+    """
+    Pico de memória residente (RSS) do processo desde o início, em MB, ou None se não for possível medir.
+    É o máximo de toda a execução, não de uma etapa: a diferença entre duas leituras só indica quanto a
+    etapa entre elas elevou esse máximo.
+    """
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em KB no Linux e em bytes no macOS.
+        return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return getattr(memoria, 'peak_wset', memoria.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+def _largura_colunas(df, tamanho_amostra=10000, largura_maxima=None):
+    """
+    Calcula a largura de cada coluna sem converter a coluna inteira para texto:
+    datas têm largura fixa, categorias usam só as categorias e o restante usa uma amostra espaçada.
+    """
+    larguras = []
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            largura = 10
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            largura = serie.cat.categories.astype(str).str.len().max() if len(serie.cat.categories) else 0
+        else:
+            passo = max(1, len(serie) // tamanho_amostra)
+            amostra = serie.iloc[::passo]
+            largura = amostra.astype(str).str.len().max() if len(amostra) else 0
+        largura = max(0 if pd.isna(largura) else int(largura), len(str(col))) + 3
+        larguras.append(min(largura, largura_maxima) if largura_maxima else largura)
+    return larguras
+
+def _fatiar_em_abas(df, nome_aba, linhas_por_aba):
+    """Divide o DataFrame em fatias que cabem em uma aba: 'Nome', 'Nome 2', 'Nome 3'..."""
+    if len(df) <= linhas_por_aba:
+        yield nome_aba, df
+        return
+    for numero, inicio in enumerate(range(0, len(df), linhas_por_aba), start=1):
+        nome = nome_aba if numero == 1 else f"{nome_aba} {numero}"
+        yield nome, df.iloc[inicio:inicio + linhas_por_aba]
+
+def _escrever_aba_memoria_constante(workbook, nome_aba, df, header_format, tamanho_bloco=50000):
+    """Escreve a aba linha a linha, em ordem, como exige o modo constant_memory do xlsxwriter."""
+    worksheet = workbook.add_worksheet(nome_aba)
+    worksheet.write_row(0, 0, list(df.columns), header_format)
+    linha_excel = 1
+    for inicio in range(0, len(df), tamanho_bloco):
+        bloco = df.iloc[inicio:inicio + tamanho_bloco]
+        colunas = []
+        for col in bloco.columns:
+            serie = bloco[col]
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                valores = serie.dt.to_pydatetime().tolist()
+            else:
+                valores = serie.tolist()
+            # Células vazias (NaN/NaT/None) ficam em branco.
+            colunas.append([None if pd.isna(v) else v for v in valores])
+        for valores_linha in zip(*colunas):
+            worksheet.write_row(linha_excel, 0, valores_linha)
+            linha_excel += 1
+    return worksheet
+
+def _formatar_aba_resumo(workbook, worksheet, df_resumo):
+    """Aplica a formatação condicional do saldo e as larguras das colunas na aba de resumo."""
+    red_format = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
+    green_format = workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})
+    saldo_col_index = df_resumo.columns.get_loc('Total Saldo')
+    worksheet.conditional_format(1, saldo_col_index, len(df_resumo), saldo_col_index,
+                                 {'type': 'cell', 'criteria': '<', 'value': 0, 'format': red_format})
+    worksheet.conditional_format(1, saldo_col_index, len(df_resumo), saldo_col_index,
+                                 {'type': 'cell', 'criteria': '>', 'value': 0, 'format': green_format})
+
+    for i, largura in enumerate(_largura_colunas(df_resumo)):
+        worksheet.set_column(i, i, largura)
+
+def _detalhado_para_excel(df_detalhado):
+    """
+    Monta as colunas da aba de detalhe: carrega a Descrição (adiada até aqui) e grava as Horas
+    em float64 arredondado, para que o float32 não apareça no Excel como 7.4999995.
+    """
+    colunas = {}
+    for col in COLUNAS_RELATORIO:
+        if col == 'Descrição':
+            serie = carregar_descricao(df_detalhado)
+        else:
+            serie = df_detalhado[col] if col in df_detalhado.columns else None
+        if serie is None:
+            continue
+        if serie.dtype == np.float32:
+            serie = serie.astype(np.float64).round(6)
+        colunas[col] = serie
+    return pd.DataFrame(colunas, index=df_detalhado.index)
+
+def criar_excel_completo(df_detalhado, df_resumo, caminho_arquivo, memoria_constante=None, agregacoes=None):
     """
     (MODIFICADO) Salva um arquivo Excel com duas abas:
     1. Relatorio Detalhado: Com todos os lançamentos de horas.
     2. Resumo de Horas: Com o resumo por profissional.
+    Seguidas de uma aba por agregação extra (lista de (título, DataFrame), como a de agregacoes.tabelas()).
+
+    memoria_constante: grava as abas em streaming (constant_memory do xlsxwriter), mantendo só uma linha
+                       em memória por vez. None (padrão) liga o modo automaticamente para relatórios acima de
+                       config.EXCEL_LIMITE_MEMORIA_CONSTANTE lançamentos.
+    O detalhado é dividido em várias abas ('Relatorio Detalhado 2', ...) quando passa do limite de linhas
+    do Excel ou de config.EXCEL_LINHAS_POR_ABA.
     """
     print(f"Criando arquivo Excel completo (Detalhado e Resumo) em: {caminho_arquivo}")
 
-    colunas_desejadas = [
-        'Data', 'Projeto', 'Profissional', 'Horas', 
-        'Situação', 'Atividade', 'Descrição'
-    ]
-    colunas_existentes = [col for col in colunas_desejadas if col in df_detalhado.columns]
-    df_para_excel_detalhado = df_detalhado[colunas_existentes]
+    df_para_excel_detalhado = _detalhado_para_excel(df_detalhado)
+
+    if memoria_constante is None:
+        limite = getattr(config, 'EXCEL_LIMITE_MEMORIA_CONSTANTE', LIMITE_PADRAO_MEMORIA_CONSTANTE)
+        memoria_constante = len(df_para_excel_detalhado) > limite
+    pico_antes = _pico_memoria_processo_mb()
+    linhas_por_aba = min(getattr(config, 'EXCEL_LINHAS_POR_ABA', LIMITE_LINHAS_EXCEL - 1), LIMITE_LINHAS_EXCEL - 1)
+    abas_detalhado = list(_fatiar_em_abas(df_para_excel_detalhado, 'Relatorio Detalhado', linhas_por_aba))
+    larguras_detalhado = _largura_colunas(df_para_excel_detalhado, largura_maxima=50)
+    header_opcoes = {
+        'bold': True, 'text_wrap': True, 'valign': 'top',
+        'fg_color': '#4472C4', 'font_color': 'white', 'border': 1
+    }
 
     try:
-        with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter', datetime_format='dd/mm/yyyy') as writer:
-            # --- Aba 1: Relatório Detalhado ---
-            df_para_excel_detalhado.to_excel(writer, sheet_name='Relatorio Detalhado', index=False)
-            worksheet1 = writer.sheets['Relatorio Detalhado']
-            
-            # --- Aba 2: Resumo de Horas ---
-            df_resumo.to_excel(writer, sheet_name='Resumo de Horas', index=False)
-            worksheet2 = writer.sheets['Resumo de Horas']
-            
-            # --- Formatações ---
-            workbook = writer.book
-            header_format = workbook.add_format({
-                'bold': True, 'text_wrap': True, 'valign': 'top',
-                'fg_color': '#4472C4', 'font_color': 'white', 'border': 1
+        if memoria_constante:
+            print("Gravando o anexo no modo de memória constante.")
+            workbook = xlsxwriter.Workbook(caminho_arquivo, {
+                'constant_memory': True, 'default_date_format': 'dd/mm/yyyy'
             })
+            try:
+                header_format = workbook.add_format(header_opcoes)
+                for nome_aba, fatia in abas_detalhado:
+                    worksheet = _escrever_aba_memoria_constante(workbook, nome_aba, fatia, header_format)
+                    for i, largura in enumerate(larguras_detalhado):
+                        worksheet.set_column(i, i, largura)
+                worksheet_resumo = _escrever_aba_memoria_constante(workbook, 'Resumo de Horas', df_resumo, header_format)
+                _formatar_aba_resumo(workbook, worksheet_resumo, df_resumo)
+                for titulo, tabela in agregacoes or []:
+                    worksheet = _escrever_aba_memoria_constante(workbook, titulo, tabela, header_format)
+                    _formatar_aba_resumo(workbook, worksheet, tabela)
+            finally:
+                # Fecha também no erro, liberando o arquivo e os temporários das abas.
+                workbook.close()
+        else:
+            with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter', datetime_format='dd/mm/yyyy') as writer:
+                workbook = writer.book
+                header_format = workbook.add_format(header_opcoes)
 
-            # Formatação Aba 1
-            for col_num, value in enumerate(df_para_excel_detalhado.columns.values):
-                worksheet1.write(0, col_num, value, header_format)
-            for i, col in enumerate(df_para_excel_detalhado.columns):
-                column_len = max(df_para_excel_detalhado[col].astype(str).map(len).max(), len(col)) + 3
-                worksheet1.set_column(i, i, min(column_len, 50))
-            
-            # Formatação Aba 2
-            for col_num, value in enumerate(df_resumo.columns.values):
-                worksheet2.write(0, col_num, value, header_format)
-            
-            red_format = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-            green_format = workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})
-            saldo_col_index = df_resumo.columns.get_loc('Total Saldo')
-            worksheet2.conditional_format(1, saldo_col_index, len(df_resumo), saldo_col_index,
-                                         {'type': 'cell', 'criteria': '<', 'value': 0, 'format': red_format})
-            worksheet2.conditional_format(1, saldo_col_index, len(df_resumo), saldo_col_index,
-                                         {'type': 'cell', 'criteria': '>', 'value': 0, 'format': green_format})
-
-            for i, col in enumerate(df_resumo.columns):
-                column_len = max(df_resumo[col].astype(str).map(len).max(), len(col)) + 3
-                worksheet2.set_column(i, i, column_len)
-        
-        print("Arquivo Excel completo criado com sucesso.")
+                # --- Aba 1: Relatório Detalhado (uma ou mais abas) ---
+                for nome_aba, fatia in abas_detalhado:
+                    fatia.to_excel(writer, sheet_name=nome_aba, index=False)
+                    worksheet1 = writer.sheets[nome_aba]
+                    for col_num, value in enumerate(fatia.columns.values):
+                        worksheet1.write(0, col_num, value, header_format)
+                    for i, largura in enumerate(larguras_detalhado):
+                        worksheet1.set_column(i, i, largura)
+
+                # --- Aba 2: Resumo de Horas ---
+                df_resumo.to_excel(writer, sheet_name='Resumo de Horas', index=False)
+                worksheet2 = writer.sheets['Resumo de Horas']
+                for col_num, value in enumerate(df_resumo.columns.values):
+                    worksheet2.write(0, col_num, value, header_format)
+                _formatar_aba_resumo(workbook, worksheet2, df_resumo)
+
+                # --- Abas seguintes: agregações extras ---
+                for titulo, tabela in agregacoes or []:
+                    tabela.to_excel(writer, sheet_name=titulo, index=False)
+                    worksheet = writer.sheets[titulo]
+                    for col_num, value in enumerate(tabela.columns.values):
+                        worksheet.write(0, col_num, value, header_format)
+                    _formatar_aba_resumo(workbook, worksheet, tabela)
+
+        pico = _pico_memoria_processo_mb()
+        pico_texto = (f" Pico de memória do processo até aqui: {pico:.1f} MB"
+                      f" (+{pico - pico_antes:.1f} MB nesta etapa)." if pico is not None else "")
+        print(f"Arquivo Excel completo criado com sucesso ({len(abas_detalhado)} aba(s) de detalhe).{pico_texto}")
         return caminho_arquivo
     except Exception as e:
         print(f"ERRO ao criar o arquivo Excel: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Modo de envio por gestor: a partir dos dados já filtrados e do resumo geral, separa os
+profissionais de cada gestor (coluna 'Gestor' do arquivo de pessoas ativas) com um único
+groupby, gera o HTML e o anexo de cada equipe em processos paralelos e envia cada relatório
+assim que fica pronto, todos pela mesma conexão SMTP.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+import envio_email
+import processamento_dados
+
+def _inicializar_processo(valores_config):
+    """Replica no processo filho as configurações do processo principal (que podem ter sido alteradas em tempo de execução)."""
+    for nome, valor in valores_config.items():
+        setattr(config, nome, valor)
+
+def _valores_config():
+    return {nome: valor for nome, valor in vars(config).items() if nome.isupper()}
+
+def _nome_arquivo_equipe(gestor, report_title):
+    seguro = re.sub(r'[^\w\-]+', '_', str(gestor)).strip('_') or 'equipe'
+    titulo = report_title.replace(' ', '_').replace('/', '-')
+    return f"Relatorio_Horas_{seguro}_{titulo}.xlsx"
+
+def _texto_gestor(valor):
+    """
+    Gestor como texto. Códigos numéricos (ex.: 'Centro de Custo') podem vir do Excel como 101 ou 101.0;
+    ambos viram '101'. O texto é a chave da situação dos envios, que volta do checkpoint JSON como str.
+    """
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+def renderizar_equipe(gestor, df_detalhe, df_resumo, start_date, end_date, caminho_anexo):
+    """Gera o corpo HTML e o anexo Excel de uma equipe. Roda nos processos do pool."""
+    corpo_html = processamento_dados.gerar_html_resumo(df_resumo, start_date, end_date, equipe=gestor)
+    processamento_dados.criar_excel_completo(df_detalhe, df_resumo, caminho_anexo)
+    return corpo_html, caminho_anexo
+
+def separar_por_gestor(df_filtrado, df_resumo, df_pessoas_ativas):
+    """
+    Divide detalhe e resumo por gestor com um único groupby de cada lado.
+    Devolve {gestor (texto): (e-mail do gestor, detalhe da equipe, resumo da equipe)}.
+    """
+    cadastro = df_pessoas_ativas.dropna(subset=['Gestor'])
+    cadastro = cadastro.assign(Gestor=cadastro['Gestor'].map(_texto_gestor))
+    if 'Chave' not in cadastro.columns:
+        cadastro = cadastro.assign(Chave=processamento_dados.normalizar_nomes(cadastro['Profissional']))
+    cadastro = cadastro.drop_duplicates('Chave')
+    # Nomes comparados já normalizados, como na junção do resumo com o cadastro.
+    gestor_por_chave = cadastro.set_index('Chave')['Gestor']
+    email_por_gestor = (cadastro.dropna(subset=['E-mail Gestor'])
+                        .drop_duplicates('Gestor').set_index('Gestor')['E-mail Gestor'])
+
+    gestor_detalhe = processamento_dados.normalizar_nomes(df_filtrado['Profissional']).map(gestor_por_chave)
+    gestor_resumo = processamento_dados.normalizar_nomes(df_resumo['Profissional']).map(gestor_por_chave)
+    grupos_detalhe = df_filtrado.groupby(gestor_detalhe.to_numpy(), sort=False).indices
+    grupos_resumo = df_resumo.groupby(gestor_resumo.to_numpy(), sort=False).indices
+
+    equipes = {}
+    for gestor, posicoes in grupos_resumo.items():
+        posicoes_detalhe = grupos_detalhe.get(gestor, [])
+        equipes[gestor] = (
+            email_por_gestor.get(gestor),
+            df_filtrado.iloc[posicoes_detalhe],
+            df_resumo.iloc[posicoes],
+        )
+    return equipes
+
+def enviar_relatorios_por_gestor(df_filtrado, df_resumo, df_pessoas_ativas, periodo_analise, max_processos=None,
+                                 ja_enviados=()):
+    """
+    Gera e envia um relatório por gestor. Os relatórios são renderizados em paralelo e enviados
+    à medida que ficam prontos. Devolve um dicionário {gestor: 'enviado' | motivo da falha}.
+    ja_enviados: gestores que já receberam o relatório numa tentativa anterior (não são reenviados).
+    """
+    if 'Gestor' not in df_pessoas_ativas.columns or df_pessoas_ativas['Gestor'].isna().all():
+        print("AVISO: Nenhum gestor informado no arquivo de pessoas ativas. Relatórios por gestor não gerados.")
+        return {}
+
+    equipes = separar_por_gestor(df_filtrado, df_resumo, df_pessoas_ativas)
+    ja_enviados = {_texto_gestor(gestor) for gestor in ja_enviados}
+    situacao = {}
+    for gestor, (email, _, _) in list(equipes.items()):
+        if not isinstance(email, str) or not email.strip():
+            print(f"AVISO: Gestor '{gestor}' sem e-mail cadastrado; relatório da equipe não enviado.")
+            situacao[gestor] = 'sem e-mail'
+            del equipes[gestor]
+        elif gestor in ja_enviados:
+            situacao[gestor] = 'enviado'
+            del equipes[gestor]
+    if ja_enviados:
+        print(f"{sum(1 for g in ja_enviados if g in situacao)} gestor(es) já receberam o relatório numa tentativa anterior.")
+    print(f"Gerando relatórios para {len(equipes)} gestor(es)...")
+
+    max_processos = max_processos or getattr(config, 'FAN_OUT_PROCESSOS', None) or os.cpu_count() or 1
+    pasta_anexos = tempfile.mkdtemp(prefix='robo_horas_gestores_')
+    start_date, end_date = periodo_analise['start_date'], periodo_analise['end_date']
+    conexao = envio_email.get_conexao_smtp()
+
+    def enviar(gestor, corpo_html, caminho_anexo):
+        email = equipes[gestor][0].strip()
+        msg, destinatarios = envio_email.montar_email_resumo(
+            corpo_html, f"{periodo_analise['report_title']} - {gestor}", caminho_anexo, email)
+        conexao.enviar(msg, destinatarios)
+        os.remove(caminho_anexo)
+        print(f"Relatório da equipe '{gestor}' enviado para {email}.")
+
+    try:
+        argumentos = {
+            gestor: (gestor, df_detalhe, df_resumo_equipe, start_date, end_date,
+                     os.path.join(pasta_anexos, _nome_arquivo_equipe(gestor, periodo_analise['report_title'])))
+            for gestor, (_, df_detalhe, df_resumo_equipe) in equipes.items()
+        }
+        if max_processos <= 1:
+            for gestor, args in argumentos.items():
+                try:
+                    enviar(gestor, *renderizar_equipe(*args))
+                    situacao[gestor] = 'enviado'
+                except Exception as e:
+                    print(f"ERRO no relatório da equipe '{gestor}': {e}")
+                    situacao[gestor] = str(e)
+        else:
+            # 'spawn' evita herdar locks das threads do pipeline; as configurações são replicadas no inicializador.
+            with ProcessPoolExecutor(max_workers=max_processos, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_inicializar_processo, initargs=(_valores_config(),)) as executor:
+                futuros = {executor.submit(renderizar_equipe, *args): gestor for gestor, args in argumentos.items()}
+                for futuro in as_completed(futuros):
+                    gestor = futuros[futuro]
+                    try:
+                        enviar(gestor, *futuro.result())
+                        situacao[gestor] = 'enviado'
+                    except Exception as e:
+                        print(f"ERRO no relatório da equipe '{gestor}': {e}")
+                        situacao[gestor] = str(e)
+    finally:
+        shutil.rmtree(pasta_anexos, ignore_errors=True)
+
+    enviados = sum(1 for valor in situacao.values() if valor == 'enviado')
+    print(f"Relatórios por gestor: {enviados} enviado(s) de {len(situacao)}.")
+    return situacao
@@ -0,0 +1,18 @@
+@echo off
+:: Navega para o diretório onde este arquivo .bat está localizado
+cd /d "%~dp0"
+
+:: Ativa o ambiente virtual (agora o caminho relativo é seguro)
+echo Ativando ambiente virtual...
+call "venv\Scripts\activate.bat"
+
+:: Executa o script Python
+echo Iniciando o robo em modo servico (Ctrl+C para encerrar)...
+python servico.py
+
+:: Desativa o ambiente virtual
+echo Desativando ambiente virtual...
+call "venv\Scripts\deactivate.bat"
+
+echo.
+echo Processo concluido.
\ No newline at end of file
@@ -0,0 +1,19 @@
+#!/bin/bash
+
+# Navega para o diretório onde este script (.sh) está localizado.
+# Isso garante que todos os caminhos relativos funcionem corretamente.
+cd "$(dirname "$0")"
+
+echo "Ativando ambiente virtual..."
+# Ativa o ambiente virtual (note o caminho para 'activate' no Linux).
+source venv/bin/activate
+
+echo "Iniciando o robô em modo serviço (Ctrl+C para encerrar)..."
+# É uma boa prática usar 'python3' explicitamente no Linux.
+python3 servico.py
+
+echo "Desativando ambiente virtual..."
+# Desativa o ambiente.
+deactivate
+
+echo "Processo concluído."
\ No newline at end of file
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Modo serviço: um processo residente que roda o relatório nos horários da agenda (expressões
+no formato do cron) e sob demanda por um gatilho HTTP local, mantendo aquecidos entre as
+execuções o interpretador e os módulos já importados, o calendário de dias úteis, o cache do
+arquivo de pessoas ativas e, opcionalmente, o navegador já logado.
+
+Cada execução é a mesma do main.py: o período continua sendo decidido por
+date_logic.get_analysis_period() no momento em que ela começa.
+
+Uso:
+    python servico.py
+    curl -X POST http://127.0.0.1:8787/executar              # dispara agora
+    curl -X POST "http://127.0.0.1:8787/executar?aguardar=1" # dispara e espera o resultado
+    curl http://127.0.0.1:8787/status
+"""
+import gc
+import json
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import config
+import main
+
+# --- Agenda (cron) ---
+
+_LIMITES_CRON = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _campo_cron(texto, minimo, maximo):
+    """Valores de um campo do cron: '*', 'a', 'a-b', listas com vírgula e passos ('*/15', '1-5/2')."""
+    valores = set()
+    for parte in texto.split(','):
+        intervalo, _, passo = parte.partition('/')
+        if intervalo == '*':
+            inicio, fim = minimo, maximo
+        elif '-' in intervalo:
+            inicio, fim = (int(valor) for valor in intervalo.split('-', 1))
+        else:
+            inicio = fim = int(intervalo)
+            if passo:
+                fim = maximo
+        if not (minimo <= inicio <= fim <= maximo):
+            raise ValueError(f"valor fora do intervalo {minimo}-{maximo}: {parte}")
+        valores.update(range(inicio, fim + 1, int(passo) if passo else 1))
+    return valores
+
+class AgendaCron:
+    """Uma expressão do cron com cinco campos: minuto, hora, dia do mês, mês e dia da semana (0 ou 7 = domingo)."""
+
+    def __init__(self, expressao):
+        campos = expressao.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expressão do cron deve ter 5 campos: '{expressao}'")
+        self.expressao = expressao
+        (self.minutos, self.horas, self.dias, self.meses, dias_semana) = (
+            _campo_cron(campo, *limites) for campo, limites in zip(campos, _LIMITES_CRON))
+        self.dias_semana = {dia % 7 for dia in dias_semana}
+        # Como no cron: com dia do mês e dia da semana restritos, basta um dos dois coincidir.
+        self._dia_restrito = campos[2] != '*'
+        self._semana_restrita = campos[4] != '*'
+
+    def _dia_coincide(self, dia):
+        no_mes = dia.day in self.dias
+        na_semana = (dia.isoweekday() % 7) in self.dias_semana
+        if self._dia_restrito and self._semana_restrita:
+            return no_mes or na_semana
+        return no_mes and na_semana
+
+    def proxima(self, apos):
+        """Primeiro horário da agenda estritamente depois de `apos` (None se não houver em 5 anos)."""
+        inicio = apos.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        dia = inicio.date()
+        for _ in range(5 * 366):
+            if dia.month in self.meses and self._dia_coincide(dia):
+                for hora in sorted(self.horas):
+                    for minuto in sorted(self.minutos):
+                        momento = datetime(dia.year, dia.month, dia.day, hora, minuto)
+                        if momento >= inicio:
+                            return momento
+            dia += timedelta(days=1)
+        return None
+
+def carregar_agendas():
+    expressoes = getattr(config, 'SERVICO_AGENDA', '0 12 * * *')
+    if isinstance(expressoes, str):
+        expressoes = [expressoes]
+    return [AgendaCron(expressao) for expressao in expressoes]
+
+def proxima_execucao(agendas, apos):
+    horarios = [horario for horario in (agenda.proxima(apos) for agenda in agendas) if horario]
+    return min(horarios) if horarios else None
+
+# --- Serviço ---
+
+class Servico:
+    """
+    Uma única thread executa os relatórios, um de cada vez, a partir de uma fila alimentada pela
+    agenda e pelo gatilho HTTP. Um pedido que chega com uma execução em andamento é recusado.
+    """
+
+    def __init__(self, agendas):
+        self.agendas = agendas
+        self.parar = threading.Event()
+        self._pedidos = queue.Queue()
+        self._lock = threading.Lock()
+        self._ocupado = False
+        self._contador = 0
+        self._concluidas = {}
+        self._condicao = threading.Condition(self._lock)
+        self.em_andamento = None
+        self.ultima = None
+        self.proxima = proxima_execucao(agendas, datetime.now())
+
+    def aquecer(self):
+        """Carrega de antemão o que toda execução usa: módulos, calendário e pessoas ativas."""
+        inicio = time.perf_counter()
+        import feriados
+        import processamento_dados
+        feriados.get_calendario()
+        try:
+            processamento_dados.get_pessoas_ativas()
+        except Exception as e:
+            print(f"AVISO: Não foi possível pré-carregar as pessoas ativas: {e}")
+        import automacao_web  # noqa: F401 (selenium)
+        if getattr(config, 'MODO_DOWNLOAD', 'selenium') == 'http':
+            import exportacao_http  # noqa: F401 (requests)
+        print(f"Serviço aquecido em {time.perf_counter() - inicio:.2f} s.")
+
+    def solicitar(self, origem):
+        """Enfileira uma execução. Devolve o número dela, ou None se já houver uma em andamento ou na fila."""
+        with self._lock:
+            if self._ocupado:
+                return None
+            self._ocupado = True
+            self._contador += 1
+            numero = self._contador
+        self._pedidos.put((numero, origem))
+        return numero
+
+    def aguardar(self, numero, tempo_limite=None):
+        with self._condicao:
+            self._condicao.wait_for(lambda: numero in self._concluidas, timeout=tempo_limite)
+            return self._concluidas.get(numero)
+
+    def _executor(self):
+        while not self.parar.is_set():
+            try:
+                numero, origem = self._pedidos.get(timeout=1)
+            except queue.Empty:
+                continue
+            self.em_andamento = {'execucao': numero, 'origem': origem,
+                                 'inicio': datetime.now().isoformat(timespec='seconds')}
+            print(f"\n=== Execução {numero} ({origem}) iniciada em {self.em_andamento['inicio']} ===")
+            try:
+                resultado = main.run()
+            except Exception as e:
+                resultado = {'status': 'FALHA', 'erro': str(e), 'timing_report': {}, 'tempo_total': 0.0}
+            if not resultado['status'].startswith('SUCESSO') and getattr(config, 'MANTER_NAVEGADOR_ABERTO', False):
+                # Um navegador quebrado não deve contaminar a próxima execução.
+                import automacao_web
+                automacao_web.fechar_pool_navegadores()
+            resumo = dict(self.em_andamento, fim=datetime.now().isoformat(timespec='seconds'),
+                          status=resultado['status'], tempo_total=round(resultado['tempo_total'], 3),
+                          timing_report={etapa: round(segundos, 3)
+                                         for etapa, segundos in resultado['timing_report'].items()})
+            with self._condicao:
+                self.ultima = resumo
+                self.em_andamento = None
+                self._ocupado = False
+                self._concluidas = {numero: resumo}
+                self._condicao.notify_all()
+            print(f"=== Execução {numero} terminou: {resumo['status']} em {resumo['tempo_total']:.2f} s ===")
+            gc.collect()
+
+    def _agendador(self):
+        while not self.parar.is_set():
+            if self.proxima is None:
+                print("AVISO: A agenda não tem próximos horários; só o gatilho HTTP dispara execuções.")
+                self.parar.wait()
+                return
+            espera = (self.proxima - datetime.now()).total_seconds()
+            # Esperas curtas, para acompanhar mudanças no relógio do sistema (ex.: hibernação).
+            if espera > 0:
+                self.parar.wait(min(espera, 60))
+                continue
+            if self.solicitar('agenda') is None:
+                print(f"AVISO: Execução das {self.proxima:%H:%M} ignorada: já há uma em andamento.")
+            self.proxima = proxima_execucao(self.agendas, datetime.now())
+
+    def estado(self):
+        return {
+            'executando': self.em_andamento,
+            'ultima_execucao': self.ultima,
+            'proxima_execucao': self.proxima.isoformat(timespec='minutes') if self.proxima else None,
+            'agenda': [agenda.expressao for agenda in self.agendas],
+        }
+
+    def iniciar(self):
+        for alvo, nome in ((self._executor, 'servico-executor'), (self._agendador, 'servico-agenda')):
+            threading.Thread(target=alvo, name=nome, daemon=True).start()
+
+# --- Gatilho HTTP local ---
+
+def _criar_manipulador(servico):
+    token = getattr(config, 'SERVICO_TOKEN', None)
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _autorizado(self):
+            if token and self.headers.get('X-Token') != token:
+                self._responder(401, {'erro': 'token inválido'})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._autorizado():
+                return
+            if urlparse(self.path).path == '/status':
+                self._responder(200, servico.estado())
+            else:
+                self._responder(404, {'erro': 'use GET /status ou POST /executar'})
+
+        def do_POST(self):
+            if not self._autorizado():
+                return
+            url = urlparse(self.path)
+            if url.path != '/executar':
+                self._responder(404, {'erro': 'use GET /status ou POST /executar'})
+                return
+            numero = servico.solicitar('http')
+            if numero is None:
+                self._responder(409, {'erro': 'já há uma execução em andamento', 'executando': servico.em_andamento})
+                return
+            if parse_qs(url.query).get('aguardar', ['0'])[0] in ('1', 'true', 'sim'):
+                self._responder(200, servico.aguardar(numero))
+            else:
+                self._responder(202, {'execucao': numero})
+
+        def log_message(self, formato, *args):
+            print(f"[gatilho] {self.address_string()} {formato % args}")
+
+    return Manipulador
+
+def executar_servico():
+    if getattr(config, 'SERVICO_MANTER_NAVEGADOR', False):
+        config.MANTER_NAVEGADOR_ABERTO = True
+
+    servico = Servico(carregar_agendas())
+    servico.aquecer()
+    servico.iniciar()
+
+    endereco = (getattr(config, 'SERVICO_HOST', '127.0.0.1'), getattr(config, 'SERVICO_PORTA', 8787))
+    servidor = ThreadingHTTPServer(endereco, _criar_manipulador(servico))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='servico-http', daemon=True).start()
+    print(f"Serviço no ar. Gatilho em http://{endereco[0]}:{servidor.server_address[1]}/executar; "
+          f"próxima execução agendada: {servico.estado()['proxima_execucao'] or 'nenhuma'}.")
+
+    def encerrar(*_):
+        servico.parar.set()
+    signal.signal(signal.SIGINT, encerrar)
+    signal.signal(signal.SIGTERM, encerrar)
+
+    while not servico.parar.wait(1):
+        pass
+    print("Encerrando o serviço...")
+    servidor.shutdown()
+    em_andamento = servico.em_andamento
+    if em_andamento:
+        print("Aguardando o fim da execução em andamento...")
+        servico.aguardar(em_andamento['execucao'])
+    if getattr(config, 'MANTER_NAVEGADOR_ABERTO', False):
+        import automacao_web
+        automacao_web.fechar_pool_navegadores()
+
+if __name__ == '__main__':
+    executar_servico()